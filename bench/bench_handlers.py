@@ -0,0 +1,332 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Нагрузочный прогон хендлеров: синтетические апдейты через настоящий Dispatcher.
+
+Telegram заменён заглушкой сессии (ответы мгновенные или с --api-latency-ms),
+Ollama — FakeListChatModel, БД — отдельный файл, заранее наполненный классами,
+учениками, заданиями и напоминаниями. Каждый виртуальный пользователь проходит
+сценарии add_class, add_task, enroll, list_tasks и gen; на каждый шаг меряется
+время dp.feed_update. Итог — пропускная способность и p50/p95/p99 по шагам,
+в консоль и в JSON (--out), чтобы сравнивать коммиты между собой.
+
+    python bench/bench_handlers.py --users 50 --rounds 5 --tasks 20000 --out bench.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta, timezone
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def parse_args():
+    p = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    p.add_argument("--classes", type=int, default=30)
+    p.add_argument("--students", type=int, default=500)
+    p.add_argument("--tasks", type=int, default=5000)
+    p.add_argument("--users", type=int, default=20, help="виртуальных пользователей одновременно")
+    p.add_argument("--rounds", type=int, default=3, help="проходов всех сценариев на пользователя")
+    p.add_argument("--flows", default="add_class,add_task,enroll,list_tasks,gen")
+    p.add_argument("--api-latency-ms", type=float, default=0.0, help="задержка ответа заглушки Telegram")
+    p.add_argument("--outbox", action="store_true", help="пропускать запросы через OUTBOX (с лимитами Telegram)")
+    p.add_argument("--throttle", action="store_true", help="оставить лимиты THROTTLE_* на пользователя")
+    p.add_argument("--db", default="", help="файл БД (по умолчанию временный)")
+    p.add_argument("--seed", type=int, default=1)
+    p.add_argument("--out", default="", help="куда записать результаты JSON")
+    return p.parse_args()
+
+
+ARGS = parse_args()
+# процессы проверки кода (spawn) заново исполняют этот модуль как __mp_main__:
+# временный каталог создаёт только основной процесс, дочерним путь приходит через окружение
+if __name__ == "__main__":
+    DB_FILE = ARGS.db or os.path.join(tempfile.mkdtemp(prefix="bench-"), "bench.db")
+else:
+    DB_FILE = ARGS.db or os.environ.get("DB_PATH", "")
+
+# конфиг читается при импорте — окружение задаём до него
+os.environ["DB_PATH"] = DB_FILE
+os.environ.setdefault("BOT_TOKEN", "123456:bench")
+os.environ.setdefault("GEN_STREAM_EDIT_INTERVAL", "0.05")
+if not ARGS.throttle:
+    # виртуальные пользователи шлют апдейты без пауз — лимиты на пользователя отбросили бы почти всё
+    for name in ("MESSAGE", "CALLBACK", "GEN"):
+        os.environ[f"THROTTLE_{name}_RATE"] = os.environ[f"THROTTLE_{name}_BURST"] = "1e9"
+    os.environ["THROTTLE_CALLBACK_DEDUP_S"] = "0"
+sys.path.insert(0, os.path.join(ROOT, "src"))
+
+from aiogram import Bot  # noqa: E402
+from aiogram.client.session.base import BaseSession  # noqa: E402
+from aiogram.types import Message, Update  # noqa: E402
+
+import db  # noqa: E402
+from config import default_props  # noqa: E402
+from main import build_dispatcher  # noqa: E402
+from llm import LLM  # noqa: E402
+from outbox import OUTBOX  # noqa: E402
+from scheduler_jobs import insert_task_jobs, set_bot  # noqa: E402
+from handlers.gen import GEN_QUEUE  # noqa: E402
+from callbacks import (  # noqa: E402
+    CB_ADD_CLASS, CB_ADD_TASK, CB_ADD_TASK_PICK_CLASS, CB_ENROLL, CB_ENROLL_PICK_STU, CB_ENROLL_PICK_CLS,
+    CB_LIST_TASKS, CB_TASKS_PAGE, CB_TASKS_PICK_CLASS, CB_GEN,
+)
+
+FAKE_CODE = "```python\nfrom machine import Pin\nLED_PIN = 2\nled = Pin(LED_PIN, Pin.OUT)\nled.on()\n```\nLED на GPIO2."
+
+
+# -------------------------------
+# Заглушка Telegram
+# -------------------------------
+class FakeSession(BaseSession):
+    """Отвечает на методы Bot API без сети: Message для отправки/правки, True для остального."""
+
+    _MESSAGE_METHODS = {"SendMessage", "SendDocument", "EditMessageText", "EditMessageReplyMarkup"}
+
+    def __init__(self, latency_s: float = 0.0):
+        super().__init__()
+        self.latency_s = latency_s
+        self.calls: dict = {}
+        self._ids = 1000
+
+    async def make_request(self, bot, method, timeout=None):
+        name = type(method).__name__
+        self.calls[name] = self.calls.get(name, 0) + 1
+        if self.latency_s:
+            await asyncio.sleep(self.latency_s)
+        if name not in self._MESSAGE_METHODS:
+            return True
+        self._ids += 1
+        chat_id = getattr(method, "chat_id", None) or 1
+        return Message.model_validate(
+            {"message_id": getattr(method, "message_id", None) or self._ids, "date": int(time.time()),
+             "chat": {"id": chat_id, "type": "private"}, "text": getattr(method, "text", None) or ""},
+            context={"bot": bot},
+        )
+
+    async def stream_content(self, url, headers=None, timeout=30, chunk_size=65536, raise_for_status=True):
+        yield b""
+
+    async def close(self):
+        pass
+
+
+# -------------------------------
+# Синтетические апдейты
+# -------------------------------
+class UpdateFactory:
+    def __init__(self, bot: Bot):
+        self.bot = bot
+        self._update_id = 0
+
+    def _next(self) -> int:
+        self._update_id += 1
+        return self._update_id
+
+    def _user(self, user_id: int) -> dict:
+        return {"id": user_id, "is_bot": False, "first_name": f"u{user_id}"}
+
+    def text(self, user_id: int, text: str) -> Update:
+        uid = self._next()
+        return Update.model_validate({"update_id": uid, "message": {
+            "message_id": uid, "date": int(time.time()), "chat": {"id": user_id, "type": "private"},
+            "from": self._user(user_id), "text": text,
+        }}, context={"bot": self.bot})
+
+    def callback(self, user_id: int, data: str) -> Update:
+        uid = self._next()
+        return Update.model_validate({"update_id": uid, "callback_query": {
+            "id": str(uid), "from": self._user(user_id), "chat_instance": str(user_id), "data": data,
+            "message": {"message_id": 1, "date": int(time.time()), "chat": {"id": user_id, "type": "private"},
+                        "from": {"id": 1, "is_bot": True, "first_name": "bot"}, "text": "menu"},
+        }}, context={"bot": self.bot})
+
+
+def flow_steps(flow: str, user_id: int, n: int, seed: dict) -> list:
+    """[(метка шага, вид, данные)] — последовательность действий пользователя в сценарии."""
+    cls = random.choice(seed["class_ids"])
+    stu = random.choice(seed["student_ids"])
+    if flow == "add_class":
+        return [("add_class.open", "cb", CB_ADD_CLASS), ("add_class.name", "text", f"Bench {user_id}-{n}")]
+    if flow == "add_task":
+        due = (datetime.now(timezone.utc) + timedelta(days=3)).strftime("%Y-%m-%d %H:%M")
+        return [("add_task.open", "cb", CB_ADD_TASK),
+                ("add_task.pick_class", "cb", f"{CB_ADD_TASK_PICK_CLASS}{cls}"),
+                ("add_task.title", "text", f"Задание {n}"),
+                ("add_task.due", "text", due),
+                ("add_task.description", "text", "-")]
+    if flow == "enroll":
+        return [("enroll.open", "cb", CB_ENROLL),
+                ("enroll.pick_student", "cb", f"{CB_ENROLL_PICK_STU}{stu}"),
+                ("enroll.pick_class", "cb", f"{CB_ENROLL_PICK_CLS}{stu}:{cls}")]
+    if flow == "list_tasks":
+        return [("list_tasks.open", "cb", CB_LIST_TASKS),
+                ("list_tasks.overdue", "cb", f"{CB_TASKS_PAGE}od:0"),
+                ("list_tasks.filter", "cb", f"{CB_TASKS_PICK_CLASS}up")]
+    if flow == "gen":
+        # разные описания — иначе всё обслужит кэш генерации
+        return [("gen.open", "cb", CB_GEN), ("gen.describe", "text", f"LED на GPIO2 мигает {user_id}-{n} раз")]
+    raise ValueError(f"неизвестный сценарий: {flow}")
+
+
+# -------------------------------
+# Наполнение БД
+# -------------------------------
+async def seed_db(users: list[int]) -> dict:
+    rnd = random.Random(ARGS.seed)
+    now = int(time.time())
+    owners = users or [1]
+    async with db.db_write() as conn:
+        await conn.execute("BEGIN IMMEDIATE")
+        await conn.executemany(
+            "INSERT INTO classes(name, owner_chat_id, timezone) VALUES(?, ?, 'UTC')",
+            [(f"Класс {i:03d}", owners[i % len(owners)]) for i in range(ARGS.classes)]
+        )
+        await conn.executemany(
+            "INSERT INTO users(UserID, name, post) VALUES(?, ?, 'student')",
+            [(100_000 + i, f"Ученик {i:05d}") for i in range(ARGS.students)]
+        )
+        class_ids = [r[0] for r in await db.fetchall(conn, "SELECT id FROM classes")]
+        await conn.executemany(
+            "INSERT INTO tasks(class_id, title, description, due_ts, created_ts) VALUES(?, ?, '', ?, ?)",
+            [(rnd.choice(class_ids), f"Задание {i}", now + rnd.randint(-30, 60) * 86400, now)
+             for i in range(ARGS.tasks)]
+        )
+        tasks = await db.fetchall(conn, "SELECT id, due_ts FROM tasks")
+        await insert_task_jobs(conn, [(r["id"], r["due_ts"]) for r in tasks])
+        jobs = (await db.fetchone(conn, "SELECT COUNT(*) FROM jobs"))[0]
+    return {"class_ids": class_ids, "student_ids": [100_000 + i for i in range(ARGS.students)], "jobs": jobs}
+
+
+# -------------------------------
+# Прогон и статистика
+# -------------------------------
+def percentile(sorted_values: list[float], q: float) -> float:
+    if not sorted_values:
+        return 0.0
+    k = (len(sorted_values) - 1) * q
+    lo, hi = int(k), min(int(k) + 1, len(sorted_values) - 1)
+    return sorted_values[lo] + (sorted_values[hi] - sorted_values[lo]) * (k - lo)
+
+
+def summarize(samples: dict, wall_s: float) -> dict:
+    out = {}
+    for label in sorted(samples):
+        values = sorted(samples[label])
+        out[label] = {
+            "count": len(values),
+            "throughput_per_s": round(len(values) / wall_s, 1),
+            "mean_ms": round(sum(values) / len(values) * 1000, 3),
+            "p50_ms": round(percentile(values, 0.50) * 1000, 3),
+            "p95_ms": round(percentile(values, 0.95) * 1000, 3),
+            "p99_ms": round(percentile(values, 0.99) * 1000, 3),
+            "max_ms": round(values[-1] * 1000, 3),
+        }
+    return out
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, text=True).strip()
+    except Exception:
+        return ""
+
+
+async def run() -> dict:
+    os.chdir(ROOT)
+    random.seed(ARGS.seed)
+    await db.ensure_db()
+    await db.init_pool()
+    session = FakeSession(ARGS.api_latency_ms / 1000)
+    bot = Bot(token=os.environ["BOT_TOKEN"], session=session, default=default_props)
+    if ARGS.outbox:
+        bot.session.middleware(OUTBOX)
+        OUTBOX.start()
+    set_bot(bot)
+    LLM.use_fake_backend([FAKE_CODE])
+    dp = build_dispatcher()
+    factory = UpdateFactory(bot)
+
+    users = [10_000 + i for i in range(ARGS.users)]
+    started = time.perf_counter()
+    seed = await seed_db(users)
+    seed_s = time.perf_counter() - started
+    flows = [f.strip() for f in ARGS.flows.split(",") if f.strip()]
+    samples: dict = {}
+    errors: dict = {}
+
+    async def virtual_user(user_id: int):
+        for n in range(ARGS.rounds):
+            for flow in flows:
+                for label, kind, data in flow_steps(flow, user_id, n, seed):
+                    update = factory.callback(user_id, data) if kind == "cb" else factory.text(user_id, data)
+                    t0 = time.perf_counter()
+                    try:
+                        await dp.feed_update(bot, update)
+                    except Exception as e:
+                        errors[label] = errors.get(label, 0) + 1
+                        if errors[label] == 1:
+                            print(f"{label}: {type(e).__name__}: {e}")
+                        continue
+                    samples.setdefault(label, []).append(time.perf_counter() - t0)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(virtual_user(u) for u in users))
+    wall_s = time.perf_counter() - started
+
+    await GEN_QUEUE.stop()
+    if ARGS.outbox:
+        await OUTBOX.stop()
+    pool_stats = db.POOL.stats()
+    await db.close_pool()
+
+    total = sum(len(v) for v in samples.values())
+    return {
+        "commit": git_commit(),
+        "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "params": {k: v for k, v in vars(ARGS).items() if k != "out"},
+        "seed": {"classes": len(seed["class_ids"]), "students": len(seed["student_ids"]),
+                 "tasks": ARGS.tasks, "jobs": seed["jobs"], "seconds": round(seed_s, 3)},
+        "wall_s": round(wall_s, 3),
+        "updates": total,
+        "throughput_per_s": round(total / wall_s, 1) if wall_s else 0.0,
+        "errors": errors,
+        "api_calls": session.calls,
+        "db_pool": pool_stats,
+        "handlers": summarize(samples, wall_s),
+    }
+
+
+def print_report(res: dict) -> None:
+    print(f"\ncommit {res['commit'] or '?'} • {res['updates']} апдейтов за {res['wall_s']} с "
+          f"• {res['throughput_per_s']} апд/с • seed {res['seed']}")
+    print(f"{'шаг':<24}{'n':>7}{'rps':>9}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'max ms':>10}")
+    for label, s in res["handlers"].items():
+        print(f"{label:<24}{s['count']:>7}{s['throughput_per_s']:>9}{s['p50_ms']:>10}{s['p95_ms']:>10}"
+              f"{s['p99_ms']:>10}{s['max_ms']:>10}")
+    if res["errors"]:
+        print(f"ошибки: {res['errors']}")
+
+
+if __name__ == "__main__":
+    result = asyncio.run(run())
+    print_report(result)
+    if ARGS.out:
+        with open(ARGS.out, "w", encoding="utf-8") as f:
+            json.dump(result, f, ensure_ascii=False, indent=2)
+        print(f"результаты: {ARGS.out}")
+    if not ARGS.db:
+        for suffix in ("", "-wal", "-shm"):
+            try:
+                os.remove(DB_FILE + suffix)
+            except FileNotFoundError:
+                pass
+        os.rmdir(os.path.dirname(DB_FILE))
@@ -10,7 +10,12 @@ CB_ADD_TASK = "add_task"
 CB_LIST_TASKS = "list_tasks"
 CB_GEN = "gen"
 CB_SETTINGS = "settings"
+CB_IMPORT_TASKS = "import_tasks"
+CB_IMPORT_ROSTER = "import_roster"
+CB_EXPORT = "export"
 CB_BACK = "back_to_main"
+CB_NOOP = "noop"             # кнопка-подпись (номер страницы)
+CB_SETTINGS_DIGEST = "settings_digest"  # вкл/выкл сводку напоминаний
 
 # prefixed callbacks
 CB_ENROLL_PICK_STU = "enroll_pick_stu:"       # +<student_id>
@@ -22,3 +27,21 @@ CB_STU_AFTER_ADD_SKIP = "stu_after_add_skip"
 
 # add task: pick class
 CB_ADD_TASK_PICK_CLASS = "addtask_pick_cls:"  # +<class_id>
+
+# import tasks: pick class
+CB_IMPORT_TASKS_PICK_CLASS = "imptask_pick_cls:"  # +<class_id>
+
+# export: pick class, then what to export
+CB_EXPORT_PICK_CLASS = "exp_cls:"  # +<class_id>
+CB_EXPORT_KIND = "exp:"            # +<kind>:<class_id>
+
+# gen: pick model
+CB_GEN_MODEL = "gen_model:"  # +<alias>
+
+# list tasks: keyset pages and filters
+CB_TASKS_PAGE = "tl:"        # +<period>:<class_id>[:n|p:<due_ts>:<task_id>]
+CB_TASKS_PICK_CLASS = "tlc:"  # +<period>
+
+# pagination of long pickers
+CB_CLASS_PICKER_PAGE = "cpp:"  # +<page>:<prefix выбора класса>
+CB_ENROLL_PAGE = "enroll_page:"  # +<page>
@@ -0,0 +1,118 @@
+# -*- coding: utf-8 -*-
+"""
+Кэш списка классов и собранных по нему клавиатур выбора класса.
+
+Классов мало и меняются они редко, а список нужен почти на каждое нажатие
+(добавление задания, запись ученика, импорт, фильтр списка заданий).
+Строки держим в памяти процесса; после своих правок вызываем invalidate(),
+правки из других процессов замечаем по счётчику cache_versions.classes
+(его увеличивают триггеры на classes), сверяясь не чаще CLASS_CACHE_CHECK_S.
+"""
+import time
+from collections import OrderedDict
+from typing import Callable, Sequence, Tuple
+
+from aiogram.types import InlineKeyboardMarkup
+
+from config import CLASS_CACHE_CHECK_S
+from db import fetchone, fetchall, db_read
+from keyboards import paged_kb
+from callbacks import CB_CLASS_PICKER_PAGE
+
+_Rows = Sequence[Tuple[str, str]]
+
+# выборы класса с постоянными кнопками: префикс callback -> (head(prefix), tail(prefix), только свои классы)
+_PICKERS: dict = {}
+
+
+def register_picker(base: str, head: Callable[[str], _Rows] | None = None,
+                    tail: Callable[[str], _Rows] | None = None, owned: bool = False) -> None:
+    """base — начало callback_data кнопок класса; head/tail получают полный префикс выбора."""
+    _PICKERS[base] = (head, tail, owned)
+
+
+def _picker_options(prefix: str):
+    for base, options in _PICKERS.items():
+        if prefix.startswith(base):
+            return options
+    return None, None, False
+
+
+class ClassCache:
+    def __init__(self, check_interval: float = CLASS_CACHE_CHECK_S, max_keyboards: int = 256):
+        self.check_interval = check_interval
+        self.max_keyboards = max_keyboards
+        self._rows: list[dict] | None = None
+        self._by_id: dict = {}
+        self._version = None
+        self._checked_at = 0.0
+        self._keyboards: OrderedDict = OrderedDict()
+        self.loads = 0
+
+    def invalidate(self) -> None:
+        self._rows = None
+        self._keyboards.clear()
+
+    async def _load(self) -> None:
+        async with db_read() as db:
+            version = await fetchone(db, "SELECT version FROM cache_versions WHERE name = 'classes'")
+            rows = await fetchall(
+                db, "SELECT id, name, timezone, owner_chat_id FROM classes ORDER BY name COLLATE NOCASE ASC, id"
+            )
+        self._rows = [dict(r) for r in rows]
+        self._by_id = {r["id"]: r for r in self._rows}
+        self._version = version["version"] if version else None
+        self._checked_at = time.monotonic()
+        self._keyboards.clear()
+        self.loads += 1
+
+    async def _fresh(self) -> list[dict]:
+        if self._rows is None:
+            await self._load()
+        elif time.monotonic() - self._checked_at >= self.check_interval:
+            async with db_read() as db:
+                row = await fetchone(db, "SELECT version FROM cache_versions WHERE name = 'classes'")
+            self._checked_at = time.monotonic()
+            if (row["version"] if row else None) != self._version:
+                await self._load()
+        return self._rows
+
+    # ---------- данные ----------
+    async def all(self) -> list[dict]:
+        """Все классы по имени: [{"id", "name", "timezone", "owner_chat_id"}, ...]."""
+        return await self._fresh()
+
+    async def get(self, class_id: int) -> dict | None:
+        await self._fresh()
+        return self._by_id.get(class_id)
+
+    async def owned_by(self, chat_id: int) -> list[dict]:
+        return [r for r in await self._fresh() if r["owner_chat_id"] == chat_id]
+
+    # ---------- клавиатуры ----------
+    async def picker_kb(self, prefix: str, page: int = 0, owner_chat_id: int | None = None) -> InlineKeyboardMarkup | None:
+        """
+        Выбор класса: кнопка класса -> f"{prefix}{class_id}". None, если выбирать не из чего.
+        Клавиатура собирается один раз на (prefix, page, владелец) до следующего изменения классов.
+        """
+        head, tail, owned = _picker_options(prefix)
+        rows = await self.owned_by(owner_chat_id) if owned else await self._fresh()
+        if not rows:
+            return None
+        key = (prefix, page, owner_chat_id if owned else None)
+        kb = self._keyboards.get(key)
+        if kb is None:
+            kb = paged_kb(
+                [(r["name"], f"{prefix}{r['id']}") for r in rows], page,
+                lambda n: f"{CB_CLASS_PICKER_PAGE}{n}:{prefix}",
+                head=head(prefix) if head else (), tail=tail(prefix) if tail else (),
+            )
+            self._keyboards[key] = kb
+            while len(self._keyboards) > self.max_keyboards:
+                self._keyboards.popitem(last=False)
+        else:
+            self._keyboards.move_to_end(key)
+        return kb
+
+
+CLASSES = ClassCache()
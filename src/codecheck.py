@@ -0,0 +1,208 @@
+# -*- coding: utf-8 -*-
+"""
+Проверка сгенерированного MicroPython-кода перед отправкой ученику.
+
+- код компилируется (синтаксис);
+- импорты — только модули из CODECHECK_MODULES (то, что есть в прошивке ESP32);
+- пины: номер существует на ESP32, не занят флеш-памятью (6–11),
+  входные 34–39 не используются как выходы; номер числом вместо
+  именованной константы — предупреждение.
+
+check_code — чистая функция; CodeChecker выполняет её в ProcessPoolExecutor,
+чтобы разбор больших ответов не занимал цикл событий, и ведёт статистику.
+Если проверка не успела за CODECHECK_TIMEOUT_S или процесс проверки упал,
+CodeChecker.check возвращает статус timeout/error — код не проверен, и об этом
+нужно сказать пользователю, а не выдавать его за прошедший проверку.
+"""
+import ast
+import asyncio
+import hashlib
+import time
+from collections import OrderedDict
+from typing import NamedTuple
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+import multiprocessing
+
+from config import CODECHECK_MODULES, CODECHECK_WORKERS, CODECHECK_TIMEOUT_S
+from metrics import CODECHECK_SECONDS, CODECHECK_RESULTS
+
+_ESP32_GPIO = frozenset([*range(0, 6), *range(12, 20), 21, 22, 23, 25, 26, 27, *range(32, 40)])
+_FLASH_GPIO = frozenset(range(6, 12))
+_INPUT_ONLY_GPIO = frozenset(range(34, 40))
+_OUTPUT_MODES = {"OUT", "OPEN_DRAIN"}
+_OUTPUT_WRAPPERS = {"PWM", "DAC"}   # PWM(Pin(n)) — тоже выход
+
+
+def _name(node) -> str | None:
+    """Pin / machine.Pin -> 'Pin'."""
+    if isinstance(node, ast.Name):
+        return node.id
+    if isinstance(node, ast.Attribute):
+        return node.attr
+    return None
+
+
+def _pin_constants(tree: ast.Module) -> dict:
+    """Константы модуля вида LED_PIN = 2."""
+    consts = {}
+    for node in tree.body:
+        if (isinstance(node, ast.Assign) and len(node.targets) == 1 and isinstance(node.targets[0], ast.Name)
+                and isinstance(node.value, ast.Constant) and type(node.value.value) is int):
+            consts[node.targets[0].id] = node.value.value
+    return consts
+
+
+def _is_output(call: ast.Call) -> bool:
+    mode = call.args[1] if len(call.args) > 1 else next((k.value for k in call.keywords if k.arg == "mode"), None)
+    return _name(mode) in _OUTPUT_MODES if mode is not None else False
+
+
+def _lint_pins(tree: ast.Module, errors: list, warnings: list) -> None:
+    consts = _pin_constants(tree)
+    outputs = set()
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Call) and _name(node.func) in _OUTPUT_WRAPPERS and node.args:
+            if isinstance(node.args[0], ast.Call):
+                outputs.add(id(node.args[0]))
+    for node in ast.walk(tree):
+        if not (isinstance(node, ast.Call) and _name(node.func) == "Pin" and node.args):
+            continue
+        arg = node.args[0]
+        if isinstance(arg, ast.Constant) and type(arg.value) is int:
+            pin = arg.value
+            warnings.append(f"строка {node.lineno}: пин {pin} указан числом — вынесите в именованную константу")
+        elif isinstance(arg, ast.Name) and arg.id in consts:
+            pin = consts[arg.id]
+        else:
+            continue
+        if pin in _FLASH_GPIO:
+            errors.append(f"строка {node.lineno}: GPIO{pin} занят флеш-памятью ESP32")
+        elif pin not in _ESP32_GPIO:
+            errors.append(f"строка {node.lineno}: у ESP32 нет GPIO{pin}")
+        elif pin in _INPUT_ONLY_GPIO and (_is_output(node) or id(node) in outputs):
+            errors.append(f"строка {node.lineno}: GPIO{pin} работает только на вход")
+
+
+def check_code(code: str, allowed_modules: frozenset = CODECHECK_MODULES) -> tuple[list[str], list[str]]:
+    """(ошибки, предупреждения). Ошибки — код не запустится или испортит плату."""
+    errors, warnings = [], []
+    if not code.strip():
+        return ["в ответе нет кода"], warnings
+    try:
+        tree = ast.parse(code, "main.py")
+        compile(tree, "main.py", "exec")
+    except SyntaxError as e:
+        return [f"строка {e.lineno}: синтаксическая ошибка: {e.msg}"], warnings
+    except (ValueError, RecursionError) as e:
+        return [f"код не компилируется: {e}"], warnings
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Import):
+            modules = [a.name for a in node.names]
+        elif isinstance(node, ast.ImportFrom) and node.level == 0 and node.module:
+            modules = [node.module]
+        else:
+            continue
+        for module in modules:
+            root = module.split(".", 1)[0]
+            if root not in allowed_modules:
+                errors.append(f"строка {node.lineno}: модуля «{root}» нет в MicroPython для ESP32")
+    _lint_pins(tree, errors, warnings)
+    return errors, warnings
+
+
+class CheckResult(NamedTuple):
+    """Итог CodeChecker.check; status — passed, failed, timeout или error (упал процесс проверки)."""
+    errors: list
+    warnings: list
+    status: str
+
+    @property
+    def checked(self) -> bool:
+        return self.status in ("passed", "failed")
+
+
+class CodeChecker:
+    def __init__(self, workers: int = CODECHECK_WORKERS, timeout: float = CODECHECK_TIMEOUT_S,
+                 cache_size: int = 256):
+        self.workers = workers
+        self.timeout = timeout
+        self.cache_size = cache_size
+        self._pool: ProcessPoolExecutor | None = None
+        self._warm = None
+        self._cache: OrderedDict = OrderedDict()   # sha1(code) -> CheckResult
+        self.stats = {"checked": 0, "passed": 0, "failed": 0, "timeouts": 0, "seconds_total": 0.0,
+                      "repaired": 0, "repair_failed": 0}
+
+    # ---------- жизненный цикл ----------
+    def start(self) -> None:
+        if self._pool is None and self.workers > 0:
+            # spawn: дочерние процессы не наследуют потоки aiosqlite и цикл событий
+            self._pool = ProcessPoolExecutor(self.workers, mp_context=multiprocessing.get_context("spawn"))
+            # дочерний процесс при старте импортирует приложение (секунды) — запускаем его сразу
+            self._warm = self._pool.submit(check_code, "pass")
+
+    async def stop(self) -> None:
+        if self._pool is not None:
+            pool, self._pool = self._pool, None
+            await asyncio.to_thread(pool.shutdown, True, cancel_futures=True)
+
+    # ---------- проверка ----------
+    async def check(self, code: str) -> CheckResult:
+        """Ошибки и предупреждения; не успели за timeout или упал процесс — статус timeout/error без ошибок."""
+        key = hashlib.sha1(code.encode("utf-8")).hexdigest()
+        cached = self._cache.get(key)
+        if cached is not None:
+            self._cache.move_to_end(key)
+            return cached
+        self.start()
+        started = time.perf_counter()
+        try:
+            if self._pool is None:
+                result = check_code(code)
+            else:
+                if not self._warm.done():
+                    await asyncio.wrap_future(self._warm)   # старт процесса в таймаут не входит
+                    started = time.perf_counter()
+                loop = asyncio.get_running_loop()
+                result = await asyncio.wait_for(loop.run_in_executor(self._pool, check_code, code), self.timeout)
+        except asyncio.TimeoutError:
+            self.stats["timeouts"] += 1
+            CODECHECK_RESULTS.inc(status="timeout")
+            return CheckResult([], [], "timeout")
+        except BrokenProcessPool:
+            # процесс проверки упал — пересоздадим пул при следующей проверке
+            print("Процесс проверки кода упал, пул будет пересоздан")
+            pool, self._pool = self._pool, None
+            if pool is not None:
+                # освобождаем ресурсы сломанного пула (поток-менеджер, каналы), не дожидаясь его
+                pool.shutdown(wait=False, cancel_futures=True)
+            CODECHECK_RESULTS.inc(status="error")
+            return CheckResult([], [], "error")
+        elapsed = time.perf_counter() - started
+        CODECHECK_SECONDS.observe(elapsed)
+        self.stats["checked"] += 1
+        self.stats["seconds_total"] += elapsed
+        status = "failed" if result[0] else "passed"
+        self.stats[status] += 1
+        CODECHECK_RESULTS.inc(status=status)
+        result = CheckResult(*result, status)
+        self._cache[key] = result
+        while len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+        return result
+
+    def record_repair(self, ok: bool) -> None:
+        status = "repaired" if ok else "repair_failed"
+        self.stats[status] += 1
+        CODECHECK_RESULTS.inc(status=status)
+
+    def summary(self) -> dict:
+        st = dict(self.stats)
+        n = st["checked"]
+        st["pass_rate"] = st["passed"] / n if n else 0.0
+        st["avg_ms"] = st["seconds_total"] / n * 1000 if n else 0.0
+        return st
+
+
+CHECKER = CodeChecker()
@@ -11,9 +11,48 @@ if not BOT_TOKEN:
     raise RuntimeError("Не задан BOT_TOKEN в окружении (.env)")
 
 DB_PATH = os.getenv("DB_PATH", "agent.db")
+# Telegram ID администраторов бота через запятую (служебные команды)
+ADMIN_IDS = {int(x) for x in os.getenv("ADMIN_IDS", "").replace(" ", "").split(",") if x}
 DEFAULT_TZ = os.getenv("DEFAULT_TZ", "UTC")
 DEFAULT_MODEL = os.getenv("MODEL_NAME", "llama3:8b")
 
+# пул соединений SQLite: N читателей + один писатель
+DB_POOL_READERS = int(os.getenv("DB_POOL_READERS", "4"))
+DB_CACHE_SIZE_KB = int(os.getenv("DB_CACHE_SIZE_KB", "16384"))      # PRAGMA cache_size (в KiB)
+DB_MMAP_SIZE = int(os.getenv("DB_MMAP_SIZE", str(64 * 1024 * 1024)))  # PRAGMA mmap_size (в байтах)
+DB_STATEMENT_CACHE = int(os.getenv("DB_STATEMENT_CACHE", "256"))     # кэш подготовленных выражений
+DB_BUSY_TIMEOUT_MS = int(os.getenv("DB_BUSY_TIMEOUT_MS", "5000"))
+
+# несколько процессов на одной БД: напоминания и периодические задачи ведёт один (аренда в БД).
+# Только с BOT_MODE=webhook: при polling апдейты получает один процесс, и main.py откажется запускаться
+WORKERS = int(os.getenv("WORKERS", "1"))
+LEADER_LEASE_S = float(os.getenv("LEADER_LEASE_S", "15"))        # через сколько резервный забирает аренду
+LEADER_HEARTBEAT_S = float(os.getenv("LEADER_HEARTBEAT_S", "5"))
+
+# метрики Prometheus: http://METRICS_HOST:METRICS_PORT/metrics (0 — выключено);
+# при нескольких процессах у каждого свой порт: METRICS_PORT + номер процесса
+METRICS_HOST = os.getenv("METRICS_HOST", "127.0.0.1")
+METRICS_PORT = int(os.getenv("METRICS_PORT", "9100"))
+
+# приём апдейтов: polling или webhook (aiohttp-сервер; при нескольких процессах — общий порт)
+BOT_MODE = os.getenv("BOT_MODE", "polling")
+WEBHOOK_URL = os.getenv("WEBHOOK_URL", "")        # публичный адрес; пусто — не регистрируем (локальная проверка)
+WEBHOOK_PATH = os.getenv("WEBHOOK_PATH", "/webhook")
+WEBHOOK_HOST = os.getenv("WEBHOOK_HOST", "0.0.0.0")
+WEBHOOK_PORT = int(os.getenv("WEBHOOK_PORT", "8080"))
+WEBHOOK_SECRET = os.getenv("WEBHOOK_SECRET", "")  # X-Telegram-Bot-Api-Secret-Token
+WEBHOOK_QUEUE_MAX = int(os.getenv("WEBHOOK_QUEUE_MAX", "1000"))
+WEBHOOK_WORKERS = int(os.getenv("WEBHOOK_WORKERS", "16"))   # апдейтов в обработке одновременно (на процесс)
+
+# исходящие сообщения: лимиты Telegram (https://core.telegram.org/bots/faq#my-bot-is-hitting-limits-how-do-i-avoid-this)
+OUTBOX_GLOBAL_RATE = float(os.getenv("OUTBOX_GLOBAL_RATE", "30"))      # сообщений/с на бота
+OUTBOX_CHAT_RATE = float(os.getenv("OUTBOX_CHAT_RATE", "1"))           # сообщений/с в личный чат
+OUTBOX_CHAT_BURST = float(os.getenv("OUTBOX_CHAT_BURST", "3"))
+OUTBOX_GROUP_RATE = float(os.getenv("OUTBOX_GROUP_RATE", str(20 / 60)))  # 20 сообщений/мин в группу
+OUTBOX_GROUP_BURST = float(os.getenv("OUTBOX_GROUP_BURST", "3"))
+OUTBOX_WORKERS = int(os.getenv("OUTBOX_WORKERS", "8"))                  # одновременных запросов к API
+OUTBOX_MAX_RETRIES = int(os.getenv("OUTBOX_MAX_RETRIES", "5"))
+
 # напоминания для заданий
 REMINDER_OFFSETS = [
     ("T-24h", timedelta(hours=24)),
@@ -22,10 +61,106 @@ REMINDER_OFFSETS = [
     ("T0", timedelta(seconds=0)),
 ]
 
+# движок напоминаний: окно в памяти и допустимое опоздание
+REMINDER_LOOKAHEAD_S = int(os.getenv("REMINDER_LOOKAHEAD_S", "900"))
+REMINDER_BATCH = int(os.getenv("REMINDER_BATCH", "1000"))
+REMINDER_GRACE_S = int(os.getenv("REMINDER_GRACE_S", "60"))
+# как часто ведущий проверяет, не добавили ли напоминания другие процессы (должно быть меньше GRACE)
+REMINDER_POLL_S = float(os.getenv("REMINDER_POLL_S", "10"))
+# досылка напоминаний, пропущенных за время простоя: по одному на задание, пачками
+REMINDER_CATCHUP_BATCH = int(os.getenv("REMINDER_CATCHUP_BATCH", "20"))
+REMINDER_CATCHUP_PAUSE_S = float(os.getenv("REMINDER_CATCHUP_PAUSE_S", "1"))
+REMINDER_CATCHUP_MAX_AGE_S = int(os.getenv("REMINDER_CATCHUP_MAX_AGE_S", str(48 * 3600)))  # старше — не досылаем
+# сводка напоминаний: всё, что сработало у владельца за окно, — одним сообщением
+REMINDER_DIGEST_WINDOW_S = float(os.getenv("REMINDER_DIGEST_WINDOW_S", "60"))
+REMINDER_DIGEST_DEFAULT = os.getenv("REMINDER_DIGEST_DEFAULT", "0") == "1"   # для владельцев без настройки
+
+# входящие апдейты: token bucket на пользователя (в каждом процессе свой)
+THROTTLE_MESSAGE_RATE = float(os.getenv("THROTTLE_MESSAGE_RATE", "1"))       # сообщений/с
+THROTTLE_MESSAGE_BURST = float(os.getenv("THROTTLE_MESSAGE_BURST", "5"))
+THROTTLE_CALLBACK_RATE = float(os.getenv("THROTTLE_CALLBACK_RATE", "2"))     # нажатий/с
+THROTTLE_CALLBACK_BURST = float(os.getenv("THROTTLE_CALLBACK_BURST", "8"))
+THROTTLE_GEN_RATE = float(os.getenv("THROTTLE_GEN_RATE", str(1 / 30)))      # описаний для /gen в секунду
+THROTTLE_GEN_BURST = float(os.getenv("THROTTLE_GEN_BURST", "2"))
+THROTTLE_CALLBACK_DEDUP_S = float(os.getenv("THROTTLE_CALLBACK_DEDUP_S", "1"))  # повторный клик той же кнопки
+THROTTLE_MAX_USERS = int(os.getenv("THROTTLE_MAX_USERS", "10000"))
+
+# импорт файлов (задания, ростер)
+IMPORT_MAX_BYTES = int(os.getenv("IMPORT_MAX_BYTES", str(2 * 1024 * 1024)))
+IMPORT_MAX_ROWS = int(os.getenv("IMPORT_MAX_ROWS", "5000"))
+# поиск ученика/класса по вводу текста (FTS5): сколько совпадений показывать
+SEARCH_LIMIT = int(os.getenv("SEARCH_LIMIT", "10"))
+
+# экспорт в CSV: строк за одно чтение курсора и сколько держать в памяти до сброса на диск
+EXPORT_BATCH = int(os.getenv("EXPORT_BATCH", "500"))
+EXPORT_SPOOL_BYTES = int(os.getenv("EXPORT_SPOOL_BYTES", str(1024 * 1024)))
+
+# кэш результатов генерации
+GEN_CACHE_TTL_S = int(os.getenv("GEN_CACHE_TTL_S", str(30 * 24 * 3600)))
+GEN_CACHE_MAX_ENTRIES = int(os.getenv("GEN_CACHE_MAX_ENTRIES", "2000"))
+GEN_CACHE_MAX_BYTES = int(os.getenv("GEN_CACHE_MAX_BYTES", str(20 * 1024 * 1024)))
+
+# очередь генерации: одновременных вызовов модели и максимум ожидающих
+GEN_CONCURRENCY = int(os.getenv("GEN_CONCURRENCY", "1"))
+GEN_QUEUE_MAX = int(os.getenv("GEN_QUEUE_MAX", "20"))
+
+# потоковая генерация: сообщение обновляется по мере ответа модели
+GEN_STREAM = os.getenv("GEN_STREAM", "1") == "1"
+GEN_STREAM_EDIT_INTERVAL = float(os.getenv("GEN_STREAM_EDIT_INTERVAL", "1.5"))  # сек между правками
+
+# библиотека готовых примеров (snippets.py): ответ без модели при сходстве описания не ниже порога
+SNIPPETS_ENABLED = os.getenv("SNIPPETS_ENABLED", "1") == "1"
+SNIPPET_THRESHOLD = float(os.getenv("SNIPPET_THRESHOLD", "0.5"))
+SNIPPET_MARGIN = float(os.getenv("SNIPPET_MARGIN", "0.1"))      # отрыв от второго по сходству шаблона
+
+# проверка сгенерированного кода (codecheck.py): процессов, таймаут, одна попытка исправления моделью
+CODECHECK_WORKERS = int(os.getenv("CODECHECK_WORKERS", "1"))     # 0 — проверять в основном процессе
+CODECHECK_TIMEOUT_S = float(os.getenv("CODECHECK_TIMEOUT_S", "5"))
+GEN_REPAIR = os.getenv("GEN_REPAIR", "1") == "1"
+# модули прошивки MicroPython для ESP32; свои драйверы (ssd1306 и т.п.) — через CODECHECK_EXTRA_MODULES
+CODECHECK_MODULES = frozenset("""
+    machine time utime micropython math random urandom sys gc os uos struct ustruct array
+    collections ucollections json ujson re ure io uio select uselect errno uerrno heapq uheapq
+    binascii ubinascii hashlib uhashlib framebuf esp esp32 neopixel dht onewire ds18x20
+    network socket usocket ssl ussl asyncio uasyncio _thread bluetooth ubluetooth btree
+    cryptolib ucryptolib requests urequests webrepl
+""".split()) | frozenset(m.strip() for m in os.getenv("CODECHECK_EXTRA_MODULES", "").split(",") if m.strip())
+
+# состояние диалогов (FSM): sqlite — переживает рестарт и общее для процессов, memory — только в памяти
+FSM_STORAGE = os.getenv("FSM_STORAGE", "sqlite")
+FSM_TTL_S = int(os.getenv("FSM_TTL_S", str(24 * 3600)))        # брошенный диалог забывается через сутки
+FSM_CACHE_MAX = int(os.getenv("FSM_CACHE_MAX", "10000"))       # состояний в памяти (LRU)
+FSM_CACHE_TTL_S = int(os.getenv("FSM_CACHE_TTL_S", "30"))      # сколько верить кэшу sqlite-хранилища; 0 — всегда из БД
+
+# клавиатуры-списки (классы, ученики): кнопок на странице
+KB_PAGE_SIZE = int(os.getenv("KB_PAGE_SIZE", "20"))
+# кэш классов: как часто сверяться с БД (правки из других процессов)
+CLASS_CACHE_CHECK_S = float(os.getenv("CLASS_CACHE_CHECK_S", "2"))
+
+# список заданий: строк на странице
+TASKS_PAGE_SIZE = int(os.getenv("TASKS_PAGE_SIZE", "10"))
+
+# хранение заданий: старше RETENTION_HOURS после дедлайна — в архив (или удаление)
+RETENTION_HOURS = int(os.getenv("RETENTION_HOURS", "168"))
+RETENTION_MODE = os.getenv("RETENTION_MODE", "archive")   # archive | delete
+RETENTION_BATCH = int(os.getenv("RETENTION_BATCH", "500"))
+RETENTION_INTERVAL_S = int(os.getenv("RETENTION_INTERVAL_S", "3600"))
+RETENTION_VACUUM_PAGES = int(os.getenv("RETENTION_VACUUM_PAGES", "2000"))   # страниц за одну транзакцию vacuum
+
 default_props = DefaultBotProperties(parse_mode='HTML')
 
 # --- генерация кода (Ollama / LangChain) ---
 ENABLE_GEN = True  # можно отключить если не нужно
+OLLAMA_BASE_URL = os.getenv("OLLAMA_BASE_URL", "http://localhost:11434")
+OLLAMA_KEEP_ALIVE = os.getenv("OLLAMA_KEEP_ALIVE", "30m")   # сколько Ollama держит модель в памяти
+LLM_WARMUP = os.getenv("LLM_WARMUP", "1") == "1"             # прогреть модель при старте
+LLM_KEEPALIVE_PING_S = int(os.getenv("LLM_KEEPALIVE_PING_S", "600"))  # 0 — не пинговать
+
+# именованные модели для выбора в /gen: "fast=qwen2.5-coder:1.5b,quality=llama3:8b"
+GEN_MODELS = {
+    alias.strip(): model.strip()
+    for alias, _, model in (item.partition("=") for item in os.getenv("GEN_MODELS", "").split(",") if "=" in item)
+} or {"default": DEFAULT_MODEL}
 try:
     from langchain_core.output_parsers import StrOutputParser
     from langchain_core.prompts import ChatPromptTemplate
@@ -53,10 +188,11 @@ Return code enclosed in Markdown triple backticks with language 'python', then t
     PARSER = StrOutputParser()
 
     def build_llm(model_name: str) -> "ChatOllama":
-        return ChatOllama(model=model_name, temperature=0.2)
+        return ChatOllama(model=model_name, temperature=0.2, base_url=OLLAMA_BASE_URL, keep_alive=OLLAMA_KEEP_ALIVE)
 
 except Exception:
     ENABLE_GEN = False
     PROMPT = None
     PARSER = None
+    build_llm = None
 
@@ -1,6 +1,14 @@
 # -*- coding: utf-8 -*-
+import asyncio
+import time
+from contextlib import asynccontextmanager
+
 import aiosqlite
-from config import DB_PATH
+from metrics import TimedConnection
+from config import (
+    DB_PATH, DB_POOL_READERS, DB_CACHE_SIZE_KB, DB_MMAP_SIZE,
+    DB_STATEMENT_CACHE, DB_BUSY_TIMEOUT_MS,
+)
 
 async def fetchone(db, sql: str, params=()):
     cur = await db.execute(sql, params)
@@ -14,60 +22,458 @@ async def fetchall(db, sql: str, params=()):
     await cur.close()
     return rows
 
+async def allocate_user_ids(db) -> int:
+    """
+    Первый свободный users.UserID (UserID не автоинкремент); все следующие за ним
+    тоже свободны — пачке берём подряд. Вызывать после BEGIN IMMEDIATE: чтение
+    MAX идёт уже под блокировкой записи, другой процесс не возьмёт тот же номер.
+    """
+    row = await fetchone(db, "SELECT COALESCE(MAX(UserID), 9999) AS last FROM users")
+    return row["last"] + 1
+
+# -------------------------------
+# Миграции схемы
+# -------------------------------
+# Версия схемы хранится в PRAGMA user_version. Каждая миграция выполняется
+# в своей транзакции вместе с записью новой версии; уже применённые пропускаются.
+
+async def _ensure_column(db, table: str, column: str, decl: str):
+    cur = await db.execute(f"PRAGMA table_info({table})")
+    cols = [r[1] for r in await cur.fetchall()]
+    await cur.close()
+    if column not in cols:
+        await db.execute(f"ALTER TABLE {table} ADD COLUMN {column} {decl}")
+
+async def _run(db, statements):
+    for sql in statements:
+        await db.execute(sql)
+
+
+async def _m1_baseline(db):
+    """
+    Схема, как её создавал прежний ensure_db (время — ISO-строки).
+    Идемпотентна: подхватывает и пустую БД, и БД, созданную до появления миграций.
+    """
+    await _run(db, [
+        """CREATE TABLE IF NOT EXISTS classes (
+             id             INTEGER PRIMARY KEY AUTOINCREMENT,
+             name           TEXT    NOT NULL UNIQUE,
+             owner_chat_id  INTEGER NOT NULL,
+             timezone       TEXT    NOT NULL
+           )""",
+        # Привязки пользователь ↔ класс; student_id соответствует users.UserID
+        """CREATE TABLE IF NOT EXISTS enrollments (
+             student_id INTEGER NOT NULL,
+             class_id   INTEGER NOT NULL,
+             UNIQUE (student_id, class_id)
+           )""",
+        """CREATE TABLE IF NOT EXISTS tasks (
+             id          INTEGER PRIMARY KEY AUTOINCREMENT,
+             class_id    INTEGER NOT NULL,
+             title       TEXT    NOT NULL,
+             description TEXT,
+             due_utc     TEXT    NOT NULL,
+             created_utc TEXT    NOT NULL
+           )""",
+        """CREATE TABLE IF NOT EXISTS jobs (
+             id         INTEGER PRIMARY KEY AUTOINCREMENT,
+             task_id    INTEGER NOT NULL,
+             run_at_utc TEXT    NOT NULL,
+             kind       TEXT    NOT NULL,
+             delivered_utc TEXT,
+             UNIQUE (task_id, run_at_utc, kind)
+           )""",
+        # ВАЖНО: UserID — PRIMARY KEY, НО БЕЗ AUTOINCREMENT (как просили)
+        """CREATE TABLE IF NOT EXISTS "users" (
+             "UserID"  INTEGER,
+             "name"    TEXT,
+             "post"    TEXT NOT NULL,
+             "active"  INTEGER NOT NULL DEFAULT 0,
+             PRIMARY KEY("UserID")
+           )""",
+        """CREATE TABLE IF NOT EXISTS tasks_archive (
+             id           INTEGER PRIMARY KEY,
+             class_id     INTEGER NOT NULL,
+             title        TEXT    NOT NULL,
+             description  TEXT,
+             due_utc      TEXT    NOT NULL,
+             created_utc  TEXT    NOT NULL,
+             archived_utc TEXT    NOT NULL
+           )""",
+        # Кэш результатов генерации (см. gen_cache.py)
+        """CREATE TABLE IF NOT EXISTS gen_cache (
+             key          TEXT PRIMARY KEY,
+             model        TEXT    NOT NULL,
+             description  TEXT    NOT NULL,
+             result       TEXT    NOT NULL,
+             size         INTEGER NOT NULL,
+             created_utc  TEXT    NOT NULL,
+             last_hit_utc TEXT    NOT NULL,
+             hits         INTEGER NOT NULL DEFAULT 0
+           )""",
+    ])
+    await _ensure_column(db, "jobs", "delivered_utc", "TEXT")
+    await _run(db, [
+        "CREATE INDEX IF NOT EXISTS idx_enrollments_student ON enrollments(student_id)",
+        "CREATE INDEX IF NOT EXISTS idx_enrollments_class   ON enrollments(class_id)",
+        "CREATE INDEX IF NOT EXISTS idx_gen_cache_last_hit  ON gen_cache(last_hit_utc)",
+        "CREATE INDEX IF NOT EXISTS idx_classes_owner       ON classes(owner_chat_id)",
+    ])
+
+
+async def _m2_epoch_timestamps(db):
+    """
+    Время заданий и напоминаний — целые секунды Unix (UTC) вместо ISO-строк:
+    сравнения по индексам без разбора строк. Таблицы пересоздаются с переносом данных.
+    """
+    seq = {r["name"]: r["seq"] for r in await fetchall(db, "SELECT name, seq FROM sqlite_sequence")}
+    await _run(db, [
+        """CREATE TABLE tasks_new (
+             id          INTEGER PRIMARY KEY AUTOINCREMENT,
+             class_id    INTEGER NOT NULL,
+             title       TEXT    NOT NULL,
+             description TEXT,
+             due_ts      INTEGER NOT NULL,   -- дедлайн, Unix-время UTC
+             created_ts  INTEGER NOT NULL
+           )""",
+        """INSERT INTO tasks_new(id, class_id, title, description, due_ts, created_ts)
+           SELECT id, class_id, title, description,
+                  CAST(strftime('%s', due_utc) AS INTEGER), CAST(strftime('%s', created_utc) AS INTEGER)
+           FROM tasks""",
+        "DROP TABLE tasks",
+        "ALTER TABLE tasks_new RENAME TO tasks",
+
+        """CREATE TABLE jobs_new (
+             id           INTEGER PRIMARY KEY AUTOINCREMENT,
+             task_id      INTEGER NOT NULL,
+             run_at_ts    INTEGER NOT NULL,   -- когда отправить, Unix-время UTC
+             kind         TEXT    NOT NULL,
+             delivered_ts INTEGER,            -- NULL, пока напоминание не отправлено
+             UNIQUE (task_id, run_at_ts, kind)
+           )""",
+        """INSERT OR IGNORE INTO jobs_new(id, task_id, run_at_ts, kind, delivered_ts)
+           SELECT id, task_id, CAST(strftime('%s', run_at_utc) AS INTEGER), kind,
+                  CAST(strftime('%s', delivered_utc) AS INTEGER)
+           FROM jobs""",
+        "DROP TABLE jobs",
+        "ALTER TABLE jobs_new RENAME TO jobs",
+
+        """CREATE TABLE tasks_archive_new (
+             id          INTEGER PRIMARY KEY,
+             class_id    INTEGER NOT NULL,
+             title       TEXT    NOT NULL,
+             description TEXT,
+             due_ts      INTEGER NOT NULL,
+             created_ts  INTEGER NOT NULL,
+             archived_ts INTEGER NOT NULL
+           )""",
+        """INSERT INTO tasks_archive_new(id, class_id, title, description, due_ts, created_ts, archived_ts)
+           SELECT id, class_id, title, description, CAST(strftime('%s', due_utc) AS INTEGER),
+                  CAST(strftime('%s', created_utc) AS INTEGER), CAST(strftime('%s', archived_utc) AS INTEGER)
+           FROM tasks_archive""",
+        "DROP TABLE tasks_archive",
+        "ALTER TABLE tasks_archive_new RENAME TO tasks_archive",
+
+        "CREATE INDEX idx_tasks_class_due ON tasks(class_id, due_ts, id)",   # списки и диапазоны по классу
+        "CREATE INDEX idx_tasks_due       ON tasks(due_ts)",                 # очистка по дедлайну
+        "CREATE INDEX idx_jobs_task       ON jobs(task_id)",
+        "CREATE INDEX idx_jobs_pending    ON jobs(run_at_ts) WHERE delivered_ts IS NULL",  # окно напоминаний
+    ])
+    # AUTOINCREMENT не должен выдавать id, которые уже были (в т.ч. удалённые)
+    for name in ("tasks", "jobs"):
+        if name in seq:
+            await db.execute("UPDATE sqlite_sequence SET seq = MAX(seq, ?) WHERE name = ?", (seq[name], name))
+
+
+async def _m3_fsm_state(db):
+    """Состояние диалогов: переживает рестарт и общее для нескольких процессов бота."""
+    await _run(db, [
+        """CREATE TABLE IF NOT EXISTS fsm_state (
+             user_id    INTEGER PRIMARY KEY,
+             state      TEXT    NOT NULL,   -- JSON {"mode", "step", "data", "chat_id"}
+             updated_ts INTEGER NOT NULL
+           )""",
+        "CREATE INDEX IF NOT EXISTS idx_fsm_state_updated ON fsm_state(updated_ts)",
+    ])
+
+
+async def _m4_leader_lease(db):
+    """Аренда ведущего процесса (см. leader.py)."""
+    await _run(db, [
+        """CREATE TABLE IF NOT EXISTS leader_lease (
+             name       TEXT PRIMARY KEY,
+             holder     TEXT NOT NULL,   -- host:pid
+             expires_ts REAL NOT NULL
+           )""",
+    ])
+
+
+async def _m5_cache_versions(db):
+    """Счётчики изменений для кэшей в памяти процессов (см. class_cache.py)."""
+    await _run(db, [
+        """CREATE TABLE IF NOT EXISTS cache_versions (
+             name    TEXT PRIMARY KEY,
+             version INTEGER NOT NULL
+           )""",
+        "INSERT OR IGNORE INTO cache_versions(name, version) VALUES('classes', 0)",
+        """CREATE TRIGGER IF NOT EXISTS trg_classes_ins AFTER INSERT ON classes BEGIN
+             UPDATE cache_versions SET version = version + 1 WHERE name = 'classes'; END""",
+        """CREATE TRIGGER IF NOT EXISTS trg_classes_upd AFTER UPDATE ON classes BEGIN
+             UPDATE cache_versions SET version = version + 1 WHERE name = 'classes'; END""",
+        """CREATE TRIGGER IF NOT EXISTS trg_classes_del AFTER DELETE ON classes BEGIN
+             UPDATE cache_versions SET version = version + 1 WHERE name = 'classes'; END""",
+    ])
+
+
+async def _m6_owner_settings(db):
+    """Настройки владельца классов (чат преподавателя): сводка напоминаний и т.п."""
+    await _run(db, [
+        """CREATE TABLE IF NOT EXISTS owner_settings (
+             chat_id    INTEGER PRIMARY KEY,
+             digest     INTEGER NOT NULL DEFAULT 0,   -- 1: напоминания одним сообщением за окно
+             updated_ts INTEGER NOT NULL
+           )""",
+    ])
+
+
+async def _m7_users_username(db):
+    """Telegram-username ученика (необязателен; заполняется импортом ростера и добавлением)."""
+    await _ensure_column(db, "users", "username", "TEXT")
+
+
+async def _m8_search(db):
+    """
+    Полнотекстовый поиск по именам учеников и классов (см. search.py).
+    FTS5 с внешним содержимым: индекс хранит только токены, строки — в users/classes,
+    синхронизация — триггерами. unicode61 сворачивает регистр, в т.ч. кириллицу.
+    """
+    await _run(db, [
+        """CREATE VIRTUAL TABLE IF NOT EXISTS users_fts USING fts5(
+             name, username, content='users', content_rowid='UserID',
+             tokenize='unicode61 remove_diacritics 2', prefix='2 3'
+           )""",
+        """CREATE TRIGGER IF NOT EXISTS trg_users_fts_ins AFTER INSERT ON users BEGIN
+             INSERT INTO users_fts(rowid, name, username) VALUES (new.UserID, new.name, new.username); END""",
+        """CREATE TRIGGER IF NOT EXISTS trg_users_fts_del AFTER DELETE ON users BEGIN
+             INSERT INTO users_fts(users_fts, rowid, name, username)
+             VALUES ('delete', old.UserID, old.name, old.username); END""",
+        """CREATE TRIGGER IF NOT EXISTS trg_users_fts_upd AFTER UPDATE OF UserID, name, username ON users BEGIN
+             INSERT INTO users_fts(users_fts, rowid, name, username)
+             VALUES ('delete', old.UserID, old.name, old.username);
+             INSERT INTO users_fts(rowid, name, username) VALUES (new.UserID, new.name, new.username); END""",
+        "INSERT INTO users_fts(users_fts) VALUES ('rebuild')",
+        """CREATE VIRTUAL TABLE IF NOT EXISTS classes_fts USING fts5(
+             name, content='classes', content_rowid='id',
+             tokenize='unicode61 remove_diacritics 2', prefix='2 3'
+           )""",
+        """CREATE TRIGGER IF NOT EXISTS trg_classes_fts_ins AFTER INSERT ON classes BEGIN
+             INSERT INTO classes_fts(rowid, name) VALUES (new.id, new.name); END""",
+        """CREATE TRIGGER IF NOT EXISTS trg_classes_fts_del AFTER DELETE ON classes BEGIN
+             INSERT INTO classes_fts(classes_fts, rowid, name) VALUES ('delete', old.id, old.name); END""",
+        """CREATE TRIGGER IF NOT EXISTS trg_classes_fts_upd AFTER UPDATE OF id, name ON classes BEGIN
+             INSERT INTO classes_fts(classes_fts, rowid, name) VALUES ('delete', old.id, old.name);
+             INSERT INTO classes_fts(rowid, name) VALUES (new.id, new.name); END""",
+        "INSERT INTO classes_fts(classes_fts) VALUES ('rebuild')",
+        # список учеников по страницам — без сортировки всей таблицы
+        "CREATE INDEX IF NOT EXISTS idx_users_student_name ON users(name COLLATE NOCASE) WHERE post = 'student'",
+    ])
+
+
+async def _m9_jobs_version(db):
+    """
+    Счётчик вставок в jobs: ведущий процесс сверяется с ним и перечитывает окно
+    напоминаний, когда задание добавлено в другом процессе (см. reminders.py).
+    """
+    await _run(db, [
+        "INSERT OR IGNORE INTO cache_versions(name, version) VALUES('jobs', 0)",
+        """CREATE TRIGGER IF NOT EXISTS trg_jobs_ins AFTER INSERT ON jobs BEGIN
+             UPDATE cache_versions SET version = version + 1 WHERE name = 'jobs'; END""",
+    ])
+
+
+MIGRATIONS = [
+    (1, "базовая схема", _m1_baseline),
+    (2, "время в Unix-секундах, индексы по дедлайнам и напоминаниям", _m2_epoch_timestamps),
+    (3, "состояние диалогов", _m3_fsm_state),
+    (4, "аренда ведущего процесса", _m4_leader_lease),
+    (5, "версии кэшей", _m5_cache_versions),
+    (6, "настройки владельцев", _m6_owner_settings),
+    (7, "username учеников", _m7_users_username),
+    (8, "полнотекстовый поиск по ученикам и классам", _m8_search),
+    (9, "счётчик новых напоминаний", _m9_jobs_version),
+]
+SCHEMA_VERSION = MIGRATIONS[-1][0]
+
+
+async def migrate(db) -> int:
+    """Применяет недостающие миграции по порядку; возвращает итоговую версию схемы."""
+    version = (await fetchone(db, "PRAGMA user_version"))[0]
+    for target, title, migration in MIGRATIONS:
+        if target <= version:
+            continue
+        await db.execute("BEGIN IMMEDIATE")
+        # другой процесс мог применить миграцию, пока мы ждали блокировку
+        version = (await fetchone(db, "PRAGMA user_version"))[0]
+        if target <= version:
+            await db.execute("COMMIT")
+            continue
+        try:
+            await migration(db)
+            await db.execute(f"PRAGMA user_version = {target}")
+            await db.execute("COMMIT")
+        except BaseException:
+            await db.execute("ROLLBACK")
+            raise
+        print(f"Схема БД: миграция {target} применена ({title})")
+        version = target
+    return version
+
+
 async def ensure_db():
-    async with aiosqlite.connect(DB_PATH) as db:
-        await db.executescript("""
-        PRAGMA journal_mode = WAL;
-PRAGMA foreign_keys = OFF;  -- внешние ключи не используются в этой схеме
-
--- Таблица классов
-CREATE TABLE IF NOT EXISTS classes (
-  id             INTEGER PRIMARY KEY AUTOINCREMENT,
-  name           TEXT    NOT NULL UNIQUE,
-  owner_chat_id  INTEGER NOT NULL,
-  timezone       TEXT    NOT NULL
-);
-
--- Привязки пользователь ↔ класс
-CREATE TABLE IF NOT EXISTS enrollments (
-  student_id INTEGER NOT NULL,  -- соответствует users.UserID
-  class_id   INTEGER NOT NULL,
-  UNIQUE (student_id, class_id)
-);
-
--- Задачи
-CREATE TABLE IF NOT EXISTS tasks (
-  id          INTEGER PRIMARY KEY AUTOINCREMENT,
-  class_id    INTEGER NOT NULL,
-  title       TEXT    NOT NULL,
-  description TEXT,
-  due_utc     TEXT    NOT NULL,
-  created_utc TEXT    NOT NULL
-);
-
--- Джобы-напоминания
-CREATE TABLE IF NOT EXISTS jobs (
-  id         INTEGER PRIMARY KEY AUTOINCREMENT,
-  task_id    INTEGER NOT NULL,
-  run_at_utc TEXT    NOT NULL,
-  kind       TEXT    NOT NULL,
-  UNIQUE (task_id, run_at_utc, kind)
-);
-
--- Пользователи
--- ВАЖНО: UserID — PRIMARY KEY, НО БЕЗ AUTOINCREMENT (как просили)
-CREATE TABLE IF NOT EXISTS "users" (
-	"UserID"	INTEGER,
-	"name"	TEXT,
-	"post"	TEXT NOT NULL,
-	"active"	INTEGER NOT NULL DEFAULT 0,
-	PRIMARY KEY("UserID")
-);;
-
--- Индексы (по желанию, ускоряют выборки)
-CREATE INDEX IF NOT EXISTS idx_enrollments_student ON enrollments(student_id);
-CREATE INDEX IF NOT EXISTS idx_enrollments_class   ON enrollments(class_id);
-CREATE INDEX IF NOT EXISTS idx_tasks_class         ON tasks(class_id);
-CREATE INDEX IF NOT EXISTS idx_jobs_task           ON jobs(task_id);
-        """)
-        await db.commit()
+    # isolation_level=None — транзакциями миграций управляем сами
+    async with aiosqlite.connect(DB_PATH, isolation_level=None) as db:
+        db.row_factory = aiosqlite.Row
+        await db.execute(f"PRAGMA busy_timeout = {DB_BUSY_TIMEOUT_MS}")
+        await db.execute("PRAGMA auto_vacuum = INCREMENTAL")  # действует для новой БД; старую переводим ниже
+        await db.execute("PRAGMA journal_mode = WAL")
+        await db.execute("PRAGMA foreign_keys = OFF")         # внешние ключи не используются в этой схеме
+        await migrate(db)
+
+        # incremental_vacuum работает только при auto_vacuum=INCREMENTAL (2);
+        # существующую БД переводим один раз через VACUUM
+        mode = (await fetchone(db, "PRAGMA auto_vacuum"))[0]
+        if mode != 2:
+            await db.execute("PRAGMA auto_vacuum = INCREMENTAL")
+            await db.execute("VACUUM")
+
+
+# -------------------------------
+# Пул соединений
+# -------------------------------
+class DBPool:
+    """
+    Долгоживущие соединения с SQLite: N читателей и один писатель.
+    Соединения открываются и настраиваются один раз при старте,
+    хендлеры и джобы берут их через db_read() / db_write().
+    """
+
+    def __init__(self, path: str, readers: int = DB_POOL_READERS):
+        self.path = path
+        self.readers_count = max(1, readers)
+        self._readers: asyncio.Queue = asyncio.Queue()
+        self._all: list = []
+        self._writer = None
+        self._writer_lock = asyncio.Lock()
+        self._opened_at = 0.0
+        # статистика: {"reader"|"writer": {...}}
+        self._stats = {
+            role: {"acquired": 0, "wait_total": 0.0, "wait_max": 0.0, "busy_total": 0.0}
+            for role in ("reader", "writer")
+        }
+
+    async def _connect(self, readonly: bool):
+        db = await aiosqlite.connect(self.path, cached_statements=DB_STATEMENT_CACHE)
+        db.row_factory = aiosqlite.Row
+        await db.execute(f"PRAGMA busy_timeout = {DB_BUSY_TIMEOUT_MS}")
+        await db.execute("PRAGMA synchronous = NORMAL")
+        await db.execute(f"PRAGMA cache_size = -{DB_CACHE_SIZE_KB}")
+        await db.execute(f"PRAGMA mmap_size = {DB_MMAP_SIZE}")
+        await db.execute("PRAGMA temp_store = MEMORY")
+        if readonly:
+            await db.execute("PRAGMA query_only = 1")
+        self._all.append(db)
+        # хендлеры и джобы получают обёртку, которая меряет каждое выражение
+        return TimedConnection(db)
+
+    async def open(self):
+        self._writer = await self._connect(readonly=False)
+        await self._writer.execute("PRAGMA journal_mode = WAL")
+        for _ in range(self.readers_count):
+            self._readers.put_nowait(await self._connect(readonly=True))
+        self._opened_at = time.monotonic()
+
+    async def close(self):
+        for db in self._all:
+            await db.close()
+        self._all.clear()
+        self._writer = None
+        self._readers = asyncio.Queue()
+
+    def _account(self, role: str, waited: float, busy: float):
+        st = self._stats[role]
+        st["acquired"] += 1
+        st["wait_total"] += waited
+        st["wait_max"] = max(st["wait_max"], waited)
+        st["busy_total"] += busy
+
+    @asynccontextmanager
+    async def reader(self):
+        t0 = time.monotonic()
+        db = await self._readers.get()
+        t1 = time.monotonic()
+        try:
+            yield db
+        finally:
+            self._readers.put_nowait(db)
+            self._account("reader", t1 - t0, time.monotonic() - t1)
+
+    @asynccontextmanager
+    async def writer(self):
+        """Единственный писатель. Коммит при выходе, откат при исключении."""
+        t0 = time.monotonic()
+        async with self._writer_lock:
+            t1 = time.monotonic()
+            try:
+                yield self._writer
+                await self._writer.commit()
+            except BaseException:
+                await self._writer.rollback()
+                raise
+            finally:
+                self._account("writer", t1 - t0, time.monotonic() - t1)
+
+    def stats(self) -> dict:
+        """Время ожидания соединения и загрузка пула (доля занятого времени)."""
+        uptime = max(time.monotonic() - self._opened_at, 1e-9)
+        out = {}
+        for role, st in self._stats.items():
+            size = self.readers_count if role == "reader" else 1
+            n = st["acquired"]
+            out[role] = {
+                "size": size,
+                "acquired": n,
+                "wait_avg_ms": round(st["wait_total"] / n * 1000, 3) if n else 0.0,
+                "wait_max_ms": round(st["wait_max"] * 1000, 3),
+                "utilization": round(st["busy_total"] / (uptime * size), 4),
+            }
+        out["reader"]["idle"] = self._readers.qsize()
+        return out
+
+
+POOL: DBPool | None = None
+
+async def init_pool(path: str = DB_PATH, readers: int = DB_POOL_READERS) -> DBPool:
+    global POOL
+    if POOL is None:
+        POOL = DBPool(path, readers)
+        await POOL.open()
+    return POOL
+
+async def close_pool():
+    global POOL
+    if POOL is not None:
+        await POOL.close()
+        POOL = None
+
+def _pool() -> DBPool:
+    if POOL is None:
+        raise RuntimeError("Пул БД не инициализирован (вызовите init_pool() при старте)")
+    return POOL
+
+def db_read():
+    """async with db_read() as db: ... — соединение только для чтения."""
+    return _pool().reader()
+
+def db_write():
+    """async with db_write() as db: ... — единственное соединение-писатель."""
+    return _pool().writer()
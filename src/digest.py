@@ -0,0 +1,117 @@
+# -*- coding: utf-8 -*-
+"""
+Сводка напоминаний для владельца классов.
+
+У преподавателя с несколькими классами и общим дедлайном T-24h/T-3h/T-15m
+срабатывают почти одновременно по каждому заданию. Если у владельца включена
+сводка (owner_settings.digest), первое напоминание открывает окно
+REMINDER_DIGEST_WINDOW_S; всё, что сработает у того же owner_chat_id до его
+конца, уходит одним сообщением, отсортированным по классу и дедлайну.
+
+add() ждёт отправки сводки и возвращает её результат — для ReminderEngine это
+обычная доставка: не ушло — строки jobs снова помечаются недоставленными.
+"""
+import asyncio
+import time
+from typing import Awaitable, Callable
+
+from config import REMINDER_DIGEST_WINDOW_S, REMINDER_DIGEST_DEFAULT
+from db import fetchone, db_read, db_write
+from metrics import REMINDERS
+from utils import split_text
+
+# send(chat_id, text) — отправка одного сообщения; исключение = не доставлено
+Sender = Callable[[int, str], Awaitable[None]]
+
+
+async def digest_enabled(chat_id: int) -> bool:
+    async with db_read() as db:
+        row = await fetchone(db, "SELECT digest FROM owner_settings WHERE chat_id = ?", (chat_id,))
+    return bool(row["digest"]) if row else REMINDER_DIGEST_DEFAULT
+
+
+async def set_digest(chat_id: int, enabled: bool) -> None:
+    async with db_write() as db:
+        await db.execute(
+            """INSERT INTO owner_settings(chat_id, digest, updated_ts) VALUES (?, ?, ?)
+               ON CONFLICT(chat_id) DO UPDATE SET digest = excluded.digest, updated_ts = excluded.updated_ts""",
+            (chat_id, int(enabled), int(time.time()))
+        )
+
+
+def render_digest(items: list[dict]) -> str:
+    """
+    items: [{"class_name", "title", "due_local", "tz", "due_ts", "label", ...}, ...].
+    Группы по классам (по имени), внутри — по дедлайну.
+    """
+    items = sorted(items, key=lambda i: (i["class_name"].lower(), i["due_ts"], i["title"]))
+    lines = [f"⏰ <b>Напоминания</b> ({len(items)})"]
+    current = None
+    for item in items:
+        if item["class_name"] != current:
+            current = item["class_name"]
+            lines.append(f"\n<b>{current}</b>")
+        lines.append(f"• {item['title']} — {item['due_local']} {item['tz']} ({item['label']})")
+    return "\n".join(lines)
+
+
+class ReminderDigest:
+    def __init__(self, send: Sender | None = None, window: float = REMINDER_DIGEST_WINDOW_S):
+        self.send = send
+        self.window = window
+        self._pending: dict = {}   # chat_id -> [(item, future), ...]
+        self._timers: dict = {}    # chat_id -> asyncio.Task
+        self.stats = {"items": 0, "messages": 0}
+
+    async def add(self, chat_id: int, item: dict) -> bool:
+        """
+        Ставит напоминание в сводку владельца; True — сводка отправлена.
+        item["text"] — полный текст одиночного напоминания: если за окно больше
+        ничего не пришло, уходит он, а не сводка из одной строки.
+        """
+        fut = asyncio.get_running_loop().create_future()
+        self._pending.setdefault(chat_id, []).append((item, fut))
+        if chat_id not in self._timers:
+            self._timers[chat_id] = asyncio.create_task(self._flush_later(chat_id))
+        # shield: отмена ожидающего (остановка движка) не отменяет саму отправку
+        return await asyncio.shield(fut)
+
+    def pending(self) -> int:
+        return sum(len(v) for v in self._pending.values())
+
+    async def _flush_later(self, chat_id: int) -> None:
+        try:
+            await asyncio.sleep(self.window)
+        except asyncio.CancelledError:
+            return
+        await self._flush(chat_id)
+
+    async def _flush(self, chat_id: int) -> None:
+        self._timers.pop(chat_id, None)
+        entries = self._pending.pop(chat_id, [])
+        if not entries:
+            return
+        items = [item for item, _ in entries]
+        text = items[0]["text"] if len(items) == 1 else render_digest(items)
+        delivered = True
+        try:
+            for chunk in split_text(text):
+                await self.send(chat_id, chunk)
+                self.stats["messages"] += 1
+        except Exception as e:
+            print(f"Не удалось отправить сводку напоминаний chat={chat_id} ({len(items)} шт.): {e}")
+            delivered = False
+        self.stats["items"] += len(items)
+        if len(items) > 1:
+            REMINDERS.inc(len(items), status="digested")
+        for _, fut in entries:
+            if not fut.done():
+                fut.set_result(delivered)
+
+    async def flush_all(self) -> None:
+        """Отправить всё накопленное сейчас, не дожидаясь окон (остановка ведущего)."""
+        timers, self._timers = self._timers, {}
+        for t in timers.values():
+            t.cancel()
+        await asyncio.gather(*timers.values(), return_exceptions=True)
+        await asyncio.gather(*(self._flush(chat_id) for chat_id in list(self._pending)))
@@ -0,0 +1,115 @@
+# -*- coding: utf-8 -*-
+"""
+Кэш результатов генерации в SQLite.
+
+Ключ — хэш от нормализованного описания, имени модели и текста промпта,
+поэтому после правки PROMPT старые ответы просто перестают находиться.
+Записи живут GEN_CACHE_TTL_S, сверх лимитов вытесняются самые давно
+использованные (LRU по last_hit_utc).
+"""
+import hashlib
+import re
+from datetime import datetime, timedelta, timezone
+
+from config import PROMPT, GEN_CACHE_TTL_S, GEN_CACHE_MAX_ENTRIES, GEN_CACHE_MAX_BYTES
+from db import fetchone, db_read, db_write
+
+_WS = re.compile(r"\s+")
+_EDGE_PUNCT = ".,;:!?…-–— \"'«»"
+
+PROMPT_HASH = hashlib.sha256((PROMPT.pretty_repr() if PROMPT else "").encode("utf-8")).hexdigest()[:16]
+
+
+def normalize_description(desc: str) -> str:
+    """Регистр, ё/е, пробелы и пунктуация по краям не влияют на ключ."""
+    s = desc.lower().replace("ё", "е")
+    s = _WS.sub(" ", s)
+    return s.strip(_EDGE_PUNCT)
+
+
+def cache_key(desc: str, model_name: str) -> str:
+    raw = "\x1f".join((normalize_description(desc), model_name, PROMPT_HASH))
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+class GenCache:
+    def __init__(self, ttl: int = GEN_CACHE_TTL_S, max_entries: int = GEN_CACHE_MAX_ENTRIES,
+                 max_bytes: int = GEN_CACHE_MAX_BYTES):
+        self.ttl = timedelta(seconds=ttl)
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+
+    async def get(self, desc: str, model_name: str) -> str | None:
+        key = cache_key(desc, model_name)
+        now = datetime.now(timezone.utc)
+        async with db_read() as db:
+            row = await fetchone(
+                db, "SELECT result FROM gen_cache WHERE key = ? AND created_utc > ?",
+                (key, (now - self.ttl).isoformat())
+            )
+        if not row:
+            self.misses += 1
+            return None
+        self.hits += 1
+        async with db_write() as db:
+            await db.execute(
+                "UPDATE gen_cache SET last_hit_utc = ?, hits = hits + 1 WHERE key = ?",
+                (now.isoformat(), key)
+            )
+        return row["result"]
+
+    async def put(self, desc: str, model_name: str, result: str) -> None:
+        now_iso = datetime.now(timezone.utc).isoformat()
+        async with db_write() as db:
+            await db.execute(
+                """INSERT OR REPLACE INTO gen_cache(key, model, description, result, size, created_utc, last_hit_utc, hits)
+                   VALUES (?, ?, ?, ?, ?, ?, ?, 0)""",
+                (cache_key(desc, model_name), model_name, normalize_description(desc),
+                 result, len(result.encode("utf-8")), now_iso, now_iso)
+            )
+            await self._evict(db)
+
+    async def _evict(self, db) -> None:
+        await db.execute(
+            "DELETE FROM gen_cache WHERE created_utc <= ?",
+            ((datetime.now(timezone.utc) - self.ttl).isoformat(),)
+        )
+        row = await fetchone(db, "SELECT COUNT(*) AS n, COALESCE(SUM(size), 0) AS total FROM gen_cache")
+        n, total = row["n"], row["total"]
+        if n <= self.max_entries and total <= self.max_bytes:
+            return
+        # вытесняем самые давно использованные, пока не влезем в оба лимита
+        cur = await db.execute("SELECT key, size FROM gen_cache ORDER BY last_hit_utc ASC")
+        victims = []
+        async for key, size in cur:
+            if n <= self.max_entries and total <= self.max_bytes:
+                break
+            victims.append((key,))
+            n -= 1
+            total -= size
+        await cur.close()
+        await db.executemany("DELETE FROM gen_cache WHERE key = ?", victims)
+
+    async def purge(self) -> int:
+        async with db_write() as db:
+            cur = await db.execute("DELETE FROM gen_cache")
+            deleted = cur.rowcount
+        self.hits = self.misses = 0
+        return deleted
+
+    async def stats(self) -> dict:
+        async with db_read() as db:
+            row = await fetchone(db, "SELECT COUNT(*) AS n, COALESCE(SUM(size), 0) AS total FROM gen_cache")
+        lookups = self.hits + self.misses
+        return {
+            "entries": row["n"],
+            "bytes": row["total"],
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+        }
+
+
+GEN_CACHE = GenCache()
@@ -0,0 +1,151 @@
+# -*- coding: utf-8 -*-
+"""
+Очередь генерации перед локальной моделью.
+
+- не больше GEN_CONCURRENCY одновременных вызовов модели;
+- FIFO, у каждого пользователя не больше одной задачи в очереди/в работе;
+- одинаковые описания (тот же ключ кэша) склеиваются в один вызов модели;
+- очередь ограничена GEN_QUEUE_MAX — сверх неё сразу отказ (QueueFull);
+- ждущие получают номер позиции через колбэк on_position(pos), 0 — «в работе»,
+  и накопленный текст ответа через on_progress(text) по мере генерации.
+"""
+import asyncio
+from collections import deque
+from typing import Any, Awaitable, Callable
+
+from config import GEN_CONCURRENCY, GEN_QUEUE_MAX
+from gen_cache import cache_key
+
+
+class QueueFull(Exception):
+    """Очередь генерации заполнена."""
+
+
+class AlreadyQueued(Exception):
+    """У пользователя уже есть задача в очереди или в работе."""
+
+
+class _Job:
+    __slots__ = ("key", "desc", "model_name", "future", "listeners", "progress_listeners", "text")
+
+    def __init__(self, key: str, desc: str, model_name: str, future: asyncio.Future):
+        self.key = key
+        self.desc = desc
+        self.model_name = model_name
+        self.future = future
+        self.listeners: list = []
+        self.progress_listeners: list = []
+        self.text = ""
+
+    def announce(self, pos: int) -> None:
+        for cb in self.listeners:
+            asyncio.create_task(_safe(cb(pos)))
+
+    def report(self, text: str) -> None:
+        """Вызывается раннером по мере генерации; слушатели синхронные и дешёвые."""
+        self.text = text
+        for cb in self.progress_listeners:
+            cb(text)
+
+
+async def _safe(coro) -> None:
+    try:
+        await coro
+    except Exception:
+        # обновление позиции — косметика, ошибки редактирования не важны
+        pass
+
+
+class GenScheduler:
+    def __init__(self, runner: Callable[[str, str, Callable[[str], None]], Awaitable[Any]],
+                 concurrency: int = GEN_CONCURRENCY, max_queue: int = GEN_QUEUE_MAX):
+        """
+        runner(desc, model_name, report) -> результат генерации (его получают все склеенные запросы);
+        report(text) — промежуточный текст.
+        """
+        self.runner = runner
+        self.concurrency = max(1, concurrency)
+        self.max_queue = max_queue
+        self._queue: deque = deque()
+        self._jobs: dict = {}      # key -> _Job (в очереди или в работе)
+        self._users: set = set()
+        self._ready: asyncio.Event | None = None
+        self._workers: list = []
+        self.stats = {"submitted": 0, "coalesced": 0, "rejected": 0}
+
+    def start(self) -> None:
+        if self._workers:
+            return
+        self._ready = asyncio.Event()
+        self._workers = [asyncio.create_task(self._worker()) for _ in range(self.concurrency)]
+
+    async def stop(self) -> None:
+        for t in self._workers:
+            t.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+
+    def depth(self) -> int:
+        return len(self._queue)
+
+    async def submit(self, user_id: int, desc: str, model_name: str,
+                     on_position: Callable[[int], Awaitable] | None = None,
+                     on_progress: Callable[[str], None] | None = None) -> Any:
+        if user_id in self._users:
+            raise AlreadyQueued()
+        self.start()
+        key = cache_key(desc, model_name)
+        job = self._jobs.get(key)
+        if job is not None:
+            self.stats["coalesced"] += 1
+        else:
+            if len(self._queue) >= self.max_queue:
+                self.stats["rejected"] += 1
+                raise QueueFull()
+            job = _Job(key, desc, model_name, asyncio.get_running_loop().create_future())
+            self._jobs[key] = job
+            self._queue.append(job)
+            self._ready.set()
+        self.stats["submitted"] += 1
+        if on_position is not None:
+            job.listeners.append(on_position)
+            pos = self._queue.index(job) + 1 if job in self._queue else 0
+            asyncio.create_task(_safe(on_position(pos)))
+        if on_progress is not None:
+            job.progress_listeners.append(on_progress)
+            if job.text:
+                on_progress(job.text)
+
+        self._users.add(user_id)
+        try:
+            # shield: если один из ждущих ушёл, остальные всё равно получат результат
+            return await asyncio.shield(job.future)
+        finally:
+            self._users.discard(user_id)
+
+    def _announce_positions(self) -> None:
+        for i, job in enumerate(self._queue, start=1):
+            job.announce(i)
+
+    async def _worker(self) -> None:
+        while True:
+            while not self._queue:
+                self._ready.clear()
+                await self._ready.wait()
+            job = self._queue.popleft()
+            job.announce(0)
+            self._announce_positions()
+            try:
+                result = await self.runner(job.desc, job.model_name, job.report)
+            except asyncio.CancelledError:
+                job.future.cancel()
+                raise
+            except Exception as e:
+                job.future.set_exception(e)
+            else:
+                job.future.set_result(result)
+            finally:
+                self._jobs.pop(job.key, None)
+                # никто не дождался — не оставляем «Future exception was never retrieved»
+                if job.future.done() and not job.future.cancelled():
+                    job.future.exception()
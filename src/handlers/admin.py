@@ -0,0 +1,39 @@
+# -*- coding: utf-8 -*-
+from aiogram import Router, F
+from aiogram.types import Message
+from aiogram.filters import Command
+
+from config import ADMIN_IDS
+from gen_cache import GEN_CACHE
+from codecheck import CHECKER
+
+# служебные команды — только для ADMIN_IDS из .env
+router = Router()
+router.message.filter(F.from_user.id.in_(ADMIN_IDS))
+
+@router.message(Command("gen_cache"))
+async def cmd_gen_cache(msg: Message):
+    st = await GEN_CACHE.stats()
+    await msg.answer(
+        "🗄 <b>Кэш генерации</b>\n\n"
+        f"Записей: <b>{st['entries']}</b> ({st['bytes'] / 1024:.1f} КБ)\n"
+        f"Попаданий: <b>{st['hits']}</b>, промахов: <b>{st['misses']}</b> "
+        f"(hit rate {st['hit_rate']:.0%})\n\n"
+        "Очистить: /gen_cache_purge"
+    )
+
+@router.message(Command("gen_cache_purge"))
+async def cmd_gen_cache_purge(msg: Message):
+    deleted = await GEN_CACHE.purge()
+    await msg.answer(f"🧹 Кэш генерации очищен, удалено записей: <b>{deleted}</b>")
+
+@router.message(Command("codecheck"))
+async def cmd_codecheck(msg: Message):
+    st = CHECKER.summary()
+    await msg.answer(
+        "🧪 <b>Проверка сгенерированного кода</b>\n\n"
+        f"Проверок: <b>{st['checked']}</b>, прошли: <b>{st['passed']}</b> "
+        f"(pass rate {st['pass_rate']:.0%})\n"
+        f"Среднее время: <b>{st['avg_ms']:.1f} мс</b>, таймаутов: {st['timeouts']}\n"
+        f"Исправлено моделью: <b>{st['repaired']}</b>, не удалось: {st['repair_failed']}"
+    )
@@ -3,8 +3,12 @@ from aiogram import Router, F
 from aiogram.types import Message, CallbackQuery
 from aiogram.filters import Command
 
-from keyboards import main_menu_kb, back_kb
-from callbacks import CB_BACK, CB_SETTINGS
+from config import REMINDER_DIGEST_WINDOW_S
+from keyboards import main_menu_kb, settings_kb
+from callbacks import CB_BACK, CB_SETTINGS, CB_SETTINGS_DIGEST, CB_NOOP, CB_CLASS_PICKER_PAGE
+from state import STATE
+from class_cache import CLASSES
+from digest import digest_enabled, set_digest
 
 router = Router()
 
@@ -31,18 +35,45 @@ async def cmd_help(msg: Message):
 
 @router.callback_query(F.data == CB_BACK)
 async def cb_back(cq: CallbackQuery):
-    # сброс in-memory FSM (если где-то был)
-    from handlers.text import USER_STATE
-    USER_STATE.pop(cq.from_user.id, None)
+    # сброс состояния диалога (если был)
+    await STATE.pop(cq.from_user.id)
     await show_main_menu(cq)
 
-@router.callback_query(F.data == CB_SETTINGS)
-async def cb_settings(cq: CallbackQuery):
-    from handlers.text import USER_STATE
-    USER_STATE.pop(cq.from_user.id, None)
+async def show_settings(cq: CallbackQuery, digest: bool):
     text = (
         "⚙️ <b>Настройки</b>\n\n"
         "• Таймзона: пока по умолчанию <b>UTC</b>.\n"
         "• В будущей версии тут можно будет выбрать свою IANA TZ.\n"
+        f"• Сводка напоминаний: всё, что сработало за {int(REMINDER_DIGEST_WINDOW_S)} с, "
+        "приходит одним сообщением по классам и дедлайнам.\n"
     )
-    await cq.message.edit_text(text, reply_markup=back_kb())
+    await cq.message.edit_text(text, reply_markup=settings_kb(digest))
+
+@router.callback_query(F.data == CB_SETTINGS)
+async def cb_settings(cq: CallbackQuery):
+    await STATE.pop(cq.from_user.id)
+    await show_settings(cq, await digest_enabled(cq.message.chat.id))
+
+@router.callback_query(F.data == CB_SETTINGS_DIGEST)
+async def cb_settings_digest(cq: CallbackQuery):
+    # владелец классов — чат, где их создали (classes.owner_chat_id)
+    digest = not await digest_enabled(cq.message.chat.id)
+    await set_digest(cq.message.chat.id, digest)
+    await show_settings(cq, digest)
+
+@router.callback_query(F.data == CB_NOOP)
+async def cb_noop(cq: CallbackQuery):
+    await cq.answer()
+
+@router.callback_query(F.data.startswith(CB_CLASS_PICKER_PAGE))
+async def cb_class_picker_page(cq: CallbackQuery):
+    # листаем любой выбор класса: меняем только клавиатуру, текст сообщения тот же
+    try:
+        page, prefix = cq.data[len(CB_CLASS_PICKER_PAGE):].split(":", 1)
+        page = int(page)
+    except ValueError:
+        return await cq.answer("Некорректные данные", show_alert=True)
+    kb = await CLASSES.picker_kb(prefix, page, owner_chat_id=cq.message.chat.id)
+    if kb is None:
+        return await cq.answer("Классов нет", show_alert=True)
+    await cq.message.edit_reply_markup(reply_markup=kb)
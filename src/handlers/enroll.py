@@ -1,21 +1,26 @@
 # src/handlers/enroll.py
 # -*- coding: utf-8 -*-
-import aiosqlite
 from aiogram import Router, F
 from aiogram.types import CallbackQuery
 
-from config import DB_PATH
-from db import fetchone, fetchall
-from keyboards import back_kb, single_col_kb
+from config import KB_PAGE_SIZE
+from db import fetchone, fetchall, db_read, db_write
+from keyboards import back_kb, paged_kb
 from callbacks import (
     CB_ENROLL,
+    CB_ENROLL_PAGE,
     CB_ENROLL_PICK_STU,
     CB_ENROLL_PICK_CLS,
     CB_STU_AFTER_ADD_SKIP,
 )
+from class_cache import CLASSES, register_picker
+from state import STATE
 
 router = Router()
 
+# выбор класса для ученика: в конце — «Пропустить»
+register_picker(CB_ENROLL_PICK_CLS, tail=lambda prefix: [("⏭ Пропустить", CB_STU_AFTER_ADD_SKIP)])
+
 
 def _title(row) -> str:
     """Отображаем имя ученика или его UserID."""
@@ -34,20 +39,38 @@ def _title(row) -> str:
 
 @router.callback_query(F.data == CB_ENROLL)
 async def cb_enroll(cq: CallbackQuery):
-    # Берём только студентов; если используете active=1 — раскомментируйте соответствующее условие
-    async with aiosqlite.connect(DB_PATH) as db:
-        db.row_factory = aiosqlite.Row
+    await _show_students(cq, 0)
+
+
+@router.callback_query(F.data.startswith(CB_ENROLL_PAGE))
+async def cb_enroll_page(cq: CallbackQuery):
+    try:
+        page = int(cq.data[len(CB_ENROLL_PAGE):])
+    except ValueError:
+        return await cq.answer("Некорректные данные", show_alert=True)
+    await _show_students(cq, page)
+
+
+async def _show_students(cq: CallbackQuery, page: int):
+    # только нужная страница: частичный индекс idx_users_student_name отдаёт её без сортировки всей таблицы
+    async with db_read() as db:
+        total = (await fetchone(db, "SELECT COUNT(*) AS n FROM users WHERE post = 'student'"))["n"]
+        page = min(max(page, 0), max(0, (total - 1) // KB_PAGE_SIZE))
         students = await fetchall(
             db,
             # добавьте 'AND active = 1' если нужно
-            "SELECT UserID, name FROM users WHERE post = 'student' ORDER BY name COLLATE NOCASE ASC"
+            "SELECT UserID, name FROM users WHERE post = 'student' ORDER BY name COLLATE NOCASE ASC LIMIT ? OFFSET ?",
+            (KB_PAGE_SIZE, page * KB_PAGE_SIZE)
         )
 
     if not students:
         return await cq.message.edit_text("Пока нет учеников.", reply_markup=back_kb())
 
+    # ввод текста в этом режиме — поиск ученика (см. handlers/text.py)
+    await STATE.set(cq.from_user.id, {"mode": "enroll", "step": 0, "data": {}, "chat_id": cq.message.chat.id})
     rows = [(_title(s), f"{CB_ENROLL_PICK_STU}{s['UserID']}") for s in students]
-    await cq.message.edit_text("🔗 <b>Выберите ученика</b>:", reply_markup=single_col_kb(rows))
+    kb = paged_kb(rows, page, lambda n: f"{CB_ENROLL_PAGE}{n}", total=total)
+    await cq.message.edit_text("🔗 <b>Выберите ученика</b> или напишите часть имени:", reply_markup=kb)
 
 
 @router.callback_query(F.data.startswith(CB_ENROLL_PICK_STU))
@@ -57,21 +80,21 @@ async def cb_enroll_pick_student(cq: CallbackQuery):
     except Exception:
         return await cq.answer("Некорректные данные", show_alert=True)
 
-    async with aiosqlite.connect(DB_PATH) as db:
-        db.row_factory = aiosqlite.Row
+    async with db_read() as db:
         s = await fetchone(db, "SELECT UserID, name FROM users WHERE UserID=?", (student_id,))
-        classes = await fetchall(db, "SELECT id, name FROM classes ORDER BY name COLLATE NOCASE ASC")
 
     if not s:
         return await cq.answer("Ученик не найден", show_alert=True)
-    if not classes:
+    kb = await CLASSES.picker_kb(f"{CB_ENROLL_PICK_CLS}{student_id}:")
+    if kb is None:
         return await cq.message.edit_text("Пока нет классов. Сначала создайте класс.", reply_markup=back_kb())
 
-    rows = [(c["name"], f"{CB_ENROLL_PICK_CLS}{student_id}:{c['id']}") for c in classes]
-    rows.append(("⏭ Пропустить", CB_STU_AFTER_ADD_SKIP))
+    await STATE.set(cq.from_user.id, {
+        "mode": "enroll", "step": 1, "data": {"student_id": student_id}, "chat_id": cq.message.chat.id
+    })
     await cq.message.edit_text(
-        f"🔗 Ученик: <b>{_title(s)}</b>\n\nВыберите <b>класс</b>:",
-        reply_markup=single_col_kb(rows)
+        f"🔗 Ученик: <b>{_title(s)}</b>\n\nВыберите <b>класс</b> или напишите часть названия:",
+        reply_markup=kb
     )
 
 
@@ -85,22 +108,22 @@ async def cb_enroll_pick_class(cq: CallbackQuery):
     except Exception:
         return await cq.answer("Некорректные данные", show_alert=True)
 
-    async with aiosqlite.connect(DB_PATH) as db:
-        db.row_factory = aiosqlite.Row
+    async with db_read() as db:
         s = await fetchone(db, "SELECT UserID, name FROM users WHERE UserID=?", (student_id,))
-        c = await fetchone(db, "SELECT id, name FROM classes WHERE id=?", (class_id,))
-        if not s or not c:
-            return await cq.answer("Ученик или класс не найден", show_alert=True)
-        try:
-            # enrollments.student_id = users.UserID
+    c = await CLASSES.get(class_id)
+    if not s or not c:
+        return await cq.answer("Ученик или класс не найден", show_alert=True)
+    try:
+        # enrollments.student_id = users.UserID
+        async with db_write() as db:
             await db.execute(
                 "INSERT OR IGNORE INTO enrollments(student_id, class_id) VALUES(?, ?)",
                 (student_id, class_id)
             )
-            await db.commit()
-        except Exception as e:
-            return await cq.message.edit_text(f"Ошибка: {e}", reply_markup=back_kb())
+    except Exception as e:
+        return await cq.message.edit_text(f"Ошибка: {e}", reply_markup=back_kb())
 
+    await STATE.pop(cq.from_user.id)
     await cq.message.edit_text(
         f"✅ Привязка выполнена:\n"
         f"Ученик: <b>{_title(s)}</b>\n"
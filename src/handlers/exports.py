@@ -0,0 +1,83 @@
+# -*- coding: utf-8 -*-
+import html
+
+from aiogram import Router, F
+from aiogram.filters import Command
+from aiogram.types import CallbackQuery, Message
+
+from keyboards import back_kb, single_col_kb
+from callbacks import CB_EXPORT, CB_EXPORT_PICK_CLASS, CB_EXPORT_KIND, CB_BACK
+from exporters import EXPORTS, export_csv
+from class_cache import CLASSES, register_picker
+
+router = Router()
+
+# выгружаем только свои классы
+register_picker(CB_EXPORT_PICK_CLASS, owned=True)
+
+_NO_CLASSES = "📤 <b>Экспорт в CSV</b>\n\nУ этого чата нет своих классов."
+_PICK_CLASS = "📤 <b>Экспорт в CSV</b>\n\nВыберите <b>класс</b>:"
+
+
+# -------------------------------
+# Выбор класса и вида выгрузки
+# -------------------------------
+@router.message(Command("export"))
+async def cmd_export(msg: Message):
+    kb = await CLASSES.picker_kb(CB_EXPORT_PICK_CLASS, owner_chat_id=msg.chat.id)
+    await msg.answer(_PICK_CLASS if kb else _NO_CLASSES, reply_markup=kb or back_kb())
+
+@router.callback_query(F.data == CB_EXPORT)
+async def cb_export(cq: CallbackQuery):
+    kb = await CLASSES.picker_kb(CB_EXPORT_PICK_CLASS, owner_chat_id=cq.message.chat.id)
+    await cq.message.edit_text(_PICK_CLASS if kb else _NO_CLASSES, reply_markup=kb or back_kb())
+
+async def _own_class(cq: CallbackQuery, class_id: int) -> dict | None:
+    class_row = await CLASSES.get(class_id)
+    if not class_row or class_row["owner_chat_id"] != cq.message.chat.id:
+        return None
+    return class_row
+
+@router.callback_query(F.data.startswith(CB_EXPORT_PICK_CLASS))
+async def cb_export_pick_class(cq: CallbackQuery):
+    try:
+        class_id = int(cq.data[len(CB_EXPORT_PICK_CLASS):])
+    except ValueError:
+        return await cq.answer("Некорректные данные", show_alert=True)
+    class_row = await _own_class(cq, class_id)
+    if not class_row:
+        return await cq.answer("Класс не найден", show_alert=True)
+    rows = [(title, f"{CB_EXPORT_KIND}{kind}:{class_id}") for kind, (title, *_) in EXPORTS.items()]
+    await cq.message.edit_text(
+        f"📤 <b>Экспорт в CSV</b>\nКласс: <b>{class_row['name']}</b>\n\nЧто выгрузить?",
+        reply_markup=single_col_kb(rows + [("⬅ Назад в главное меню", CB_BACK)])
+    )
+
+
+# -------------------------------
+# Выгрузка
+# -------------------------------
+@router.callback_query(F.data.startswith(CB_EXPORT_KIND))
+async def cb_export_kind(cq: CallbackQuery):
+    try:
+        kind, class_id = cq.data[len(CB_EXPORT_KIND):].split(":", 1)
+        class_id = int(class_id)
+    except ValueError:
+        return await cq.answer("Некорректные данные", show_alert=True)
+    class_row = await _own_class(cq, class_id)
+    if kind not in EXPORTS or not class_row:
+        return await cq.answer("Класс не найден", show_alert=True)
+
+    await cq.answer("Готовим файл…")
+    try:
+        document, count = await export_csv(kind, class_row)
+    except Exception as e:
+        return await cq.message.answer(f"Ошибка экспорта: {html.escape(str(e))}", reply_markup=back_kb())
+    try:
+        await cq.message.answer_document(
+            document,
+            caption=f"📤 {EXPORTS[kind][0]} — <b>{class_row['name']}</b>, строк: {count}",
+            reply_markup=back_kb()
+        )
+    finally:
+        document.close()
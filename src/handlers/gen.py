@@ -1,40 +1,253 @@
 # -*- coding: utf-8 -*-
+import asyncio
+import html
+import time
+
 from aiogram import Router, F
-from aiogram.types import CallbackQuery, Message
-from io import BytesIO
+from aiogram.types import CallbackQuery, Message, InlineKeyboardMarkup, InlineKeyboardButton
 
-from config import ENABLE_GEN, DEFAULT_MODEL, PROMPT, PARSER, build_llm
+from config import ENABLE_GEN, GEN_STREAM, GEN_STREAM_EDIT_INTERVAL, GEN_REPAIR, SNIPPETS_ENABLED
 from keyboards import back_kb
-from callbacks import CB_GEN
-from utils import extract_code_from_markdown, make_py_document
+from callbacks import CB_GEN, CB_GEN_MODEL, CB_BACK
+from llm import LLM
+from utils import extract_code_from_markdown, make_py_document, split_text
+from gen_cache import GEN_CACHE
+from gen_queue import GenScheduler, QueueFull, AlreadyQueued
+from state import STATE
+from metrics import LLM_SECONDS, LLM_FIRST_TOKEN_SECONDS, LLM_TOKENS, SNIPPETS
+from codecheck import CHECKER, CheckResult
+from snippets import SNIPPET_INDEX
+from throttling import THROTTLE
 
 router = Router()
 
-@router.callback_query(F.data == CB_GEN)
-async def cb_gen(cq: CallbackQuery):
-    from handlers.text import USER_STATE
-    USER_STATE[cq.from_user.id] = {"mode": "gen", "step": 0, "data": {}, "chat_id": cq.message.chat.id}
-    await cq.message.edit_text(
+def _gen_kb(selected: str | None) -> InlineKeyboardMarkup:
+    """Кнопки выбора модели (если их настроено несколько) + «Назад»."""
+    if len(LLM.models) < 2:
+        return back_kb()
+    if selected is None:
+        # без выбора отмечаем ту модель, что и будет вызвана, — DEFAULT_MODEL
+        default = LLM.resolve(None)
+        selected = next((alias for alias, model in LLM.models.items() if model == default), None)
+    rows = [
+        [InlineKeyboardButton(text=("✅ " if alias == selected else "") + f"{alias} ({model})",
+                              callback_data=f"{CB_GEN_MODEL}{alias}")]
+        for alias, model in LLM.models.items()
+    ]
+    rows.append([InlineKeyboardButton(text="⬅ Назад в главное меню", callback_data=CB_BACK)])
+    return InlineKeyboardMarkup(inline_keyboard=rows)
+
+def _gen_prompt_text() -> str:
+    return (
         "🤖 <b>Генерация MicroPython</b>\n\n"
         "Шаг 1/1: опишите задание текстом. Пример:\n"
-        "<i>Кнопка на GPIO12 включает LED на GPIO2 на 3 секунды, PWM 50%</i>\n",
-        reply_markup=back_kb()
+        "<i>Кнопка на GPIO12 включает LED на GPIO2 на 3 секунды, PWM 50%</i>\n"
     )
 
-async def _run_generation(msg: Message, desc: str):
-    if not ENABLE_GEN:
-        return await msg.answer("Генерация временно недоступна (нет LangChain/Ollama).", reply_markup=back_kb())
-    model_name = DEFAULT_MODEL
-    llm = build_llm(model_name)
-    chain = PROMPT | llm | PARSER
-    await msg.answer("Генерирую код, подождите 5–15 секунд...", reply_markup=back_kb())
+@router.callback_query(F.data == CB_GEN)
+async def cb_gen(cq: CallbackQuery):
+    await STATE.set(cq.from_user.id, {"mode": "gen", "step": 0, "data": {}, "chat_id": cq.message.chat.id})
+    await cq.message.edit_text(_gen_prompt_text(), reply_markup=_gen_kb(None))
+
+@router.callback_query(F.data.startswith(CB_GEN_MODEL))
+async def cb_gen_model(cq: CallbackQuery):
+    alias = cq.data.split(":", 1)[1]
+    if alias not in LLM.models:
+        return await cq.answer("Модель не найдена", show_alert=True)
+    await STATE.set(cq.from_user.id, {"mode": "gen", "step": 0, "data": {"model": alias}, "chat_id": cq.message.chat.id})
+    await cq.message.edit_text(_gen_prompt_text(), reply_markup=_gen_kb(alias))
+
+_CHUNK = 3500          # порог, после которого ответ режется на несколько сообщений
+_LIVE_TAIL = 3000      # сколько последних символов показываем во время генерации
+
+
+class _LiveMessage:
+    """
+    Сообщение, которое правится по мере генерации — не чаще раза в interval секунд,
+    чтобы укладываться в лимиты Telegram на редактирование. Правка без reply_markup
+    убирает клавиатуру, поэтому её передаём каждый раз.
+    """
+
+    def __init__(self, message: Message, interval: float = GEN_STREAM_EDIT_INTERVAL,
+                 reply_markup: InlineKeyboardMarkup | None = None):
+        self.message = message
+        self.interval = interval
+        self.reply_markup = reply_markup
+        self._text = ""
+        self._shown = ""
+        self._ticker: asyncio.Task | None = None
+
+    def update(self, text: str) -> None:
+        self._text = text
+        if self._ticker is None:
+            self._ticker = asyncio.create_task(self._tick())
+
+    async def _tick(self) -> None:
+        while True:
+            if self._text != self._shown:
+                self._shown = self._text
+                tail = self._shown[-_LIVE_TAIL:]
+                try:
+                    await self.message.edit_text(f"<pre>{html.escape(tail)}</pre> ▌", reply_markup=self.reply_markup)
+                except Exception:
+                    pass
+            await asyncio.sleep(self.interval)
+
+    async def close(self) -> None:
+        if self._ticker is not None:
+            self._ticker.cancel()
+            await asyncio.gather(self._ticker, return_exceptions=True)
+            self._ticker = None
+
+
+async def _generate(desc: str, model_name: str, report) -> tuple[str, CheckResult]:
+    """
+    Один вызов модели; в потоковом режиме отдаём текст по мере генерации. Результат кладём в кэш.
+    Возвращает текст и итог проверки его кода — повторно при отправке не проверяем.
+    """
+    chain = LLM.chain(model_name)
+    started = time.perf_counter()
+    status = "error"
     try:
-        result = await chain.ainvoke({"task_description": desc})
+        if GEN_STREAM:
+            result, tokens = "", 0
+            async for chunk in chain.astream({"task_description": desc}):
+                if not tokens:
+                    LLM_FIRST_TOKEN_SECONDS.observe(time.perf_counter() - started, model=model_name)
+                tokens += 1
+                result += chunk
+                report(result)
+            LLM_TOKENS.observe(tokens, model=model_name)
+        else:
+            result = await chain.ainvoke({"task_description": desc})
+        status = "ok"
+    finally:
+        LLM_SECONDS.observe(time.perf_counter() - started, model=model_name, status=status)
+    result, check = await _validate(desc, model_name, result, report)
+    await GEN_CACHE.put(desc, model_name, result)
+    return result, check
+
+def _repair_request(desc: str, code: str, errors: list[str]) -> str:
+    problems = "\n".join(f"- {e}" for e in errors)
+    return (
+        f"{desc}\n\n"
+        f"A previous attempt produced this code:\n```python\n{code}\n```\n"
+        f"It fails automatic checks:\n{problems}\n"
+        "Fix these problems and return the complete corrected program."
+    )
+
+async def _validate(desc: str, model_name: str, result: str, report) -> tuple[str, CheckResult]:
+    """Проверка кода из ответа; при ошибках — одна попытка исправления той же моделью."""
+    code = extract_code_from_markdown(result)
+    check = await CHECKER.check(code)
+    if not check.errors or not GEN_REPAIR:
+        return result, check
+    report(result + "\n\n# автопроверка нашла ошибки, исправляю…")
+    started = time.perf_counter()
+    status = "error"
+    try:
+        repaired = await LLM.chain(model_name).ainvoke({"task_description": _repair_request(desc, code, check.errors)})
+        status = "repair"
     except Exception as e:
-        return await msg.answer(f"Ошибка запроса к модели: {e}", reply_markup=back_kb())
+        print(f"Исправление кода не удалось: {e}")
+        CHECKER.record_repair(False)
+        return result, check
+    finally:
+        LLM_SECONDS.observe(time.perf_counter() - started, model=model_name, status=status)
+    new_check = await CHECKER.check(extract_code_from_markdown(repaired))
+    # второй попытки не делаем: берём вариант с меньшим числом ошибок;
+    # непроверенное исправление не лучше кода с известными ошибками
+    better = new_check.checked and len(new_check.errors) < len(check.errors)
+    CHECKER.record_repair(new_check.checked and not new_check.errors)
+    return (repaired, new_check) if better else (result, check)
+
+GEN_QUEUE = GenScheduler(_generate)
+
+async def _send_result(msg: Message, result: str, live: Message | None = None, check: CheckResult | None = None):
+    """Текст ответа (частями, если длинный) и .py-файл с кодом; check — итог уже сделанной проверки."""
+    chunks = split_text(result, _CHUNK)
+    for i, chunk in enumerate(chunks):
+        text = html.escape(chunk)
+        if i == 0 and live is not None:
+            try:
+                await live.edit_text(text)
+                continue
+            except Exception:
+                pass
+        await msg.answer(text)
 
     code = extract_code_from_markdown(result)
+    if check is None:
+        check = await CHECKER.check(code)
+    caption = "Готово! Проверьте пины и параметры."
+    if not check.checked:
+        caption = "⚠️ Код не проверен: автопроверка не успела завершиться. Проверьте пины и импорты сами."
+    elif check.errors:
+        caption = "⚠️ Автопроверка нашла ошибки:\n" + "\n".join(f"• {html.escape(e)}" for e in check.errors[:3])
+    if check.warnings:
+        caption += "\n\nЗамечания:\n" + "\n".join(f"• {html.escape(w)}" for w in check.warnings[:3])
     file = make_py_document("micropython_task.py", code)
-    await msg.answer_document(file, caption="Готово! Проверьте пины и параметры.", reply_markup=back_kb())
-    if len(result) < 3500:
-        await msg.answer(result, reply_markup=back_kb())
+    await msg.answer_document(file, caption=caption[:1024], reply_markup=back_kb())
+
+async def _snippet_answer(desc: str) -> tuple[str, CheckResult] | None:
+    """Готовый пример из библиотеки, если описание на него похоже и код с подставленными пинами проходит проверку."""
+    answer = SNIPPET_INDEX.match(desc)
+    if answer is None:
+        SNIPPETS.inc(result="miss")
+        return None
+    check = await CHECKER.check(extract_code_from_markdown(answer))
+    if check.errors:
+        # например, светодиод на входном GPIO34 — пусть модель разберётся с описанием
+        SNIPPETS.inc(result="rejected")
+        return None
+    SNIPPETS.inc(result="hit")
+    return answer, check
+
+async def _run_generation(msg: Message, desc: str, model: str | None = None):
+    # частые шаблоны отвечаем из библиотеки: миллисекунды и никакой нагрузки на модель
+    if SNIPPETS_ENABLED:
+        found = await _snippet_answer(desc)
+        if found is not None:
+            answer, check = found
+            return await _send_result(msg, answer, check=check)
+    if not ENABLE_GEN:
+        return await msg.answer("Генерация временно недоступна (нет LangChain/Ollama).", reply_markup=back_kb())
+    model_name = LLM.resolve(model)
+    result = await GEN_CACHE.get(desc, model_name)
+    if result is not None:
+        return await _send_result(msg, result)
+    # лимит на пользователя тратим только на настоящие запросы к модели
+    wait = THROTTLE.gen_wait(msg.from_user.id)
+    if wait:
+        # режим gen возвращаем — то же описание можно отправить ещё раз
+        await STATE.set(msg.from_user.id, {"mode": "gen", "step": 0, "data": {"model": model} if model else {},
+                                           "chat_id": msg.chat.id})
+        return await msg.answer(f"Генерация не так часто: попробуйте через {wait} с.", reply_markup=back_kb())
+
+    status = await msg.answer("⏳ Запрос принят...", reply_markup=back_kb())
+    live = _LiveMessage(status, reply_markup=back_kb())
+    shown = {"pos": None}
+
+    async def on_position(pos: int):
+        # позиции только уменьшаются; запоздавшие обновления пропускаем
+        if shown["pos"] is not None and pos >= shown["pos"]:
+            return
+        shown["pos"] = pos
+        text = ("Генерирую код, подождите 5–15 секунд..." if pos == 0
+                else f"⏳ Вы в очереди на генерацию: <b>{pos}</b>")
+        await status.edit_text(text, reply_markup=back_kb())
+
+    try:
+        result, check = await GEN_QUEUE.submit(msg.from_user.id, desc, model_name, on_position, live.update)
+    except QueueFull:
+        return await status.edit_text("Очередь генерации заполнена, попробуйте через пару минут.",
+                                      reply_markup=back_kb())
+    except AlreadyQueued:
+        return await status.edit_text("У вас уже есть запрос на генерацию — дождитесь результата.",
+                                      reply_markup=back_kb())
+    except Exception as e:
+        return await status.edit_text(f"Ошибка запроса к модели: {html.escape(str(e))}", reply_markup=back_kb())
+    finally:
+        await live.close()
+
+    await _send_result(msg, result, live=status, check=check)
@@ -0,0 +1,227 @@
+# -*- coding: utf-8 -*-
+import asyncio
+import html
+import time
+
+from aiogram import Router, F
+from aiogram.types import CallbackQuery, Message
+
+from config import IMPORT_MAX_BYTES
+from db import fetchone, fetchall, db_write, allocate_user_ids
+from keyboards import back_kb
+from callbacks import CB_IMPORT_TASKS, CB_IMPORT_TASKS_PICK_CLASS, CB_IMPORT_ROSTER
+from importers import parse_tasks, parse_roster
+from utils import to_ts
+from scheduler_jobs import insert_task_jobs, ENGINE
+from state import STATE
+from class_cache import CLASSES
+
+router = Router()
+
+_MAX_ERRORS_SHOWN = 15
+
+
+def _errors_text(errors: list[str]) -> str:
+    if not errors:
+        return ""
+    shown = "\n".join(f"• {html.escape(e)}" for e in errors[:_MAX_ERRORS_SHOWN])
+    more = f"\n… и ещё {len(errors) - _MAX_ERRORS_SHOWN}" if len(errors) > _MAX_ERRORS_SHOWN else ""
+    return f"\n\n⚠️ Пропущено строк: {len(errors)}\n{shown}{more}"
+
+
+# -------------------------------
+# Импорт заданий: выбор класса
+# -------------------------------
+@router.callback_query(F.data == CB_IMPORT_TASKS)
+async def cb_import_tasks(cq: CallbackQuery):
+    kb = await CLASSES.picker_kb(CB_IMPORT_TASKS_PICK_CLASS)
+    if kb is None:
+        return await cq.message.edit_text(
+            "📥 <b>Импорт заданий</b>\n\n"
+            "Сначала создайте класс (меню → «🏷 Добавить класс»).",
+            reply_markup=back_kb()
+        )
+    await cq.message.edit_text(
+        "📥 <b>Импорт заданий</b>\n\n"
+        "Шаг 1/2: выберите <b>класс</b>:",
+        reply_markup=kb
+    )
+
+@router.callback_query(F.data.startswith(CB_IMPORT_TASKS_PICK_CLASS))
+async def cb_import_tasks_pick_class(cq: CallbackQuery):
+    try:
+        class_id = int(cq.data.split(":", 1)[1])
+    except Exception:
+        return await cq.answer("Некорректные данные", show_alert=True)
+
+    class_row = await CLASSES.get(class_id)
+    if not class_row:
+        return await cq.answer("Класс не найден", show_alert=True)
+    await STATE.set(cq.from_user.id, {
+        "mode": "import_tasks",
+        "step": 0,
+        "data": {"class_id": class_row["id"], "class_name": class_row["name"]},
+        "chat_id": cq.message.chat.id
+    })
+    await cq.message.edit_text(
+        f"📥 <b>Импорт заданий</b>\n"
+        f"Класс: <b>{class_row['name']}</b>\n\n"
+        "Шаг 2/2: отправьте файл <b>.csv</b> или <b>.json</b>.\n\n"
+        "CSV — первая строка с заголовками:\n"
+        "<code>title;due_utc;description\n"
+        "Мигалка;2025-09-25 18:00;LED на GPIO2</code>\n\n"
+        "JSON — список объектов с теми же полями.\n"
+        "Дедлайн в UTC: <code>YYYY-MM-DD HH:MM</code> или ISO 8601.",
+        reply_markup=back_kb()
+    )
+
+
+# -------------------------------
+# Импорт учеников (ростер)
+# -------------------------------
+@router.callback_query(F.data == CB_IMPORT_ROSTER)
+async def cb_import_roster(cq: CallbackQuery):
+    await STATE.set(cq.from_user.id, {"mode": "import_roster", "step": 0, "data": {}, "chat_id": cq.message.chat.id})
+    await cq.message.edit_text(
+        "👥 <b>Импорт учеников</b>\n\n"
+        "Отправьте файл <b>.csv</b> или <b>.xlsx</b>, первая строка — заголовки:\n"
+        "<code>name;username;classes\n"
+        "Иван Петров;@ivan;7А, 8Б</code>\n\n"
+        "username и classes необязательны. Классы — существующие, через запятую.\n"
+        "Ученик с уже известным username не дублируется — ему только добавятся классы.",
+        reply_markup=back_kb()
+    )
+
+
+async def _insert_roster(students: list) -> tuple[int, int]:
+    """
+    students: [(name, username | None, [class_id, ...]), ...].
+    Пользователи и записи в классы — одной транзакцией; UserID выделяются подряд
+    после текущего максимума под блокировкой записи, поэтому не пересекаются.
+    Возвращает (новых учеников, новых записей в классы).
+    """
+    async with db_write() as db:
+        await db.execute("BEGIN IMMEDIATE")
+        known = {
+            r["username"].lower(): r["UserID"]
+            for r in await fetchall(db, "SELECT UserID, username FROM users WHERE username IS NOT NULL AND post = 'student'")
+        }
+        next_id = await allocate_user_ids(db)
+        users, enrollments = [], []
+        for name, username, class_ids in students:
+            uid = known.get(username.lower()) if username else None
+            if uid is None:
+                uid, next_id = next_id, next_id + 1
+                users.append((uid, name, username, "student"))
+                if username:
+                    known[username.lower()] = uid
+            enrollments.extend((uid, class_id) for class_id in class_ids)
+        await db.executemany("INSERT INTO users(UserID, name, username, post) VALUES(?, ?, ?, ?)", users)
+        before = db.total_changes
+        await db.executemany("INSERT OR IGNORE INTO enrollments(student_id, class_id) VALUES(?, ?)", enrollments)
+        enrolled = db.total_changes - before
+    return len(users), enrolled
+
+
+async def _import_roster(msg: Message, filename: str, stream) -> None:
+    started = time.perf_counter()
+    # разбор .xlsx заметно тяжелее CSV — в отдельном потоке, чтобы не держать цикл событий
+    parsed = await asyncio.to_thread(lambda: list(parse_roster(filename, stream)))
+    class_ids = {c["name"].lower(): c["id"] for c in await CLASSES.all()}
+    students, errors = [], []
+    for n, item in parsed:
+        if isinstance(item, str):
+            errors.append(item)
+            continue
+        name, username, classes = item
+        missing = [c for c in classes if c.lower() not in class_ids]
+        if missing:
+            errors.append(f"строка {n}: нет класса {', '.join(f'«{c}»' for c in missing)}")
+            continue
+        students.append((name, username, [class_ids[c.lower()] for c in classes]))
+    if not students:
+        await msg.answer("❌ В файле нет подходящих строк." + _errors_text(errors), reply_markup=back_kb())
+        return
+
+    created, enrolled = await _insert_roster(students)
+    elapsed = time.perf_counter() - started
+    await STATE.pop(msg.from_user.id)
+    await msg.answer(
+        f"✅ Строк обработано: <b>{len(students)}</b>\n"
+        f"Новых учеников: <b>{created}</b>\n"
+        f"Записей в классы: <b>{enrolled}</b>\n"
+        f"Время: {elapsed:.2f} с" + _errors_text(errors),
+        reply_markup=back_kb()
+    )
+
+
+# -------------------------------
+# Приём файла
+# -------------------------------
+async def _insert_tasks(class_id: int, tasks: list) -> tuple[int, int]:
+    """
+    Все задания и их напоминания — в одной транзакции (один fsync).
+    Возвращает (заданий, напоминаний).
+    """
+    now_ts = int(time.time())
+    async with db_write() as db:
+        # BEGIN IMMEDIATE: id новых строк идут подряд после текущего максимума
+        await db.execute("BEGIN IMMEDIATE")
+        last = await fetchone(db, "SELECT COALESCE(MAX(id), 0) AS id FROM tasks")
+        await db.executemany(
+            "INSERT INTO tasks(class_id, title, description, due_ts, created_ts) VALUES(?, ?, ?, ?, ?)",
+            [(class_id, title, desc, to_ts(due), now_ts) for title, desc, due in tasks]
+        )
+        new_ids = await fetchall(db, "SELECT id FROM tasks WHERE id > ? ORDER BY id", (last["id"],))
+        pairs = [(r["id"], to_ts(due)) for r, (_, _, due) in zip(new_ids, tasks)]
+        earliest = await insert_task_jobs(db, pairs)
+        # total_changes сюда не годится: его увеличивает и триггер счётчика jobs
+        jobs = await fetchone(db, "SELECT COUNT(*) AS n FROM jobs WHERE task_id > ?", (last["id"],))
+        jobs_count = jobs["n"]
+    if earliest is not None:
+        ENGINE.notify(earliest)
+    return len(pairs), jobs_count
+
+@router.message(F.document)
+async def on_document(msg: Message):
+    state = await STATE.get(msg.from_user.id)
+    if not state or state.get("mode") not in ("import_tasks", "import_roster"):
+        return await msg.answer("Файл сейчас не ожидается. Выберите действие в меню.", reply_markup=back_kb())
+
+    doc = msg.document
+    if doc.file_size and doc.file_size > IMPORT_MAX_BYTES:
+        return await msg.answer(
+            f"❌ Файл слишком большой (максимум {IMPORT_MAX_BYTES // 1024} КБ).", reply_markup=back_kb()
+        )
+
+    if state["mode"] == "import_roster":
+        try:
+            await _import_roster(msg, doc.file_name or "", await msg.bot.download(doc))
+        except Exception as e:
+            await msg.answer(f"Ошибка импорта: {html.escape(str(e))}", reply_markup=back_kb())
+        return
+
+    data = state["data"]
+    started = time.perf_counter()
+    try:
+        buf = await msg.bot.download(doc)
+        tasks, errors = parse_tasks(doc.file_name or "", buf.read())
+    except Exception as e:
+        return await msg.answer(f"❌ Не удалось прочитать файл: {html.escape(str(e))}", reply_markup=back_kb())
+    if not tasks:
+        return await msg.answer("❌ В файле нет подходящих заданий." + _errors_text(errors), reply_markup=back_kb())
+
+    try:
+        created, jobs_count = await _insert_tasks(data["class_id"], tasks)
+    except Exception as e:
+        return await msg.answer(f"Ошибка импорта: {e}", reply_markup=back_kb())
+    elapsed = time.perf_counter() - started
+
+    await STATE.pop(msg.from_user.id)
+    await msg.answer(
+        f"✅ Импортировано заданий: <b>{created}</b>\n"
+        f"Класс: <b>{data['class_name']}</b>\n"
+        f"Напоминаний запланировано: <b>{jobs_count}</b>\n"
+        f"Время: {elapsed:.2f} с" + _errors_text(errors),
+        reply_markup=back_kb()
+    )
@@ -1,59 +1,42 @@
 # -*- coding: utf-8 -*-
 from aiogram import Router, F
-from aiogram.types import CallbackQuery
-from datetime import datetime, timedelta, timezone
+from aiogram.types import CallbackQuery, InlineKeyboardMarkup, InlineKeyboardButton
+import time
 from zoneinfo import ZoneInfo
-import aiosqlite
 
-from config import DB_PATH
-from db import fetchall, fetchone
+from db import fetchall, db_read
 from keyboards import back_kb, single_col_kb
-from callbacks import CB_ADD_TASK, CB_ADD_TASK_PICK_CLASS, CB_LIST_TASKS
-from utils import fmt_dt_local
+from config import TASKS_PAGE_SIZE
+from callbacks import (
+    CB_ADD_TASK, CB_ADD_TASK_PICK_CLASS, CB_LIST_TASKS, CB_TASKS_PAGE, CB_TASKS_PICK_CLASS, CB_BACK
+)
+from utils import fmt_dt_local, from_ts
 from scheduler_jobs import schedule_task_jobs
+from state import STATE
+from class_cache import CLASSES, register_picker
 
 router = Router()
 
-# -------------------------------
-# Функция удаления старых задач
-# -------------------------------
-async def delete_old_tasks():
-    """Удаляет задачи, у которых дедлайн прошел более 168 часов назад."""
-    cutoff_time = datetime.now(timezone.utc) - timedelta(hours=168)
-    async with aiosqlite.connect(DB_PATH) as db:
-        db.row_factory = aiosqlite.Row
-        # Получаем удаляемые задачи для логирования (опционально)
-        old_tasks = await db.execute_fetchall(
-            "SELECT id, title FROM tasks WHERE due_utc <= ?", (cutoff_time.isoformat(),)
-        )
-        # Удаляем старые задачи
-        await db.execute("DELETE FROM tasks WHERE due_utc <= ?", (cutoff_time.isoformat(),))
-        await db.commit()
-    if old_tasks:
-        print(f"Удалены старые задачи: {[t['title'] for t in old_tasks]}")
+# фильтр списка заданий: только свои классы и «Все классы» первой строкой
+register_picker(CB_TASKS_PAGE, head=lambda prefix: [("Все классы", f"{prefix}0")], owned=True)
 
 # -------------------------------
 # Добавление нового задания
 # -------------------------------
 @router.callback_query(F.data == CB_ADD_TASK)
 async def cb_add_task(cq: CallbackQuery):
-    async with aiosqlite.connect(DB_PATH) as db:
-        db.row_factory = aiosqlite.Row
-        classes = await fetchall(db, "SELECT id, name FROM classes ORDER BY name COLLATE NOCASE ASC")
-    if not classes:
+    kb = await CLASSES.picker_kb(CB_ADD_TASK_PICK_CLASS)
+    if kb is None:
         return await cq.message.edit_text(
             "📝 <b>Новое задание</b>\n\n"
             "Сначала создайте класс (меню → «🏷 Добавить класс»).",
             reply_markup=back_kb()
         )
-
-    from handlers.text import USER_STATE
-    USER_STATE[cq.from_user.id] = {"mode": "add_task", "step": 0, "data": {}, "chat_id": cq.message.chat.id}
-    rows = [(c["name"], f"{CB_ADD_TASK_PICK_CLASS}{c['id']}") for c in classes]
+    await STATE.set(cq.from_user.id, {"mode": "add_task", "step": 0, "data": {}, "chat_id": cq.message.chat.id})
     await cq.message.edit_text(
         "📝 <b>Новое задание</b>\n\n"
-        "Шаг 1/4: выберите <b>класс</b>:",
-        reply_markup=single_col_kb(rows)
+        "Шаг 1/4: выберите <b>класс</b> или напишите часть названия:",
+        reply_markup=kb
     )
 
 @router.callback_query(F.data.startswith(CB_ADD_TASK_PICK_CLASS))
@@ -63,19 +46,15 @@ async def cb_add_task_pick_class(cq: CallbackQuery):
     except Exception:
         return await cq.answer("Некорректные данные", show_alert=True)
 
-    async with aiosqlite.connect(DB_PATH) as db:
-        db.row_factory = aiosqlite.Row
-        class_row = await fetchone(db, "SELECT id, name, timezone FROM classes WHERE id=?", (class_id,))
+    class_row = await CLASSES.get(class_id)
     if not class_row:
         return await cq.answer("Класс не найден", show_alert=True)
-
-    from handlers.text import USER_STATE
-    USER_STATE[cq.from_user.id] = {
+    await STATE.set(cq.from_user.id, {
         "mode": "add_task",
         "step": 1,
         "data": {"class_id": class_row["id"], "class_name": class_row["name"]},
         "chat_id": cq.message.chat.id
-    }
+    })
     await cq.message.edit_text(
         f"📝 <b>Новое задание</b>\n"
         f"Класс: <b>{class_row['name']}</b>\n\n"
@@ -86,26 +65,120 @@ async def cb_add_task_pick_class(cq: CallbackQuery):
 # -------------------------------
 # Просмотр списка заданий
 # -------------------------------
+# period: up — предстоящие (по возрастанию дедлайна), od — просроченные (сначала свежие), all — все
+_PERIODS = {"up": "⏳ Предстоящие", "od": "⌛ Просроченные", "all": "🗂 Все"}
+
+
+async def _fetch_page(db, class_ids, period: str, direction: str, cursor, now_ts: int, limit: int):
+    """
+    Keyset-страница по (due_ts, id). Для каждого класса — свой запрос по индексу
+    (class_id, due_ts, id) с LIMIT, результаты сливаются: стоимость зависит от размера
+    страницы и числа классов, а не от размера таблицы.
+    Возвращает (строки в порядке показа, есть_ли_ещё_в_направлении_листания).
+    """
+    forward = direction != "p"
+    sql_asc = (period != "od") == forward
+    cmp, order = (">", "ASC") if sql_asc else ("<", "DESC")
+
+    conds, base = ["class_id = ?"], []
+    if period == "up":
+        conds.append("due_ts >= ?")
+        base.append(now_ts)
+    elif period == "od":
+        conds.append("due_ts < ?")
+        base.append(now_ts)
+    if cursor is not None:
+        conds.append(f"(due_ts, id) {cmp} (?, ?)")
+        base.extend(cursor)
+    sql = (f"SELECT id, class_id, title, due_ts FROM tasks WHERE {' AND '.join(conds)} "
+           f"ORDER BY due_ts {order}, id {order} LIMIT ?")
+
+    rows = []
+    for class_id in class_ids:
+        rows.extend(await fetchall(db, sql, (class_id, *base, limit + 1)))
+    rows.sort(key=lambda r: (r["due_ts"], r["id"]), reverse=not sql_asc)
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    if not forward:
+        rows.reverse()
+    return rows, has_more
+
+
+def _page_kb(period: str, class_id: int, rows, has_prev: bool, has_next: bool) -> InlineKeyboardMarkup:
+    base = f"{CB_TASKS_PAGE}{{}}:{class_id}"
+    kb = [[
+        InlineKeyboardButton(text=("• " if p == period else "") + title, callback_data=base.format(p))
+        for p, title in _PERIODS.items()
+    ]]
+    nav = []
+    if has_prev and rows:
+        nav.append(InlineKeyboardButton(
+            text="◀", callback_data=f"{base.format(period)}:p:{rows[0]['due_ts']}:{rows[0]['id']}"))
+    if has_next and rows:
+        nav.append(InlineKeyboardButton(
+            text="▶", callback_data=f"{base.format(period)}:n:{rows[-1]['due_ts']}:{rows[-1]['id']}"))
+    if nav:
+        kb.append(nav)
+    kb.append([InlineKeyboardButton(text="🏷 Фильтр по классу", callback_data=f"{CB_TASKS_PICK_CLASS}{period}")])
+    kb.append([InlineKeyboardButton(text="⬅ Назад в главное меню", callback_data=CB_BACK)])
+    return InlineKeyboardMarkup(inline_keyboard=kb)
+
+
+async def _show_tasks_page(cq: CallbackQuery, period: str = "up", class_id: int = 0,
+                           direction: str = "n", cursor=None):
+    now_ts = int(time.time())
+    classes = await CLASSES.owned_by(cq.message.chat.id)
+    by_id = {c["id"]: c for c in classes}
+    class_ids = [class_id] if class_id else list(by_id)
+    if class_id and class_id not in by_id:
+        return await cq.answer("Класс не найден", show_alert=True)
+    async with db_read() as db:
+        rows, has_more = await _fetch_page(db, class_ids, period, direction, cursor, now_ts, TASKS_PAGE_SIZE)
+
+    if not classes:
+        return await cq.message.edit_text("📋 У вас пока нет классов и заданий.", reply_markup=back_kb())
+
+    has_prev, has_next = (cursor is not None, has_more) if direction != "p" else (has_more, True)
+    scope = by_id[class_id]["name"] if class_id else "все классы"
+    lines = [f"<b>📋 Список заданий</b> — {_PERIODS[period]}, {scope}"]
+    if not rows:
+        lines.append("\nЗаданий нет.")
+    for r in rows:
+        c = by_id[r["class_id"]]
+        tz = ZoneInfo(c["timezone"])
+        due_local_str = fmt_dt_local(from_ts(r["due_ts"]), tz)
+        lines.append(f"#{r['id']} • {c['name']} • <b>{r['title']}</b> — {due_local_str} {tz.key}")
+    await cq.message.edit_text("\n".join(lines), reply_markup=_page_kb(period, class_id, rows, has_prev, has_next))
+
+
 @router.callback_query(F.data == CB_LIST_TASKS)
 async def cb_list_tasks(cq: CallbackQuery):
-    # ✅ Удаляем старые задачи перед показом списка
-    await delete_old_tasks()
-
-    async with aiosqlite.connect(DB_PATH) as db:
-        db.row_factory = aiosqlite.Row
-        rows = await fetchall(
-            db,
-            """SELECT t.*, c.name AS class_name, c.timezone
-               FROM tasks t JOIN classes c ON c.id=t.class_id
-               ORDER BY due_utc ASC"""
-        )
-    if not rows:
-        text = "📋 Заданий пока нет."
-    else:
-        lines = ["<b>📋 Список заданий</b>"]
-        for r in rows:
-            tz = ZoneInfo(r["timezone"])
-            due_local_str = fmt_dt_local(datetime.fromisoformat(r["due_utc"]).replace(tzinfo=timezone.utc), tz)
-            lines.append(f"#{r['id']} • {r['class_name']} • <b>{r['title']}</b> — {due_local_str} {tz.key}")
-        text = "\n".join(lines)
-    await cq.message.edit_text(text, reply_markup=back_kb())
+    # старые задания чистит периодический retention_job, здесь только чтение
+    await _show_tasks_page(cq)
+
+
+@router.callback_query(F.data.startswith(CB_TASKS_PAGE))
+async def cb_tasks_page(cq: CallbackQuery):
+    try:
+        parts = cq.data[len(CB_TASKS_PAGE):].split(":", 3)
+        period, class_id = parts[0], int(parts[1])
+        if period not in _PERIODS:
+            raise ValueError(period)
+        direction, cursor = "n", None
+        if len(parts) == 4:
+            direction = parts[2]
+            due_ts, task_id = parts[3].split(":")
+            cursor = (int(due_ts), int(task_id))
+    except Exception:
+        return await cq.answer("Некорректные данные", show_alert=True)
+    await _show_tasks_page(cq, period, class_id, direction, cursor)
+
+
+@router.callback_query(F.data.startswith(CB_TASKS_PICK_CLASS))
+async def cb_tasks_pick_class(cq: CallbackQuery):
+    period = cq.data[len(CB_TASKS_PICK_CLASS):]
+    if period not in _PERIODS:
+        return await cq.answer("Некорректные данные", show_alert=True)
+    prefix = f"{CB_TASKS_PAGE}{period}:"
+    kb = await CLASSES.picker_kb(prefix, owner_chat_id=cq.message.chat.id)
+    await cq.message.edit_text("🏷 Выберите класс:", reply_markup=kb or single_col_kb([("Все классы", f"{prefix}0")]))
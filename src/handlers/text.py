@@ -2,39 +2,34 @@
 # -*- coding: utf-8 -*-
 from datetime import datetime, timezone
 from zoneinfo import ZoneInfo
-import aiosqlite
-import random
 
 from aiogram import Router, F
 from aiogram.types import Message
 
-from config import DB_PATH, DEFAULT_TZ
-from db import fetchone, fetchall
+from config import DEFAULT_TZ
+from db import db_write, allocate_user_ids
 from keyboards import back_kb, single_col_kb
-from utils import fmt_dt_local
+from utils import fmt_dt_local, to_ts, from_ts, display_student
 from scheduler_jobs import schedule_task_jobs
-from callbacks import (
-    CB_STU_AFTER_ADD_SKIP,
-    CB_ENROLL_PICK_CLS,
-)
-
-# простой in-memory FSM, как и было в проекте
-USER_STATE = {}   # {user_id: {"mode": str, "step": int, "data": dict, "chat_id": int}}
+from state import STATE
+from class_cache import CLASSES
+from callbacks import CB_ENROLL_PICK_CLS, CB_ENROLL_PICK_STU, CB_ADD_TASK_PICK_CLASS, CB_BACK
+from search import search_students, search_classes
 
 router = Router()
 
 
-def _gen_user_id() -> int:
-    """
-    В текущей схеме users.UserID НЕ автоинкремент.
-    Сгенерируем положительный id. На проде лучше выделить генератор/последовательность.
-    """
-    return random.randint(10_000, 9_999_999)
+async def _answer_search(msg: Message, rows: list) -> None:
+    """Результаты поиска кнопками; состояние не меняем — можно уточнить запрос."""
+    if not rows:
+        await msg.answer("Ничего не найдено. Уточните запрос.", reply_markup=back_kb())
+        return
+    await msg.answer("🔎 Найдено:", reply_markup=single_col_kb(rows + [("⬅ Назад в главное меню", CB_BACK)]))
 
 
 @router.message(F.text)
 async def on_text(msg: Message):
-    state = USER_STATE.get(msg.from_user.id)
+    state = await STATE.get(msg.from_user.id)
     if not state:
         # нет активного режима — покажем меню
         from handlers.common import show_main_menu
@@ -47,16 +42,16 @@ async def on_text(msg: Message):
     # ---------- ADD CLASS ----------
     if mode == "add_class":
         name = msg.text.strip()
-        async with aiosqlite.connect(DB_PATH) as db:
-            try:
+        try:
+            async with db_write() as db:
                 await db.execute(
                     "INSERT INTO classes(name, owner_chat_id, timezone) VALUES (?, ?, ?)",
                     (name, msg.chat.id, DEFAULT_TZ)
                 )
-                await db.commit()
-            except Exception as e:
-                return await msg.answer(f"Ошибка создания класса: {e}", reply_markup=back_kb())
-        USER_STATE.pop(msg.from_user.id, None)
+        except Exception as e:
+            return await msg.answer(f"Ошибка создания класса: {e}", reply_markup=back_kb())
+        CLASSES.invalidate()
+        await STATE.pop(msg.from_user.id)
         return await msg.answer(f"✅ Класс создан: <b>{name}</b> (TZ={DEFAULT_TZ})", reply_markup=back_kb())
 
     # ---------- ADD STUDENT (теперь users) ----------
@@ -64,32 +59,33 @@ async def on_text(msg: Message):
         if step == 0:
             data["display_name"] = msg.text.strip()  # положим как name (имя/ФИО целиком)
             state["step"] = 1
+            await STATE.set(msg.from_user.id, state)
             return await msg.answer(
-                "Шаг 2/2: отправьте @username (или оставьте пустым — напишите «-»).\n"
-                "(username теперь никуда не пишется — поле временное, для твоего удобства)",
+                "Шаг 2/2: отправьте @username (или оставьте пустым — напишите «-»).",
                 reply_markup=back_kb()
             )
         elif step == 1:
-            # username больше никуда не сохраняем — в новой схеме его нет
-            _ = msg.text.strip()
+            username = msg.text.strip().lstrip("@")
+            if username in ("", "-"):
+                username = None
 
-            # users требует UserID и post NOT NULL; остальное можно NULL
-            new_id = _gen_user_id()
-            async with aiosqlite.connect(DB_PATH) as db:
-                try:
+            # users требует UserID и post NOT NULL; остальное можно NULL.
+            # UserID не автоинкремент — берём следующий свободный под блокировкой записи
+            try:
+                async with db_write() as db:
+                    await db.execute("BEGIN IMMEDIATE")
+                    new_id = await allocate_user_ids(db)
                     await db.execute(
-                        "INSERT INTO users(UserID, name, post) VALUES(?, ?, ?)",
-                        (new_id, data["display_name"], "student")
+                        "INSERT INTO users(UserID, name, username, post) VALUES(?, ?, ?, ?)",
+                        (new_id, data["display_name"], username, "student")
                     )
-                    await db.commit()
-                    # классы для моментального зачисления
-                    db.row_factory = aiosqlite.Row
-                    classes = await fetchall(db, "SELECT id, name FROM classes ORDER BY name COLLATE NOCASE ASC")
-                except Exception as e:
-                    return await msg.answer(f"Ошибка: {e}", reply_markup=back_kb())
-
-            if not classes:
-                USER_STATE.pop(msg.from_user.id, None)
+                # классы для моментального зачисления
+                kb = await CLASSES.picker_kb(f"{CB_ENROLL_PICK_CLS}{new_id}:")
+            except Exception as e:
+                return await msg.answer(f"Ошибка: {e}", reply_markup=back_kb())
+
+            if kb is None:
+                await STATE.pop(msg.from_user.id)
                 return await msg.answer(
                     f"✅ Ученик добавлен: <b>{data['display_name']}</b>\n\n"
                     f"Пока нет классов — создайте класс и запишите ученика позже.",
@@ -97,30 +93,43 @@ async def on_text(msg: Message):
                 )
 
             # показать список классов + «⏭ Пропустить»
-            USER_STATE.pop(msg.from_user.id, None)
-            rows = [(c["name"], f"{CB_ENROLL_PICK_CLS}{new_id}:{c['id']}") for c in classes]
-            rows.append(("⏭ Пропустить", CB_STU_AFTER_ADD_SKIP))
+            await STATE.pop(msg.from_user.id)
             return await msg.answer(
                 f"✅ Ученик добавлен: <b>{data['display_name']}</b>\n\n"
                 f"Сразу записать в класс?",
-                reply_markup=single_col_kb(rows)
+                reply_markup=kb
             )
 
     # ---------- REGISTER ----------
     if mode == "register":
         # В новой схеме нет chat_id у пользователей.
-        USER_STATE.pop(msg.from_user.id, None)
+        await STATE.pop(msg.from_user.id)
         return await msg.answer(
             "В текущей версии БД привязка чата ученика отключена (в таблице users нет chat_id).\n"
             "Если нужна — добавим отдельную таблицу, скажи.",
             reply_markup=back_kb()
         )
 
+    # ---------- ENROLL: поиск ученика / класса вводом текста ----------
+    if mode == "enroll":
+        if step == 0:
+            found = await search_students(msg.text)
+            rows = [(display_student(s["name"] or f"UserID {s['UserID']}", s["username"]),
+                     f"{CB_ENROLL_PICK_STU}{s['UserID']}") for s in found]
+        else:
+            found = await search_classes(msg.text)
+            rows = [(c["name"], f"{CB_ENROLL_PICK_CLS}{data['student_id']}:{c['id']}") for c in found]
+        return await _answer_search(msg, rows)
+
     # ---------- ADD TASK (класс выбран кнопкой) ----------
     if mode == "add_task":
+        if step == 0:
+            found = await search_classes(msg.text)
+            return await _answer_search(msg, [(c["name"], f"{CB_ADD_TASK_PICK_CLASS}{c['id']}") for c in found])
         if step == 1:
             data["title"] = msg.text.strip()
             state["step"] = 2
+            await STATE.set(msg.from_user.id, state)
             return await msg.answer(
                 "Шаг 3/4: отправьте <b>дедлайн в UTC</b> в формате <code>YYYY-MM-DD HH:MM</code>.\n"
                 "Пример: <code>2025-09-25 18:00</code>",
@@ -132,36 +141,30 @@ async def on_text(msg: Message):
             except Exception:
                 return await msg.answer("❌ Некорректная дата. Нужен формат: YYYY-MM-DD HH:MM (UTC).",
                                         reply_markup=back_kb())
-            data["due_utc"] = due_utc
+            data["due_ts"] = to_ts(due_utc)
             state["step"] = 3
+            await STATE.set(msg.from_user.id, state)
             return await msg.answer("Шаг 4/4: отправьте <b>описание</b> (или «-»).", reply_markup=back_kb())
         elif step == 3:
             description = msg.text.strip()
             if description == "-":
                 description = ""
-            async with aiosqlite.connect(DB_PATH) as db:
-                db.row_factory = aiosqlite.Row
-                class_row = await fetchone(db, "SELECT * FROM classes WHERE id=?", (data["class_id"],))
-                if not class_row:
-                    return await msg.answer("Класс не найден (возможно, был удалён).", reply_markup=back_kb())
+            class_row = await CLASSES.get(data["class_id"])
+            if not class_row:
+                return await msg.answer("Класс не найден (возможно, был удалён).", reply_markup=back_kb())
 
-                tz = ZoneInfo(class_row["timezone"])
+            tz = ZoneInfo(class_row["timezone"])
 
-                await db.execute(
-                    "INSERT INTO tasks(class_id, title, description, due_utc, created_utc) VALUES(?, ?, ?, ?, ?)",
-                    (
-                        class_row["id"], data["title"], description,
-                        data["due_utc"].astimezone(timezone.utc).isoformat(),
-                        datetime.now(timezone.utc).isoformat()
-                    )
+            async with db_write() as db:
+                cur = await db.execute(
+                    "INSERT INTO tasks(class_id, title, description, due_ts, created_ts) VALUES(?, ?, ?, ?, ?)",
+                    (class_row["id"], data["title"], description, data["due_ts"], to_ts(datetime.now(timezone.utc)))
                 )
-                await db.commit()
-                row = await fetchone(db, "SELECT last_insert_rowid() AS id")
-                task_id = row["id"]
+                task_id = cur.lastrowid
 
             await schedule_task_jobs(task_id)
-            due_local_str = fmt_dt_local(data["due_utc"], tz)
-            USER_STATE.pop(msg.from_user.id, None)
+            due_local_str = fmt_dt_local(from_ts(data["due_ts"]), tz)
+            await STATE.pop(msg.from_user.id)
             return await msg.answer(
                 f"✅ Задание создано: <b>{data['title']}</b>\n"
                 f"Класс: <b>{class_row['name']}</b>\n"
@@ -175,10 +178,10 @@ async def on_text(msg: Message):
         if not desc:
             return await msg.answer("Опишите задачу текстом.", reply_markup=back_kb())
         from handlers.gen import _run_generation
-        USER_STATE.pop(msg.from_user.id, None)
-        return await _run_generation(msg, desc)
+        await STATE.pop(msg.from_user.id)
+        return await _run_generation(msg, desc, data.get("model"))
 
     # fallback
-    USER_STATE.pop(msg.from_user.id, None)
+    await STATE.pop(msg.from_user.id)
     from handlers.common import show_main_menu
     await show_main_menu(msg)
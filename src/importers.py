@@ -0,0 +1,182 @@
+# -*- coding: utf-8 -*-
+"""Разбор загружаемых файлов (CSV/JSON/XLSX) для массового импорта."""
+import codecs
+import csv
+import io
+import json
+import re
+from datetime import datetime, timezone
+from typing import BinaryIO, Iterator
+
+try:
+    import openpyxl  # в requirements.txt; без него работают CSV и JSON, а .xlsx даёт понятную ошибку
+except ImportError:
+    openpyxl = None
+
+from config import IMPORT_MAX_ROWS
+from utils import parse_utc_hhmm
+
+# допустимые названия колонок -> каноническое имя
+TASK_COLUMNS = {
+    "title": "title", "название": "title",
+    "due_utc": "due_utc", "due": "due_utc", "дедлайн": "due_utc",
+    "description": "description", "описание": "description",
+}
+
+ROSTER_COLUMNS = {
+    "name": "name", "имя": "name", "фио": "name", "ученик": "name",
+    "username": "username", "telegram": "username", "логин": "username",
+    "classes": "classes", "class": "classes", "классы": "classes", "класс": "classes",
+}
+
+_CLASS_SEP = re.compile(r"[,;|]")
+
+
+def _decode(data: bytes) -> str:
+    try:
+        return data.decode("utf-8-sig")
+    except UnicodeDecodeError:
+        return data.decode("cp1251")
+
+
+def _csv_records(text: str):
+    """Строки CSV как словари; разделитель , ; или табуляция (Excel в RU сохраняет через ;)."""
+    head = text[:4096]
+    try:
+        dialect = csv.Sniffer().sniff(head, delimiters=",;\t")
+    except csv.Error:
+        dialect = csv.excel
+    yield from csv.DictReader(io.StringIO(text), dialect=dialect)
+
+
+def _normalize(record: dict, columns: dict) -> dict:
+    out = {}
+    for k, v in record.items():
+        if k is None:
+            continue
+        key = columns.get(k.strip().lower())
+        if key:
+            out[key] = v.strip() if isinstance(v, str) else v
+    return out
+
+
+def _parse_due(value) -> datetime:
+    """'YYYY-MM-DD HH:MM' (UTC) или ISO 8601."""
+    if isinstance(value, (int, float)):
+        return datetime.fromtimestamp(value, tz=timezone.utc)
+    s = str(value or "").strip()
+    try:
+        return parse_utc_hhmm(s)
+    except ValueError:
+        dt = datetime.fromisoformat(s)
+        return dt.replace(tzinfo=timezone.utc) if dt.tzinfo is None else dt.astimezone(timezone.utc)
+
+
+def read_records(filename: str, data: bytes):
+    """Итератор записей-словарей из .json (список объектов) или .csv."""
+    text = _decode(data)
+    if filename.lower().endswith(".json"):
+        items = json.loads(text)
+        if isinstance(items, dict):
+            items = items.get("tasks") or items.get("items") or []
+        if not isinstance(items, list):
+            raise ValueError("JSON должен содержать список объектов")
+        yield from items
+    else:
+        yield from _csv_records(text)
+
+
+def parse_tasks(filename: str, data: bytes) -> tuple[list[tuple[str, str, datetime]], list[str]]:
+    """
+    Разбор файла заданий. Колонки: title, due_utc, description (описание необязательно).
+    Возвращает ([(title, description, due_utc), ...], [ошибки по строкам]).
+    """
+    tasks, errors = [], []
+    for n, record in enumerate(read_records(filename, data), start=1):
+        if n > IMPORT_MAX_ROWS:
+            errors.append(f"строки после {IMPORT_MAX_ROWS} пропущены (лимит)")
+            break
+        if not isinstance(record, dict):
+            errors.append(f"строка {n}: ожидался объект")
+            continue
+        rec = _normalize(record, TASK_COLUMNS)
+        title = rec.get("title")
+        if not title:
+            errors.append(f"строка {n}: нет названия")
+            continue
+        try:
+            due_utc = _parse_due(rec.get("due_utc"))
+        except (ValueError, TypeError, OverflowError):
+            errors.append(f"строка {n}: некорректный дедлайн «{rec.get('due_utc') or ''}»")
+            continue
+        description = rec.get("description") or ""
+        if description == "-":
+            description = ""
+        tasks.append((str(title), str(description), due_utc))
+    return tasks, errors
+
+
+# -------------------------------
+# Ростер учеников
+# -------------------------------
+def _sniff_encoding(stream: BinaryIO) -> str:
+    """utf-8-sig или cp1251 по началу файла; позиция потока возвращается в начало."""
+    head = stream.read(64 * 1024)
+    stream.seek(0)
+    try:
+        codecs.getincrementaldecoder("utf-8-sig")().decode(head, final=False)
+        return "utf-8-sig"
+    except UnicodeDecodeError:
+        return "cp1251"
+
+
+def _csv_stream(stream: BinaryIO) -> Iterator[dict]:
+    """Строки CSV по одной, без чтения всего файла в строку."""
+    text = io.TextIOWrapper(stream, encoding=_sniff_encoding(stream), newline="")
+    try:
+        dialect = csv.Sniffer().sniff(text.read(4096), delimiters=",;\t")
+    except csv.Error:
+        dialect = csv.excel
+    text.seek(0)
+    try:
+        yield from csv.DictReader(text, dialect=dialect)
+    finally:
+        text.detach()
+
+
+def _xlsx_stream(stream: BinaryIO) -> Iterator[dict]:
+    """Строки первого листа .xlsx; первая строка — заголовки."""
+    if openpyxl is None:
+        raise ValueError("для .xlsx нужен пакет openpyxl — сохраните файл как CSV")
+    wb = openpyxl.load_workbook(stream, read_only=True, data_only=True)
+    try:
+        rows = wb.active.iter_rows(values_only=True)
+        header = [str(h).strip() if h is not None else None for h in next(rows, ())]
+        for values in rows:
+            if any(v not in (None, "") for v in values):
+                yield {h: ("" if v is None else str(v)) for h, v in zip(header, values)}
+    finally:
+        wb.close()
+
+
+def parse_roster(filename: str, stream: BinaryIO):
+    """
+    Разбор ростера построчно. Колонки: name, username (необязательно), classes —
+    названия классов через запятую/точку с запятой (необязательно).
+    Итератор: (номер строки, (name, username | None, [классы])) или (номер строки, ошибка: str).
+    """
+    records = _xlsx_stream(stream) if filename.lower().endswith(".xlsx") else _csv_stream(stream)
+    for n, record in enumerate(records, start=1):
+        if n > IMPORT_MAX_ROWS:
+            yield n, f"строки после {IMPORT_MAX_ROWS} пропущены (лимит)"
+            return
+        rec = _normalize(record, ROSTER_COLUMNS)
+        name = rec.get("name")
+        if not name:
+            yield n, f"строка {n}: нет имени"
+            continue
+        username = (rec.get("username") or "").lstrip("@") or None
+        if username == "-":
+            username = None
+        classes = [c.strip() for c in _CLASS_SEP.split(rec.get("classes") or "") if c.strip()]
+        yield n, (name, username, classes)
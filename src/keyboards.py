@@ -1,27 +1,67 @@
 # -*- coding: utf-8 -*-
-from typing import List, Tuple
+from typing import Callable, List, Sequence, Tuple
 from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton
+from config import KB_PAGE_SIZE
 from callbacks import (
     CB_BACK, CB_ADD_TASK, CB_LIST_TASKS, CB_ADD_CLASS, CB_ADD_STUDENT,
-    CB_ENROLL, CB_REGISTER, CB_GEN, CB_SETTINGS
+    CB_ENROLL, CB_REGISTER, CB_GEN, CB_SETTINGS, CB_IMPORT_TASKS, CB_NOOP,
+    CB_SETTINGS_DIGEST, CB_IMPORT_ROSTER, CB_EXPORT
 )
 
+# статичные клавиатуры собираются один раз при импорте и переиспользуются
+_BACK_KB = InlineKeyboardMarkup(inline_keyboard=[
+    [InlineKeyboardButton(text="⬅ Назад в главное меню", callback_data=CB_BACK)]
+])
+
 def back_kb() -> InlineKeyboardMarkup:
-    return InlineKeyboardMarkup(inline_keyboard=[
-        [InlineKeyboardButton(text="⬅ Назад в главное меню", callback_data=CB_BACK)]
-    ])
+    return _BACK_KB
 
 def single_col_kb(rows: List[Tuple[str, str]]) -> InlineKeyboardMarkup:
     return InlineKeyboardMarkup(inline_keyboard=[[InlineKeyboardButton(text=t, callback_data=cb)] for t, cb in rows])
 
+def paged_kb(rows: Sequence[Tuple[str, str]], page: int, page_cb: Callable[[int], str],
+             head: Sequence[Tuple[str, str]] = (), tail: Sequence[Tuple[str, str]] = (),
+             page_size: int = KB_PAGE_SIZE, total: int | None = None) -> InlineKeyboardMarkup:
+    """
+    Столбец кнопок по страницам: у Telegram есть предел кнопок на сообщение,
+    длинные списки (классы, ученики) иначе не отправятся.
+    page_cb(n) — callback_data для перехода на страницу n; head/tail — на каждой странице.
+    total — rows уже и есть страница page (выбрана в SQL), всего строк total.
+    """
+    pages = max(1, -(-(len(rows) if total is None else total) // page_size))
+    page = min(max(page, 0), pages - 1)
+    chunk = rows[page * page_size:(page + 1) * page_size] if total is None else rows
+    kb = [[InlineKeyboardButton(text=t, callback_data=cb)] for t, cb in (*head, *chunk, *tail)]
+    if pages > 1:
+        nav = []
+        if page > 0:
+            nav.append(InlineKeyboardButton(text="◀", callback_data=page_cb(page - 1)))
+        nav.append(InlineKeyboardButton(text=f"{page + 1}/{pages}", callback_data=CB_NOOP))
+        if page < pages - 1:
+            nav.append(InlineKeyboardButton(text="▶", callback_data=page_cb(page + 1)))
+        kb.append(nav)
+    return InlineKeyboardMarkup(inline_keyboard=kb)
+
+_MAIN_MENU_KB = InlineKeyboardMarkup(inline_keyboard=[
+    [InlineKeyboardButton(text="➕ Добавить задание", callback_data=CB_ADD_TASK)],
+    [InlineKeyboardButton(text="📥 Импорт заданий (CSV/JSON)", callback_data=CB_IMPORT_TASKS)],
+    [InlineKeyboardButton(text="📋 Список заданий", callback_data=CB_LIST_TASKS)],
+    [InlineKeyboardButton(text="📤 Экспорт в CSV", callback_data=CB_EXPORT)],
+    [InlineKeyboardButton(text="🏷 Добавить класс", callback_data=CB_ADD_CLASS)],
+    [InlineKeyboardButton(text="👤 Добавить ученика", callback_data=CB_ADD_STUDENT)],
+    [InlineKeyboardButton(text="👥 Импорт учеников (CSV/XLSX)", callback_data=CB_IMPORT_ROSTER)],
+    [InlineKeyboardButton(text="🔗 Записать ученика в класс", callback_data=CB_ENROLL)],
+    [InlineKeyboardButton(text="💬 Привязать чат ученика", callback_data=CB_REGISTER)],
+    [InlineKeyboardButton(text="🤖 Сгенерировать код (описанием)", callback_data=CB_GEN)],
+    [InlineKeyboardButton(text="⚙️ Настройки", callback_data=CB_SETTINGS)],
+])
+
 def main_menu_kb() -> InlineKeyboardMarkup:
+    return _MAIN_MENU_KB
+
+def settings_kb(digest: bool) -> InlineKeyboardMarkup:
     return InlineKeyboardMarkup(inline_keyboard=[
-        [InlineKeyboardButton(text="➕ Добавить задание", callback_data=CB_ADD_TASK)],
-        [InlineKeyboardButton(text="📋 Список заданий", callback_data=CB_LIST_TASKS)],
-        [InlineKeyboardButton(text="🏷 Добавить класс", callback_data=CB_ADD_CLASS)],
-        [InlineKeyboardButton(text="👤 Добавить ученика", callback_data=CB_ADD_STUDENT)],
-        [InlineKeyboardButton(text="🔗 Записать ученика в класс", callback_data=CB_ENROLL)],
-        [InlineKeyboardButton(text="💬 Привязать чат ученика", callback_data=CB_REGISTER)],
-        [InlineKeyboardButton(text="🤖 Сгенерировать код (описанием)", callback_data=CB_GEN)],
-        [InlineKeyboardButton(text="⚙️ Настройки", callback_data=CB_SETTINGS)],
+        [InlineKeyboardButton(text=f"🗂 Сводка напоминаний: {'вкл' if digest else 'выкл'}",
+                              callback_data=CB_SETTINGS_DIGEST)],
+        [InlineKeyboardButton(text="⬅ Назад в главное меню", callback_data=CB_BACK)],
     ])
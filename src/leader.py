@@ -0,0 +1,101 @@
+# -*- coding: utf-8 -*-
+"""
+Выбор ведущего процесса через аренду (lease) в SQLite.
+
+Несколько процессов бота работают с одной БД; аренду держит ровно один —
+он ведёт напоминания и периодические задачи. Ведущий продлевает аренду каждые
+LEADER_HEARTBEAT_S секунд; если процесс упал или завис, через LEADER_LEASE_S
+аренду забирает следующий. Даже при кратком пересечении двух ведущих
+напоминание не уйдёт дважды: ReminderEngine атомарно помечает строку jobs.
+"""
+import asyncio
+import os
+import socket
+import time
+from typing import Awaitable, Callable
+
+from config import LEADER_LEASE_S, LEADER_HEARTBEAT_S
+from db import fetchone, db_write
+
+
+class LeaderLease:
+    def __init__(self, name: str = "scheduler",
+                 on_elected: Callable[[], Awaitable] | None = None,
+                 on_lost: Callable[[], Awaitable] | None = None,
+                 ttl: float = LEADER_LEASE_S, heartbeat: float = LEADER_HEARTBEAT_S,
+                 holder: str | None = None):
+        self.name = name
+        self.on_elected = on_elected
+        self.on_lost = on_lost
+        self.ttl = ttl
+        self.heartbeat = min(heartbeat, ttl / 2)
+        self.holder = holder or f"{socket.gethostname()}:{os.getpid()}"
+        self.is_leader = False
+        self._renewed_at = 0.0
+        self._task: asyncio.Task | None = None
+
+    # ---------- жизненный цикл ----------
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        if self.is_leader:
+            await self._step_down()
+            # отдаём аренду сразу, чтобы резервный процесс не ждал истечения
+            try:
+                async with db_write() as db:
+                    await db.execute("DELETE FROM leader_lease WHERE name = ? AND holder = ?",
+                                     (self.name, self.holder))
+            except Exception as e:
+                print(f"[leader] release failed: {e}")
+
+    # ---------- аренда ----------
+    async def try_acquire(self) -> bool:
+        """Взять свободную/просроченную аренду или продлить свою. True — мы ведущий."""
+        now = time.time()
+        async with db_write() as db:
+            await db.execute(
+                """INSERT INTO leader_lease(name, holder, expires_ts) VALUES(?, ?, ?)
+                   ON CONFLICT(name) DO UPDATE SET holder = excluded.holder, expires_ts = excluded.expires_ts
+                   WHERE leader_lease.holder = excluded.holder OR leader_lease.expires_ts < ?""",
+                (self.name, self.holder, now + self.ttl, now)
+            )
+            row = await fetchone(db, "SELECT holder FROM leader_lease WHERE name = ?", (self.name,))
+        return row is not None and row["holder"] == self.holder
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                acquired = await self.try_acquire()
+            except Exception as e:
+                print(f"[leader] heartbeat failed: {e}")
+                # не смогли продлить — аренда вот-вот достанется другому, уступаем заранее
+                acquired = self.is_leader and time.monotonic() - self._renewed_at < self.ttl - self.heartbeat
+            if acquired:
+                self._renewed_at = time.monotonic()
+                if not self.is_leader:
+                    self.is_leader = True
+                    print(f"[leader] {self.holder}: стал ведущим ({self.name})")
+                    if self.on_elected:
+                        try:
+                            await self.on_elected()
+                        except Exception as e:
+                            print(f"[leader] start failed: {e}")
+                            await self._step_down()
+            elif self.is_leader:
+                await self._step_down()
+            await asyncio.sleep(self.heartbeat)
+
+    async def _step_down(self) -> None:
+        self.is_leader = False
+        print(f"[leader] {self.holder}: больше не ведущий ({self.name})")
+        if self.on_lost:
+            try:
+                await self.on_lost()
+            except Exception as e:
+                print(f"[leader] stop failed: {e}")
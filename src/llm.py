@@ -0,0 +1,75 @@
+# -*- coding: utf-8 -*-
+"""
+Реестр LLM-клиентов: один клиент и одна цепочка PROMPT | llm | PARSER на модель.
+
+Клиенты создаются лениво и переиспользуются всеми запросами. При старте модель
+прогревается коротким запросом, а периодический пинг не даёт Ollama выгрузить её.
+Для тестов/бенчмарков бэкенд можно подменить: LLM.use_fake_backend([...]).
+"""
+import time
+from typing import Callable
+
+from config import DEFAULT_MODEL, GEN_MODELS, PROMPT, PARSER, build_llm
+
+
+class LLMRegistry:
+    def __init__(self, models: dict = GEN_MODELS, factory: Callable | None = build_llm):
+        self.models = dict(models)      # alias -> имя модели в Ollama
+        self._factory = factory
+        self._llms: dict = {}
+        self._chains: dict = {}
+
+    def resolve(self, name: str | None) -> str:
+        """Псевдоним ('fast') или имя модели -> имя модели; по умолчанию DEFAULT_MODEL."""
+        if name in self.models:
+            return self.models[name]
+        if name and name in self.models.values():
+            return name
+        return DEFAULT_MODEL
+
+    def set_factory(self, factory: Callable) -> None:
+        """factory(model_name) -> chat model. Сбрасывает созданные клиенты."""
+        self._factory = factory
+        self._llms.clear()
+        self._chains.clear()
+
+    def use_fake_backend(self, responses: list[str]) -> None:
+        """Локальная заглушка вместо Ollama (ответы по кругу)."""
+        from langchain_core.language_models.fake_chat_models import FakeListChatModel
+        self.set_factory(lambda model_name: FakeListChatModel(responses=responses))
+
+    def llm(self, model_name: str):
+        client = self._llms.get(model_name)
+        if client is None:
+            if self._factory is None:
+                raise RuntimeError("LLM-бэкенд недоступен")
+            client = self._llms[model_name] = self._factory(model_name)
+        return client
+
+    def chain(self, model_name: str):
+        chain = self._chains.get(model_name)
+        if chain is None:
+            chain = self._chains[model_name] = PROMPT | self.llm(model_name) | PARSER
+        return chain
+
+    async def warm_up(self, model_names=None) -> None:
+        """Загрузить модели в память Ollama одним коротким запросом (1 токен ответа)."""
+        for model_name in model_names or [DEFAULT_MODEL]:
+            started = time.perf_counter()
+            try:
+                await self.llm(model_name).ainvoke("ping", num_predict=1)
+            except Exception as e:
+                print(f"Прогрев модели {model_name} не удался: {e}")
+            else:
+                print(f"Модель {model_name} прогрета за {time.perf_counter() - started:.1f} с")
+
+    async def keep_alive(self) -> None:
+        """Пинг уже используемых моделей, чтобы Ollama не выгружала их между запросами."""
+        for model_name in list(self._llms) or [DEFAULT_MODEL]:
+            try:
+                await self.llm(model_name).ainvoke("ping", num_predict=1)
+            except Exception as e:
+                print(f"Keep-alive модели {model_name} не удался: {e}")
+
+
+LLM = LLMRegistry()
@@ -1,53 +1,228 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
 
+import argparse
 import asyncio
+import multiprocessing
+import signal
+import time
 import pytz  # type: ignore
+from datetime import datetime, timedelta
 
 from aiogram import Bot, Dispatcher
 from config import default_props
-from db import ensure_db
-from scheduler_jobs import set_bot, set_scheduler, rehydrate_jobs
+from db import ensure_db, init_pool, close_pool
+from outbox import OUTBOX
+from scheduler_jobs import set_bot, set_scheduler, rehydrate_jobs, stop_reminders, ENGINE
 from apscheduler.schedulers.asyncio import AsyncIOScheduler
 
 # routers
 from handlers.common import router as common_router
+from handlers.admin import router as admin_router
 from handlers.classes import router as classes_router
 from handlers.students import router as students_router
 from handlers.enroll import router as enroll_router
 from handlers.tasks import router as tasks_router
-from handlers.gen import router as gen_router
+from handlers.gen import router as gen_router, GEN_QUEUE
+from handlers.imports import router as imports_router
+from handlers.exports import router as exports_router
 from handlers.text import router as text_router
 
-from config import BOT_TOKEN
+from config import (
+    BOT_TOKEN, ENABLE_GEN, LLM_WARMUP, LLM_KEEPALIVE_PING_S, RETENTION_INTERVAL_S, WORKERS, OUTBOX_GLOBAL_RATE,
+    BOT_MODE, WEBHOOK_URL, WEBHOOK_PATH, WEBHOOK_HOST, WEBHOOK_PORT, WEBHOOK_SECRET, METRICS_PORT
+)
+import metrics
+from leader import LeaderLease
+from webhook import WebhookServer
+from retention import retention_job
+from state import STATE
+from llm import LLM
+from codecheck import CHECKER
+from throttling import THROTTLE
 
-async def main():
-    await ensure_db()
-
-    bot = Bot(token=BOT_TOKEN, default=default_props)
+def build_dispatcher() -> Dispatcher:
     dp = Dispatcher()
-
-    # include routers
+    # лимиты на пользователя — до фильтров: отброшенный апдейт не доходит до БД и модели
+    dp.message.outer_middleware(THROTTLE)
+    dp.callback_query.outer_middleware(THROTTLE)
     dp.include_router(common_router)
+    dp.include_router(admin_router)
     dp.include_router(classes_router)
     dp.include_router(students_router)
     dp.include_router(enroll_router)
     dp.include_router(tasks_router)
     dp.include_router(gen_router)
+    dp.include_router(imports_router)
+    dp.include_router(exports_router)
     dp.include_router(text_router)
+    metrics.install(dp)
+    return dp
+
+
+def install_stop_signals(loop: asyncio.AbstractEventLoop, stop: asyncio.Event) -> None:
+    """SIGINT/SIGTERM выставляют stop — бот завершается штатно."""
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        try:
+            loop.add_signal_handler(sig, stop.set)
+        except NotImplementedError:
+            # Windows: у цикла событий нет обработчиков сигналов — ставим обычный
+            signal.signal(sig, lambda *_: loop.call_soon_threadsafe(stop.set))
+
+
+def add_periodic_jobs(scheduler: AsyncIOScheduler) -> None:
+    scheduler.add_job(retention_job, "interval", seconds=RETENTION_INTERVAL_S,
+                      next_run_time=datetime.now(pytz.utc) + timedelta(minutes=1))
+    # брошенные диалоги (FSM) старше FSM_TTL_S
+    scheduler.add_job(STATE.purge_expired, "interval", minutes=30)
+    # пинг, чтобы Ollama не выгружала модель
+    if ENABLE_GEN and LLM_KEEPALIVE_PING_S > 0:
+        scheduler.add_job(LLM.keep_alive, "interval", seconds=LLM_KEEPALIVE_PING_S)
+
+
+async def main(workers: int = 1, index: int = 0):
+    await ensure_db()
+    pool = await init_pool()
+    webhook_mode = BOT_MODE == "webhook"
+    if workers > 1:
+        # апдейты одного диалога могут попасть в разные процессы — состояние только из общего хранилища
+        STATE.set_shared(True)
+
+    bot = Bot(token=BOT_TOKEN, default=default_props)
+    # все исходящие запросы идут через общую очередь с лимитами Telegram
+    bot.session.middleware(OUTBOX)
+    if webhook_mode and workers > 1:
+        # отвечают все процессы — общий лимит бота делим поровну
+        OUTBOX.set_global_rate(OUTBOX_GLOBAL_RATE / workers)
+    OUTBOX.start()
+    if ENABLE_GEN:
+        CHECKER.start()   # процессы проверки кода поднимаем заранее, а не на первом /gen
+    dp = build_dispatcher()
+
+    # webhook: апдейты принимает каждый процесс (общий порт через SO_REUSEPORT)
+    server = None
+    if webhook_mode:
+        server = WebhookServer(dp, bot)
+        await server.start(WEBHOOK_HOST, WEBHOOK_PORT, reuse_port=workers > 1)
 
-    # scheduler
+    # scheduler: периодические задачи; напоминания ведёт ENGINE на одном таймере.
+    # И то и другое работает только в ведущем процессе (аренда в БД)
     scheduler = AsyncIOScheduler(timezone=pytz.utc)
     scheduler.start()
     set_bot(bot)
     set_scheduler(scheduler)
-    await rehydrate_jobs()
 
-    print("Bot is running. Press Ctrl+C to stop.")
-    await dp.start_polling(bot)
+    polling: asyncio.Task | None = None
+
+    async def on_elected():
+        nonlocal polling
+        await rehydrate_jobs()
+        add_periodic_jobs(scheduler)
+        # модель: прогрев в фоне (не задерживаем старт)
+        if ENABLE_GEN and LLM_WARMUP:
+            asyncio.create_task(LLM.warm_up([LLM.resolve(None)]))
+        if webhook_mode:
+            # пустой WEBHOOK_URL — сервер только слушает (локальная проверка записанными апдейтами)
+            if WEBHOOK_URL:
+                try:
+                    await bot.set_webhook(WEBHOOK_URL.rstrip("/") + WEBHOOK_PATH, secret_token=WEBHOOK_SECRET or None,
+                                          allowed_updates=dp.resolve_used_update_types())
+                except Exception as e:
+                    print(f"setWebhook failed: {e}")
+        else:
+            # getUpdates допускает одного получателя на токен — апдейты забирает ведущий
+            polling = asyncio.create_task(dp.start_polling(bot, handle_signals=False, close_bot_session=False))
+
+    async def on_lost():
+        nonlocal polling
+        if polling is not None:
+            polling.cancel()
+            await asyncio.gather(polling, return_exceptions=True)
+            polling = None
+        scheduler.remove_all_jobs()
+        await stop_reminders()
+
+    lease = LeaderLease(on_elected=on_elected, on_lost=on_lost)
+
+    metrics.ENGINE_WINDOW.set_function(ENGINE.pending)
+    metrics.OUTBOX_DEPTH.set_function(OUTBOX.depth)
+    metrics.GEN_QUEUE_DEPTH.set_function(GEN_QUEUE.depth)
+    metrics.IS_LEADER.set_function(lambda: int(lease.is_leader))
+    if server is not None:
+        metrics.WEBHOOK_QUEUE_DEPTH.set_function(server.depth)
+    metrics_runner = await metrics.start_server(METRICS_PORT + index if METRICS_PORT else 0)
+
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    install_stop_signals(loop, stop)
+    lease.start()
+
+    mode = f"webhook on {WEBHOOK_HOST}:{WEBHOOK_PORT}{WEBHOOK_PATH}" if webhook_mode else "polling"
+    print(f"Bot is running ({lease.holder}, {mode}). Press Ctrl+C to stop.")
+    try:
+        await stop.wait()
+    finally:
+        if server is not None:
+            await server.stop()
+        await lease.stop()
+        if metrics_runner is not None:
+            await metrics_runner.cleanup()
+        scheduler.shutdown(wait=False)
+        await GEN_QUEUE.stop()
+        await CHECKER.stop()
+        await OUTBOX.stop()
+        await bot.session.close()
+        print(f"DB pool stats: {pool.stats()}")
+        await close_pool()
+
+
+def _worker(workers: int, index: int) -> None:
+    try:
+        asyncio.run(main(workers, index))
+    except KeyboardInterrupt:
+        pass
+
+
+def run_workers(workers: int) -> None:
+    """
+    Несколько процессов на одной БД. Миграции — один раз здесь, до запуска;
+    упавший процесс перезапускается, его роль ведущего забирает резервный.
+    """
+    asyncio.run(ensure_db())
+    ctx = multiprocessing.get_context("spawn")
+    procs = {}
+    try:
+        while True:
+            for n in range(workers):
+                p = procs.get(n)
+                if p is not None and p.is_alive():
+                    continue
+                if p is not None:
+                    print(f"Worker {n} exited with code {p.exitcode}, restarting")
+                procs[n] = ctx.Process(target=_worker, args=(workers, n), name=f"bot-worker-{n}")
+                procs[n].start()
+            time.sleep(1)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        for p in procs.values():
+            if p.is_alive():
+                p.terminate()
+        for p in procs.values():
+            p.join()
+
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--workers", type=int, default=WORKERS, help="число процессов бота (по умолчанию WORKERS)")
+    args = parser.parse_args()
+    if args.workers > 1 and BOT_MODE != "webhook":
+        # getUpdates отдаёт апдейты одному получателю: остальные процессы только ждали бы аренду
+        parser.error("--workers > 1 работает только с BOT_MODE=webhook; при polling апдейты получает один процесс")
     try:
-        asyncio.run(main())
+        if args.workers > 1:
+            run_workers(args.workers)
+        else:
+            asyncio.run(main())
     except (KeyboardInterrupt, SystemExit):
         print("Stopped.")
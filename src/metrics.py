@@ -0,0 +1,288 @@
+# -*- coding: utf-8 -*-
+"""
+Метрики процесса в текстовом формате Prometheus.
+
+Счётчики, гистограммы и gauge без внешних зависимостей; отдаются по HTTP
+на METRICS_HOST:METRICS_PORT (/metrics). При нескольких процессах каждый
+слушает свой порт: METRICS_PORT + номер процесса.
+
+Что меряем:
+- хендлеры — HandlerMetrics (middleware aiogram): время и ошибки по роутеру,
+  хендлеру и префиксу callback_data;
+- SQL — TimedConnection в пуле БД: время каждого execute/executemany;
+- LLM — время ответа, время до первого токена, число токенов;
+- проверка сгенерированного кода — время и доля прошедших;
+- напоминания — опоздание срабатывания относительно run_at_ts;
+- исходящие запросы — по методу Bot API и результату;
+- входящие апдейты, отброшенные ограничением частоты, — по типу и причине;
+- глубины очередей — gauge, которые считаются в момент запроса /metrics.
+"""
+import re
+import time
+from functools import lru_cache
+from typing import Any, Awaitable, Callable
+
+from aiogram import BaseMiddleware
+from aiogram.types import CallbackQuery, Message, TelegramObject
+from aiohttp import web
+
+from config import METRICS_HOST, METRICS_PORT
+
+_LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+_LLM_BUCKETS = (0.1, 0.25, 0.5, 1, 2, 5, 10, 20, 30, 60, 120, 300)
+_LAG_BUCKETS = (0.01, 0.05, 0.1, 0.5, 1, 2, 5, 15, 30, 60, 300, 3600)
+_TOKEN_BUCKETS = (16, 32, 64, 128, 256, 512, 1024, 2048, 4096)
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels_text(names: tuple, values: tuple, extra: str = "") -> str:
+    parts = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, doc: str, labels: tuple = ()):
+        self.name = name
+        self.doc = doc
+        self.labels = tuple(labels)
+
+    def _key(self, labels: dict) -> tuple:
+        return tuple(labels.get(n, "") for n in self.labels)
+
+    def render(self) -> list[str]:
+        return [f"# HELP {self.name} {self.doc}", f"# TYPE {self.name} {self.kind}", *self._samples()]
+
+    def _samples(self) -> list[str]:
+        raise NotImplementedError
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name, doc, labels=()):
+        super().__init__(name, doc, labels)
+        self._values: dict = {}
+
+    def inc(self, value: float = 1, **labels) -> None:
+        key = self._key(labels)
+        self._values[key] = self._values.get(key, 0) + value
+
+    def _samples(self):
+        return [f"{self.name}{_labels_text(self.labels, k)} {v}" for k, v in self._values.items()]
+
+
+class Gauge(_Metric):
+    """Значение задаётся set() или считается функцией в момент выдачи метрик."""
+    kind = "gauge"
+
+    def __init__(self, name, doc, labels=(), func: Callable[[], float] | None = None):
+        super().__init__(name, doc, labels)
+        self._values: dict = {}
+        self._func = func
+
+    def set(self, value: float, **labels) -> None:
+        self._values[self._key(labels)] = value
+
+    def set_function(self, func: Callable[[], float]) -> None:
+        self._func = func
+
+    def _samples(self):
+        if self._func is not None:
+            try:
+                return [f"{self.name} {self._func()}"]
+            except Exception:
+                return []
+        return [f"{self.name}{_labels_text(self.labels, k)} {v}" for k, v in self._values.items()]
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name, doc, labels=(), buckets=_LATENCY_BUCKETS):
+        super().__init__(name, doc, labels)
+        self.buckets = tuple(sorted(buckets))
+        self._series: dict = {}   # key -> [counts по бакетам..., sum, count]
+
+    def observe(self, value: float, **labels) -> None:
+        key = self._key(labels)
+        series = self._series.get(key)
+        if series is None:
+            series = self._series[key] = [0] * (len(self.buckets) + 2)
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                series[i] += 1
+        series[-2] += value
+        series[-1] += 1
+
+    def _samples(self):
+        out = []
+        for key, series in self._series.items():
+            for bound, n in zip((*self.buckets, "+Inf"), (*series[:-2], series[-1])):
+                le = 'le="%s"' % bound
+                out.append(f"{self.name}_bucket{_labels_text(self.labels, key, le)} {n}")
+            labels = _labels_text(self.labels, key)
+            out.append(f"{self.name}_sum{labels} {series[-2]}")
+            out.append(f"{self.name}_count{labels} {series[-1]}")
+        return out
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: dict = {}
+
+    def add(self, metric: _Metric) -> _Metric:
+        self._metrics[metric.name] = metric
+        return metric
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics.values():
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+HANDLER_SECONDS = REGISTRY.add(Histogram(
+    "bot_handler_seconds", "Время обработки апдейта хендлером", ("router", "handler", "prefix")))
+HANDLER_ERRORS = REGISTRY.add(Counter(
+    "bot_handler_errors_total", "Исключения в хендлерах", ("router", "handler", "prefix")))
+DB_QUERY_SECONDS = REGISTRY.add(Histogram(
+    "bot_db_query_seconds", "Время SQL-выражения", ("op", "table")))
+LLM_SECONDS = REGISTRY.add(Histogram(
+    "bot_llm_seconds", "Время генерации ответа модели", ("model", "status"), _LLM_BUCKETS))
+LLM_FIRST_TOKEN_SECONDS = REGISTRY.add(Histogram(
+    "bot_llm_first_token_seconds", "Время до первого токена (потоковая генерация)", ("model",), _LLM_BUCKETS))
+LLM_TOKENS = REGISTRY.add(Histogram(
+    "bot_llm_output_tokens", "Токенов в ответе модели (фрагментов потока)", ("model",), _TOKEN_BUCKETS))
+SNIPPETS = REGISTRY.add(Counter(
+    "bot_snippets_total", "Ответы /gen из библиотеки примеров", ("result",)))
+CODECHECK_SECONDS = REGISTRY.add(Histogram(
+    "bot_codecheck_seconds", "Время проверки сгенерированного кода"))
+CODECHECK_RESULTS = REGISTRY.add(Counter(
+    "bot_codecheck_total", "Результаты проверки кода и попыток исправления", ("status",)))
+REMINDER_LAG_SECONDS = REGISTRY.add(Histogram(
+    "bot_reminder_lag_seconds", "Опоздание напоминания относительно run_at_ts", ("kind",), _LAG_BUCKETS))
+REMINDERS = REGISTRY.add(Counter(
+    "bot_reminders_total", "Срабатывания напоминаний", ("status",)))
+THROTTLED = REGISTRY.add(Counter(
+    "bot_throttled_total", "Входящие апдейты, отброшенные ограничением частоты", ("kind", "reason")))
+OUTBOUND = REGISTRY.add(Counter(
+    "bot_outbound_requests_total", "Запросы к Bot API (через OUTBOX)", ("method", "status")))
+ENGINE_WINDOW = REGISTRY.add(Gauge("bot_reminder_window", "Напоминаний в окне движка"))
+OUTBOX_DEPTH = REGISTRY.add(Gauge("bot_outbox_depth", "Запросов ждёт отправки"))
+GEN_QUEUE_DEPTH = REGISTRY.add(Gauge("bot_gen_queue_depth", "Запросов ждёт генерации"))
+WEBHOOK_QUEUE_DEPTH = REGISTRY.add(Gauge("bot_webhook_queue_depth", "Апдейтов ждёт обработки"))
+IS_LEADER = REGISTRY.add(Gauge("bot_is_leader", "1, если процесс ведёт напоминания"))
+
+
+# -------------------------------
+# SQL
+# -------------------------------
+_SQL_TABLE = re.compile(r"\b(?:FROM|INTO|UPDATE|TABLE|ON)\s+([A-Za-z_][A-Za-z0-9_]*)", re.IGNORECASE)
+
+
+@lru_cache(maxsize=512)
+def sql_labels(sql: str) -> tuple[str, str]:
+    """('select', 'tasks') по тексту запроса; тексты в коде статичны, поэтому кэш."""
+    words = sql.split(None, 1)
+    op = words[0].lower() if words else ""
+    m = _SQL_TABLE.search(sql)
+    return op, m.group(1) if m else ""
+
+
+class TimedConnection:
+    """Обёртка соединения aiosqlite: время execute/executemany в bot_db_query_seconds."""
+
+    def __init__(self, conn):
+        self._conn = conn
+
+    async def execute(self, sql: str, parameters=None):
+        t0 = time.perf_counter()
+        try:
+            return await self._conn.execute(sql, parameters)
+        finally:
+            op, table = sql_labels(sql)
+            DB_QUERY_SECONDS.observe(time.perf_counter() - t0, op=op, table=table)
+
+    async def executemany(self, sql: str, parameters):
+        t0 = time.perf_counter()
+        try:
+            return await self._conn.executemany(sql, parameters)
+        finally:
+            op, table = sql_labels(sql)
+            DB_QUERY_SECONDS.observe(time.perf_counter() - t0, op=op, table=table)
+
+    def __getattr__(self, name):
+        return getattr(self._conn, name)
+
+
+# -------------------------------
+# Хендлеры
+# -------------------------------
+def _prefix(event: TelegramObject) -> str:
+    if isinstance(event, CallbackQuery):
+        data = event.data or ""
+        head, sep, _ = data.partition(":")
+        return head + sep
+    if isinstance(event, Message):
+        if event.text and event.text.startswith("/"):
+            return event.text.split(None, 1)[0].split("@", 1)[0]
+        return "document" if event.document else "text"
+    return type(event).__name__
+
+
+class HandlerMetrics(BaseMiddleware):
+    """Внутренний middleware: срабатывает, когда хендлер уже выбран фильтрами."""
+
+    async def __call__(self, handler: Callable[[TelegramObject, dict], Awaitable[Any]],
+                       event: TelegramObject, data: dict) -> Any:
+        obj = data.get("handler")
+        callback = getattr(obj, "callback", None)
+        module = getattr(callback, "__module__", "") or ""
+        labels = {
+            "router": module.rsplit(".", 1)[-1],
+            "handler": getattr(callback, "__name__", "?"),
+            "prefix": _prefix(event),
+        }
+        t0 = time.perf_counter()
+        try:
+            return await handler(event, data)
+        except Exception:
+            HANDLER_ERRORS.inc(**labels)
+            raise
+        finally:
+            HANDLER_SECONDS.observe(time.perf_counter() - t0, **labels)
+
+
+def install(dp) -> None:
+    middleware = HandlerMetrics()
+    dp.message.middleware(middleware)
+    dp.callback_query.middleware(middleware)
+
+
+# -------------------------------
+# HTTP
+# -------------------------------
+async def _handle(request: web.Request) -> web.Response:
+    return web.Response(text=REGISTRY.render(), content_type="text/plain", charset="utf-8",
+                        headers={"X-Content-Type-Options": "nosniff"})
+
+
+async def start_server(port: int = METRICS_PORT, host: str = METRICS_HOST) -> web.AppRunner | None:
+    """Поднимает /metrics; port=0 — выключено."""
+    if not port:
+        return None
+    app = web.Application()
+    app.router.add_get("/metrics", _handle)
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    await web.TCPSite(runner, host, port).start()
+    return runner
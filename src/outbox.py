@@ -0,0 +1,213 @@
+# -*- coding: utf-8 -*-
+"""
+Единый слой исходящих запросов к Telegram.
+
+Подключается к сессии бота как request-middleware, поэтому через него проходят
+все msg.answer / edit_text / answer_document / BOT.send_message — и из хендлеров,
+и из scheduler_jobs. Запросы с chat_id ставятся в очередь с приоритетами и
+отправляются ограниченным числом воркеров с учётом лимитов Telegram:
+глобального (~30 сообщений/с) и на чат (1/с в личку, 20/мин в группу).
+"""
+import asyncio
+import contextvars
+import heapq
+import itertools
+from contextlib import contextmanager
+
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware
+from aiogram.exceptions import TelegramRetryAfter, TelegramNetworkError, TelegramServerError
+
+from config import (
+    OUTBOX_GLOBAL_RATE, OUTBOX_CHAT_RATE, OUTBOX_CHAT_BURST,
+    OUTBOX_GROUP_RATE, OUTBOX_GROUP_BURST, OUTBOX_WORKERS, OUTBOX_MAX_RETRIES,
+)
+from ratelimit import TokenBucket
+from metrics import OUTBOUND
+
+# приоритеты (меньше — раньше)
+PRIORITY_INTERACTIVE = 0   # ответы пользователю
+PRIORITY_BULK = 10         # напоминания и прочие рассылки
+
+_LANE = contextvars.ContextVar("outbox_lane", default=PRIORITY_INTERACTIVE)
+
+_MAX_BUCKETS = 10_000
+
+
+@contextmanager
+def lane(priority: int):
+    """with lane(PRIORITY_BULK): await bot.send_message(...) — отправка в нужной полосе."""
+    token = _LANE.set(priority)
+    try:
+        yield
+    finally:
+        _LANE.reset(token)
+
+
+class _Item:
+    __slots__ = ("priority", "seq", "chat_id", "make_request", "bot", "method", "future", "attempts", "released")
+
+    def __init__(self, priority, seq, chat_id, make_request, bot, method, future):
+        self.priority = priority
+        self.seq = seq
+        self.chat_id = chat_id
+        self.make_request = make_request
+        self.bot = bot
+        self.method = method
+        self.future = future
+        self.attempts = 0
+        self.released = False
+
+    def __lt__(self, other: "_Item") -> bool:
+        return (self.priority, self.seq) < (other.priority, other.seq)
+
+
+class Outbox(BaseRequestMiddleware):
+    def __init__(self, workers: int = OUTBOX_WORKERS):
+        self.workers_count = max(1, workers)
+        self._queue: asyncio.PriorityQueue | None = None
+        self._workers: list[asyncio.Task] = []
+        self._seq = itertools.count()
+        self._global = TokenBucket(OUTBOX_GLOBAL_RATE, OUTBOX_GLOBAL_RATE)
+        self._buckets: dict = {}
+        # чаты, упёршиеся в свой лимит: chat_id -> heap отложенных запросов
+        self._parked: dict = {}
+        self._wakeups: set = set()
+        self.stats = {"sent": 0, "retried": 0, "failed": 0}
+
+    # ---------- жизненный цикл ----------
+    def start(self) -> None:
+        if self._workers:
+            return
+        self._queue = asyncio.PriorityQueue()
+        self._workers = [asyncio.create_task(self._worker()) for _ in range(self.workers_count)]
+
+    async def stop(self) -> None:
+        for t in self._workers:
+            t.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+
+    def set_global_rate(self, rate: float) -> None:
+        """Доля общего лимита бота для этого процесса (при нескольких процессах)."""
+        self._global = TokenBucket(rate, max(1.0, rate))
+
+    def depth(self) -> int:
+        """Сколько запросов ждёт отправки (в очереди и отложенных по лимиту чата)."""
+        queued = self._queue.qsize() if self._queue else 0
+        return queued + sum(len(h) for h in self._parked.values())
+
+    # ---------- middleware ----------
+    async def __call__(self, make_request, bot, method):
+        chat_id = getattr(method, "chat_id", None)
+        if chat_id is None or not self._workers:
+            # getUpdates, answerCallbackQuery и т.п. — напрямую
+            try:
+                result = await make_request(bot, method)
+            except Exception:
+                OUTBOUND.inc(method=type(method).__name__, status="failed")
+                raise
+            OUTBOUND.inc(method=type(method).__name__, status="sent")
+            return result
+        future = asyncio.get_running_loop().create_future()
+        self._queue.put_nowait(_Item(_LANE.get(), next(self._seq), chat_id, make_request, bot, method, future))
+        return await future
+
+    # ---------- лимиты ----------
+    def _bucket(self, chat_id) -> TokenBucket:
+        b = self._buckets.get(chat_id)
+        if b is None:
+            if len(self._buckets) >= _MAX_BUCKETS:
+                self._prune_buckets()
+            if isinstance(chat_id, int) and chat_id > 0:
+                b = TokenBucket(OUTBOX_CHAT_RATE, OUTBOX_CHAT_BURST)
+            else:
+                b = TokenBucket(OUTBOX_GROUP_RATE, OUTBOX_GROUP_BURST)
+            self._buckets[chat_id] = b
+        return b
+
+    def _prune_buckets(self) -> None:
+        for chat_id in [c for c, b in self._buckets.items() if c not in self._parked and b.is_full()]:
+            del self._buckets[chat_id]
+
+    def _park(self, item: _Item, delay: float) -> None:
+        item.released = False
+        heapq.heappush(self._parked.setdefault(item.chat_id, []), item)
+        self._schedule_wakeup(item.chat_id, delay)
+
+    def _schedule_wakeup(self, chat_id, delay: float) -> None:
+        if chat_id not in self._wakeups:
+            self._wakeups.add(chat_id)
+            asyncio.get_running_loop().call_later(delay, self._wake, chat_id)
+
+    def _wake(self, chat_id) -> None:
+        self._wakeups.discard(chat_id)
+        heap = self._parked.get(chat_id)
+        if not heap:
+            return
+        item = heapq.heappop(heap)
+        if not heap:
+            del self._parked[chat_id]
+        item.released = True
+        self._queue.put_nowait(item)
+
+    # ---------- отправка ----------
+    async def _worker(self) -> None:
+        while True:
+            item = await self._queue.get()
+            chat_id = item.chat_id
+            if item.future.done():
+                # запрос отменили, пока он ждал; не теряем очередь чата
+                if item.released and chat_id in self._parked:
+                    self._schedule_wakeup(chat_id, self._bucket(chat_id).delay())
+                continue
+            if not item.released and chat_id in self._parked:
+                # у чата уже есть очередь ожидания — встаём в неё, чтобы не обгонять
+                heapq.heappush(self._parked[chat_id], item)
+                continue
+            bucket = self._bucket(chat_id)
+            wait = bucket.delay()
+            if wait > 0:
+                self._park(item, wait)
+                continue
+            while (wait := self._global.delay()) > 0:
+                await asyncio.sleep(wait)
+            bucket.take()
+            self._global.take()
+            item.released = False
+            await self._send(item, bucket)
+            if chat_id in self._parked:
+                self._schedule_wakeup(chat_id, bucket.delay())
+
+    async def _send(self, item: _Item, bucket: TokenBucket) -> None:
+        try:
+            result = await item.make_request(item.bot, item.method)
+        except TelegramRetryAfter as e:
+            OUTBOUND.inc(method=type(item.method).__name__, status="retry_after")
+            bucket.penalize(e.retry_after)
+            self._retry(item, e, e.retry_after)
+        except (TelegramNetworkError, TelegramServerError) as e:
+            OUTBOUND.inc(method=type(item.method).__name__, status="network_error")
+            self._retry(item, e, min(2 ** item.attempts, 30))
+        except Exception as e:
+            OUTBOUND.inc(method=type(item.method).__name__, status="failed")
+            self.stats["failed"] += 1
+            if not item.future.done():
+                item.future.set_exception(e)
+        else:
+            OUTBOUND.inc(method=type(item.method).__name__, status="sent")
+            self.stats["sent"] += 1
+            if not item.future.done():
+                item.future.set_result(result)
+
+    def _retry(self, item: _Item, exc: Exception, delay: float) -> None:
+        item.attempts += 1
+        if item.attempts > OUTBOX_MAX_RETRIES:
+            self.stats["failed"] += 1
+            if not item.future.done():
+                item.future.set_exception(exc)
+            return
+        self.stats["retried"] += 1
+        self._park(item, delay)
+
+
+OUTBOX = Outbox()
@@ -0,0 +1,47 @@
+# -*- coding: utf-8 -*-
+import time
+
+
+class TokenBucket:
+    """
+    Классический token bucket: rate токенов в секунду, не больше burst в запасе.
+    Не блокирует — только считает, сколько ждать до следующего токена.
+    """
+
+    __slots__ = ("rate", "burst", "tokens", "updated")
+
+    def __init__(self, rate: float, burst: float):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+
+    def _refill(self, now: float) -> None:
+        if now > self.updated:
+            self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+
+    def delay(self, cost: float = 1.0) -> float:
+        """Сколько секунд ждать, пока в корзине наберётся cost токенов (0 — можно сейчас)."""
+        now = time.monotonic()
+        self._refill(now)
+        if self.tokens >= cost:
+            return 0.0
+        return (cost - self.tokens) / self.rate
+
+    def take(self, cost: float = 1.0) -> bool:
+        """Забрать cost токенов, если они есть."""
+        if self.delay(cost) > 0:
+            return False
+        self.tokens -= cost
+        return True
+
+    def penalize(self, seconds: float) -> None:
+        """Опустошить корзину так, чтобы следующий токен появился через seconds (для RetryAfter)."""
+        now = time.monotonic()
+        self._refill(now)
+        self.tokens = min(self.tokens, 1.0 - seconds * self.rate)
+
+    def is_full(self) -> bool:
+        self._refill(time.monotonic())
+        return self.tokens >= self.burst
@@ -0,0 +1,262 @@
+# -*- coding: utf-8 -*-
+"""
+Движок напоминаний на одном таймере.
+
+Вместо отдельной APScheduler-джобы на каждое напоминание держим в памяти только
+ближайшее окно строк из `jobs` (не больше REMINDER_BATCH) в куче по времени,
+спим до ближайшей и подгружаем окно заново по индексу на jobs.run_at_ts.
+Перед отправкой строка атомарно помечается доставленной — даже если окно
+прочитали дважды, напоминание уйдёт один раз.
+
+notify() будит движок только в своём процессе. Задания, добавленные в других
+процессах (webhook-воркеры), движок замечает по счётчику cache_versions.jobs
+(его увеличивает триггер на вставку в jobs), сверяясь с ним раз в REMINDER_POLL_S.
+
+Напоминания, время которых прошло, пока бот не работал, при старте досылаются
+отдельно (claim_missed/deliver_missed): по одному на задание — самое позднее
+из пропущенных, пачками по REMINDER_CATCHUP_BATCH.
+"""
+import asyncio
+import heapq
+import time
+from typing import Awaitable, Callable
+
+from config import (
+    REMINDER_LOOKAHEAD_S, REMINDER_BATCH, REMINDER_GRACE_S, REMINDER_POLL_S,
+    REMINDER_CATCHUP_BATCH, REMINDER_CATCHUP_PAUSE_S, REMINDER_CATCHUP_MAX_AGE_S,
+)
+from db import fetchone, fetchall, db_read, db_write
+from metrics import REMINDER_LAG_SECONDS, REMINDERS
+
+
+class ReminderEngine:
+    def __init__(self, on_due: Callable[[int, str], Awaitable[bool]],
+                 lookahead: float = REMINDER_LOOKAHEAD_S, batch: int = REMINDER_BATCH,
+                 grace: float = REMINDER_GRACE_S, poll: float = REMINDER_POLL_S):
+        """on_due(task_id, kind) -> True, если напоминание доставлено."""
+        self.on_due = on_due
+        self.lookahead = int(lookahead)
+        self.batch = batch
+        self.grace = int(grace)
+        self.poll = min(poll, max(1, self.grace))   # иначе чужая вставка может выйти за окно опоздания
+        self._version = None    # cache_versions.jobs на момент последней подгрузки окна
+        self._polled_at = 0.0
+        self._heap: list = []   # (run_at_ts, job_id, task_id, kind)
+        self._loaded_until = 0
+        self._cursor = None     # (run_at_ts, id) последней строки окна, обрезанного лимитом
+        self._dirty = True
+        self._wake = asyncio.Event()
+        self._task: asyncio.Task | None = None
+        self._firing: set = set()
+        self._inflight: set = set()   # job_id, которые сейчас отправляются
+        self._catchup: asyncio.Task | None = None
+
+    # ---------- жизненный цикл ----------
+    def start(self) -> None:
+        if self._task is None:
+            self._dirty = True
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._catchup is not None:
+            self._catchup.cancel()
+            await asyncio.gather(self._catchup, return_exceptions=True)
+            self._catchup = None
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, *self._firing, return_exceptions=True)
+            self._task = None
+        self._heap.clear()
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None
+
+    def pending(self) -> int:
+        """Размер окна в памяти."""
+        return len(self._heap)
+
+    def notify(self, run_at: int | None = None) -> None:
+        """В jobs появились новые строки; перечитываем окно, если они в него попадают."""
+        if run_at is None or run_at <= self._loaded_until:
+            self._dirty = True
+            self._wake.set()
+
+    # ---------- пропущенное за время простоя ----------
+    async def claim_missed(self, now: int | None = None) -> list[tuple]:
+        """
+        Забирает все недоставленные строки с run_at_ts <= now одной транзакцией
+        и возвращает по одной на задание — самую позднюю: [(job_id, task_id, kind, run_at, missed)].
+        Вызывать до start(): после неё окну движка прошлые строки уже не достанутся.
+        """
+        now = int(time.time()) if now is None else now
+        async with db_write() as db:
+            # у MAX() в SQLite «голые» колонки берутся из строки с максимумом
+            rows = await fetchall(
+                db,
+                """SELECT id, task_id, kind, MAX(run_at_ts) AS run_at_ts, COUNT(*) AS missed FROM jobs
+                   WHERE delivered_ts IS NULL AND run_at_ts <= ?
+                   GROUP BY task_id ORDER BY run_at_ts""",
+                (now,)
+            )
+            if rows:
+                await db.execute(
+                    "UPDATE jobs SET delivered_ts = ? WHERE delivered_ts IS NULL AND run_at_ts <= ?", (now, now)
+                )
+        return [(r["id"], r["task_id"], r["kind"], r["run_at_ts"], r["missed"]) for r in rows]
+
+    def deliver_missed(self, missed: list[tuple]) -> None:
+        """Досылает забранное claim_missed в фоне; остановка движка прерывает досылку."""
+        if missed and self._catchup is None:
+            self._catchup = asyncio.create_task(self._deliver_missed(missed))
+
+    async def _deliver_missed(self, missed: list[tuple]) -> None:
+        now = int(time.time())
+        fresh = [m for m in missed if now - m[3] <= REMINDER_CATCHUP_MAX_AGE_S]
+        stale = len(missed) - len(fresh)
+        if stale:
+            REMINDERS.inc(stale, status="expired")
+        print(f"Досылка пропущенных напоминаний: заданий {len(fresh)}, устаревших {stale}, "
+              f"строк {sum(m[4] for m in missed)}")
+        retry: list[int] = []
+        pos = 0
+        try:
+            while pos < len(fresh):
+                batch = fresh[pos:pos + REMINDER_CATCHUP_BATCH]
+                results = await asyncio.gather(
+                    *(self._fire_missed(task_id, kind, run_at, n) for _, task_id, kind, run_at, n in batch)
+                )
+                retry.extend(m[0] for m, ok in zip(batch, results) if not ok)
+                pos += len(batch)
+                if pos < len(fresh):
+                    await asyncio.sleep(REMINDER_CATCHUP_PAUSE_S)
+        finally:
+            # недосланное (ошибка или остановка) снова помечаем недоставленным — подберёт следующий старт
+            retry.extend(m[0] for m in fresh[pos:])
+            if retry:
+                async with db_write() as db:
+                    await db.executemany("UPDATE jobs SET delivered_ts = NULL WHERE id = ?",
+                                         [(job_id,) for job_id in retry])
+            self._catchup = None
+
+    async def _fire_missed(self, task_id: int, kind: str, run_at: int, missed: int) -> bool:
+        REMINDER_LAG_SECONDS.observe(max(0.0, time.time() - run_at), kind=kind)
+        label = f"{kind}, пропущено во время перерыва" + (f": {missed}" if missed > 1 else "")
+        try:
+            delivered = await self.on_due(task_id, label)
+        except Exception as e:
+            print(f"Ошибка напоминания task={task_id} {kind}: {e}")
+            delivered = False
+        REMINDERS.inc(status="caught_up" if delivered else "failed")
+        return delivered
+
+    # ---------- основной цикл ----------
+    async def _refill(self, now: int, resume: bool = False) -> None:
+        """
+        Читает окно по (run_at_ts, id). resume — продолжить сразу после прошлого окна,
+        обрезанного лимитом: строк с одинаковым run_at_ts может быть больше REMINDER_BATCH.
+        """
+        horizon = now + self.lookahead
+        after = self._cursor if resume and self._cursor else (now - self.grace, 0)
+        async with db_read() as db:
+            # версию читаем до строк: вставка между ними перечитает окно ещё раз, а не потеряется
+            self._version = await self._read_version(db)
+            self._polled_at = time.monotonic()
+            rows = await fetchall(
+                db,
+                """SELECT id, task_id, kind, run_at_ts FROM jobs
+                   WHERE delivered_ts IS NULL AND run_at_ts > ? AND (run_at_ts, id) > (?, ?)
+                     AND run_at_ts <= ?
+                   ORDER BY run_at_ts, id LIMIT ?""",
+                (now - self.grace, *after, horizon, self.batch)
+            )
+        # строки, которые ещё отправляются, повторно не запускаем
+        heap = [(r["run_at_ts"], r["id"], r["task_id"], r["kind"]) for r in rows if r["id"] not in self._inflight]
+        heapq.heapify(heap)
+        self._heap = heap
+        # если окно обрезано лимитом — следующая подгрузка продолжит после последней строки
+        if len(rows) == self.batch:
+            last = rows[-1]
+            self._cursor = (last["run_at_ts"], last["id"])
+            self._loaded_until = last["run_at_ts"]
+        else:
+            self._cursor = None
+            self._loaded_until = horizon
+
+    @staticmethod
+    async def _read_version(db):
+        row = await fetchone(db, "SELECT version FROM cache_versions WHERE name = 'jobs'")
+        return row["version"] if row else None
+
+    async def _poll(self) -> None:
+        """Напоминания, вставленные другими процессами: их notify() сюда не доходит."""
+        self._polled_at = time.monotonic()   # и при ошибке следующая попытка — через poll
+        async with db_read() as db:
+            version = await self._read_version(db)
+        if version != self._version:
+            self._dirty = True
+
+    async def _run(self) -> None:
+        while True:
+            now = int(time.time())
+            # сбрасываем до чтения окна, чтобы notify() во время загрузки не потерялся
+            self._wake.clear()
+            if not self._dirty and time.monotonic() - self._polled_at >= self.poll:
+                try:
+                    await self._poll()
+                except Exception as e:
+                    print(f"Ошибка проверки новых напоминаний: {e}")
+            if self._dirty or now >= self._loaded_until:
+                resume = not self._dirty
+                self._dirty = False
+                try:
+                    await self._refill(now, resume)
+                except Exception as e:
+                    print(f"Ошибка загрузки напоминаний: {e}")
+                    self._dirty = True
+                    await asyncio.sleep(5)
+                    continue
+
+            while self._heap and self._heap[0][0] <= now:
+                run_at, job_id, task_id, kind = heapq.heappop(self._heap)
+                self._inflight.add(job_id)
+                t = asyncio.create_task(self._fire(job_id, task_id, kind, run_at))
+                self._firing.add(t)
+                t.add_done_callback(self._firing.discard)
+
+            next_at = self._heap[0][0] if self._heap else self._loaded_until
+            timeout = max(0.0, min(min(next_at, self._loaded_until) - time.time(),
+                                   self._polled_at + self.poll - time.monotonic()))
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+
+    async def _fire(self, job_id: int, task_id: int, kind: str, run_at: int) -> None:
+        try:
+            await self._deliver(job_id, task_id, kind, run_at)
+        finally:
+            self._inflight.discard(job_id)
+
+    async def _deliver(self, job_id: int, task_id: int, kind: str, run_at: int) -> None:
+        # атомарно забираем строку: отправит только тот, кто её пометил
+        async with db_write() as db:
+            cur = await db.execute(
+                "UPDATE jobs SET delivered_ts = ? WHERE id = ? AND delivered_ts IS NULL",
+                (int(time.time()), job_id)
+            )
+            claimed = cur.rowcount == 1
+        if not claimed:
+            REMINDERS.inc(status="skipped")
+            return
+        REMINDER_LAG_SECONDS.observe(max(0.0, time.time() - run_at), kind=kind)
+        try:
+            delivered = await self.on_due(task_id, kind)
+        except Exception as e:
+            print(f"Ошибка напоминания task={task_id} {kind}: {e}")
+            delivered = False
+        REMINDERS.inc(status="delivered" if delivered else "failed")
+        if not delivered:
+            # снимаем отметку: строка остаётся недоставленной, а не «отправленной»
+            async with db_write() as db:
+                await db.execute("UPDATE jobs SET delivered_ts = NULL WHERE id = ?", (job_id,))
@@ -0,0 +1,89 @@
+# -*- coding: utf-8 -*-
+"""
+Периодическая очистка: задания с дедлайном старше RETENTION_HOURS переносятся
+в tasks_archive (или удаляются при RETENTION_MODE=delete) небольшими пачками,
+вместе с их напоминаниями из jobs. После чистки — PRAGMA incremental_vacuum.
+"""
+import asyncio
+import time
+
+from config import RETENTION_HOURS, RETENTION_BATCH, RETENTION_MODE, RETENTION_VACUUM_PAGES
+from db import fetchone, fetchall, db_write
+
+
+async def _archive_batch(cutoff_ts: int, now_ts: int) -> int:
+    """Одна пачка в своей транзакции, чтобы не держать писателя долго."""
+    async with db_write() as db:
+        rows = await fetchall(
+            db, "SELECT id FROM tasks WHERE due_ts <= ? ORDER BY due_ts LIMIT ?", (cutoff_ts, RETENTION_BATCH)
+        )
+        if not rows:
+            return 0
+        ids = [(r["id"],) for r in rows]
+        if RETENTION_MODE == "archive":
+            await db.executemany(
+                """INSERT OR REPLACE INTO tasks_archive(id, class_id, title, description, due_ts, created_ts, archived_ts)
+                   SELECT id, class_id, title, description, due_ts, created_ts, ? FROM tasks WHERE id = ?""",
+                [(now_ts, i) for (i,) in ids]
+            )
+        await db.executemany("DELETE FROM jobs WHERE task_id = ?", ids)
+        await db.executemany("DELETE FROM tasks WHERE id = ?", ids)
+    return len(ids)
+
+
+async def _delete_orphan_jobs() -> int:
+    """Напоминания, оставшиеся от удалённых раньше заданий."""
+    async with db_write() as db:
+        cur = await db.execute(
+            """DELETE FROM jobs WHERE id IN (
+                   SELECT j.id FROM jobs j LEFT JOIN tasks t ON t.id = j.task_id
+                   WHERE t.id IS NULL LIMIT ?)""",
+            (RETENTION_BATCH,)
+        )
+        return cur.rowcount
+
+
+async def _incremental_vacuum() -> int:
+    """
+    Возвращает файлу свободные страницы порциями по RETENTION_VACUUM_PAGES.
+    Через execute() sqlite3 шагает PRAGMA без колонок один раз — освобождается
+    одна страница; executescript выполняет его до конца.
+    """
+    freed = 0
+    while True:
+        async with db_write() as db:
+            before = (await fetchone(db, "PRAGMA freelist_count"))[0]
+            if not before:
+                break
+            await db.executescript(f"PRAGMA incremental_vacuum({RETENTION_VACUUM_PAGES});")
+            after = (await fetchone(db, "PRAGMA freelist_count"))[0]
+        freed += before - after
+        if not after or after >= before:
+            break
+        await asyncio.sleep(0)  # отдаём писателя хендлерам между порциями
+    return freed
+
+
+async def retention_job():
+    now_ts = int(time.time())
+    cutoff_ts = now_ts - RETENTION_HOURS * 3600
+    moved = 0
+    while True:
+        n = await _archive_batch(cutoff_ts, now_ts)
+        moved += n
+        if n < RETENTION_BATCH:
+            break
+        await asyncio.sleep(0)  # отдаём писателя хендлерам между пачками
+
+    orphans = 0
+    while True:
+        n = await _delete_orphan_jobs()
+        orphans += n
+        if n < RETENTION_BATCH:
+            break
+        await asyncio.sleep(0)
+
+    if moved or orphans:
+        pages = await _incremental_vacuum()
+        print(f"Очистка: заданий {'в архив' if RETENTION_MODE == 'archive' else 'удалено'}: {moved}, "
+              f"осиротевших напоминаний удалено: {orphans}, страниц возвращено: {pages}")
@@ -1,15 +1,18 @@
 # -*- coding: utf-8 -*-
-from datetime import datetime, timezone
+import time
 from zoneinfo import ZoneInfo
 
-import aiosqlite
 from apscheduler.schedulers.asyncio import AsyncIOScheduler
 from aiogram import Bot
 from aiogram.enums import ParseMode
 
-from config import DB_PATH, REMINDER_OFFSETS
-from db import fetchone, fetchall
-from utils import fmt_dt_local
+from config import REMINDER_OFFSETS
+from db import fetchone, db_read, db_write
+from outbox import lane, PRIORITY_BULK
+from reminders import ReminderEngine
+from digest import ReminderDigest, digest_enabled
+from class_cache import CLASSES
+from utils import fmt_dt_local, from_ts
 
 BOT: Bot | None = None
 SCHEDULER: AsyncIOScheduler | None = None
@@ -22,85 +25,67 @@ def set_scheduler(scheduler: AsyncIOScheduler) -> None:
     global SCHEDULER
     SCHEDULER = scheduler
 
+# смещения напоминаний в секундах
+_OFFSETS_S = [(label, int(delta.total_seconds())) for label, delta in REMINDER_OFFSETS]
+
+def reminder_rows(task_id: int, due_ts: int, now_ts: int) -> list[tuple]:
+    """Строки jobs для задачи: только напоминания, которые ещё впереди."""
+    return [(task_id, due_ts - offset, label) for label, offset in _OFFSETS_S if due_ts - offset > now_ts]
+
+async def insert_task_jobs(db, tasks: list[tuple[int, int]]) -> int | None:
+    """
+    Вставляет напоминания для пачки задач [(task_id, due_ts), ...] одним executemany
+    в транзакции вызывающего. Возвращает время самого раннего напоминания (для ENGINE.notify).
+    """
+    now_ts = int(time.time())
+    rows = [r for task_id, due_ts in tasks for r in reminder_rows(task_id, due_ts, now_ts)]
+    if not rows:
+        return None
+    await db.executemany(
+        "INSERT OR IGNORE INTO jobs(task_id, run_at_ts, kind) VALUES (?, ?, ?)", rows
+    )
+    return min(r[1] for r in rows)
+
 async def schedule_task_jobs(task_id: int):
-    if SCHEDULER is None:
-        return
-    async with aiosqlite.connect(DB_PATH) as db:
-        db.row_factory = aiosqlite.Row
+    async with db_write() as db:
         task = await fetchone(db, "SELECT * FROM tasks WHERE id = ?", (task_id,))
-        if not task:
-            return
-        class_row = await fetchone(db, "SELECT * FROM classes WHERE id = ?", (task["class_id"],))
-        if not class_row:
+        if not task or not await CLASSES.get(task["class_id"]):
             return
+        earliest = await insert_task_jobs(db, [(task_id, task["due_ts"])])
 
-        due_utc = datetime.fromisoformat(task["due_utc"]).replace(tzinfo=timezone.utc)
-        for label, delta in REMINDER_OFFSETS:
-            run_at_utc = due_utc - delta
-            if run_at_utc <= datetime.now(timezone.utc):
-                continue
-
-            exists = await fetchone(
-                db, "SELECT 1 FROM jobs WHERE task_id=? AND run_at_utc=? AND kind=?",
-                (task_id, run_at_utc.isoformat(), label)
-            )
-            if exists:
-                continue
-
-            await db.execute(
-                "INSERT OR IGNORE INTO jobs(task_id, run_at_utc, kind) VALUES (?, ?, ?)",
-                (task_id, run_at_utc.isoformat(), label)
-            )
-            await db.commit()
-
-            SCHEDULER.add_job(
-                send_reminder_job,
-                "date",
-                run_date=run_at_utc,
-                args=[task_id, label],
-                id=f"task{task_id}_{label}_{int(run_at_utc.timestamp())}",
-                misfire_grace_time=60
-            )
+    if earliest is not None:
+        ENGINE.notify(earliest)
 
 async def rehydrate_jobs():
-    if SCHEDULER is None:
-        return
-    now_iso = datetime.now(timezone.utc).isoformat()
-    async with aiosqlite.connect(DB_PATH) as db:
-        db.row_factory = aiosqlite.Row
-        rows = await fetchall(db, "SELECT task_id, run_at_utc, kind FROM jobs WHERE run_at_utc > ?", (now_iso,))
-    for r in rows:
-        run_at_utc = datetime.fromisoformat(r["run_at_utc"]).replace(tzinfo=timezone.utc)
-        SCHEDULER.add_job(
-            send_reminder_job,
-            "date",
-            run_date=run_at_utc,
-            args=[r["task_id"], r["kind"]],
-            id=f"rehydrated_task{r['task_id']}_{r['kind']}_{int(run_at_utc.timestamp())}",
-            misfire_grace_time=60
-        )
-
-async def send_reminder_job(task_id: int, when_label: str):
+    """
+    Запуск движка напоминаний. В память ничего не грузится заранее —
+    движок сам читает ближайшее окно из jobs, поэтому старт не зависит от объёма таблицы.
+    Пропущенное за время простоя забираем до старта движка и досылаем в фоне.
+    """
+    missed = await ENGINE.claim_missed()
+    ENGINE.start()
+    ENGINE.deliver_missed(missed)
+
+async def send_reminder_job(task_id: int, when_label: str) -> bool:
     """
     Напоминание по задаче.
     В НОВОЙ СХЕМЕ БД нет таблицы students и нет chat_id у пользователей,
     поэтому шлём уведомление только владельцу класса (owner_chat_id).
+    Возвращает False, если отправить не удалось.
     """
     if BOT is None:
-        return
-    async with aiosqlite.connect(DB_PATH) as db:
-        db.row_factory = aiosqlite.Row
+        return False
+    async with db_read() as db:
         task = await fetchone(db, "SELECT * FROM tasks WHERE id = ?", (task_id,))
-        if not task:
-            return
-        class_row = await fetchone(db, "SELECT * FROM classes WHERE id = ?", (task["class_id"],))
-        if not class_row:
-            return
+    if not task:
+        return True  # задачу удалили — напоминать не о чем
+    class_row = await CLASSES.get(task["class_id"])
+    if not class_row:
+        return True
 
-        tz = ZoneInfo(class_row["timezone"])
-        due_utc = datetime.fromisoformat(task["due_utc"]).replace(tzinfo=timezone.utc)
-        due_local_str = fmt_dt_local(due_utc, tz)
-        teacher_chat = class_row["owner_chat_id"]
+    tz = ZoneInfo(class_row["timezone"])
+    due_local_str = fmt_dt_local(from_ts(task["due_ts"]), tz)
+    teacher_chat = class_row["owner_chat_id"]
 
     header = (
         f"⏰ Напоминание ({when_label})\n"
@@ -116,9 +101,33 @@ async def send_reminder_job(task_id: int, when_label: str):
         "• Сдайте отчёт по формату"
     )
 
-    # Отправляем ТОЛЬКО преподавателю
+    # сводка: напоминания владельцу за окно уходят одним сообщением
+    if await digest_enabled(int(teacher_chat)):
+        return await DIGEST.add(int(teacher_chat), {
+            "class_name": class_row["name"], "title": task["title"], "due_ts": task["due_ts"],
+            "due_local": due_local_str, "tz": class_row["timezone"], "label": when_label,
+            "text": header + body,
+        })
+
+    # Отправляем ТОЛЬКО преподавателю; лимиты и RetryAfter обрабатывает outbox,
+    # напоминания идут в низкоприоритетной полосе, чтобы не тормозить ответы в чатах
     try:
-        await BOT.send_message(chat_id=int(teacher_chat), text=header + body, parse_mode=ParseMode.HTML)
-    except Exception:
-        # гасим любые ошибки отправки, чтобы планировщик не падал
-        pass
+        await _send_bulk(int(teacher_chat), header + body)
+    except Exception as e:
+        # планировщик не должен падать, но и молча терять напоминание нельзя
+        print(f"Не удалось отправить напоминание task={task_id} {when_label}: {e}")
+        return False
+    return True
+
+async def _send_bulk(chat_id: int, text: str) -> None:
+    with lane(PRIORITY_BULK):
+        await BOT.send_message(chat_id=chat_id, text=text, parse_mode=ParseMode.HTML)
+
+
+ENGINE = ReminderEngine(send_reminder_job)
+DIGEST = ReminderDigest(_send_bulk)
+
+async def stop_reminders():
+    """Остановка напоминаний (потеря аренды): движок, затем недосланные сводки."""
+    await ENGINE.stop()
+    await DIGEST.flush_all()
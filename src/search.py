@@ -0,0 +1,56 @@
+# -*- coding: utf-8 -*-
+"""
+Поиск учеников и классов по началу слов имени (FTS5: users_fts, classes_fts).
+
+Ввод «ив пет» превращается в запрос "ив"* "пет"* — все слова, каждое как
+префикс, без учёта регистра; лучшие совпадения по bm25 (rank). Индексы
+ведут триггеры на users/classes, поэтому импорт и правки видны сразу.
+"""
+import re
+
+from config import SEARCH_LIMIT
+from db import fetchall, db_read
+
+_WORD = re.compile(r"\w+")
+_MAX_WORDS = 8
+
+
+def fts_query(text: str) -> str | None:
+    """Текст пользователя -> выражение MATCH; None, если искать нечего."""
+    words = _WORD.findall(text.lower())[:_MAX_WORDS]
+    # каждое слово в кавычках — операторы FTS5 (OR, NEAR, -) из ввода не исполняются
+    return " ".join(f'"{w}"*' for w in words) or None
+
+
+async def search_students(text: str, limit: int = SEARCH_LIMIT) -> list[dict]:
+    """[{"UserID", "name", "username"}, ...] — ученики по имени или username."""
+    query = fts_query(text)
+    if query is None:
+        return []
+    async with db_read() as db:
+        rows = await fetchall(
+            db,
+            """SELECT u.UserID, u.name, u.username FROM users_fts
+                 JOIN users u ON u.UserID = users_fts.rowid
+                WHERE users_fts MATCH ? AND u.post = 'student'
+                ORDER BY users_fts.rank LIMIT ?""",
+            (query, limit)
+        )
+    return [dict(r) for r in rows]
+
+
+async def search_classes(text: str, limit: int = SEARCH_LIMIT, owner_chat_id: int | None = None) -> list[dict]:
+    """[{"id", "name", "timezone", "owner_chat_id"}, ...]; owner_chat_id — только свои классы."""
+    query = fts_query(text)
+    if query is None:
+        return []
+    async with db_read() as db:
+        rows = await fetchall(
+            db,
+            """SELECT c.id, c.name, c.timezone, c.owner_chat_id FROM classes_fts
+                 JOIN classes c ON c.id = classes_fts.rowid
+                WHERE classes_fts MATCH ? AND (? IS NULL OR c.owner_chat_id = ?)
+                ORDER BY classes_fts.rank LIMIT ?""",
+            (query, owner_chat_id, owner_chat_id, limit)
+        )
+    return [dict(r) for r in rows]
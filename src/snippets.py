@@ -0,0 +1,394 @@
+# -*- coding: utf-8 -*-
+"""
+Библиотека проверенных примеров для частых запросов /gen — без вызова модели.
+
+Большинство описаний в классах — вариации нескольких шаблонов (мигалка,
+кнопка → светодиод, ШИМ, серво, дальномер…). Для каждого шаблона есть
+готовый код и несколько формулировок-примеров. При загрузке формулировки
+превращаются в TF-IDF-векторы по символьным триграммам (устойчиво к падежам
+и опечаткам); описание пользователя сравнивается с ними по косинусу. Если
+сходство не ниже SNIPPET_THRESHOLD, отвечаем примером, подставив номера
+пинов из описания в константы (LED_PIN = 2 → LED_PIN = 12), иначе — модель.
+
+Подставляются только пины. Если в описании есть другие числа («на 10 секунд»,
+«раз в 3 секунды»), пример их бы молча заменил своими — такие описания
+отдаём модели. Номера в названиях модулей (DHT11, SG90, HC-SR04) не считаются.
+Пины 34–39 у ESP32 только на вход и без подтяжки — их принимают лишь
+константы из "inputs" примера.
+"""
+import math
+import re
+from collections import Counter
+
+from config import SNIPPET_THRESHOLD, SNIPPET_MARGIN
+
+# -------------------------------
+# Примеры
+# -------------------------------
+# slots: константа пина -> слова, после которых в описании идёт её номер
+# inputs: константы, которым можно отдать входные GPIO34–39
+SNIPPETS = [
+    {
+        "name": "blink",
+        "title": "Мигающий светодиод",
+        "examples": [
+            "помигать светодиодом", "мигающий светодиод на GPIO2", "blink led", "мигание светодиода",
+            "мигалка LED каждые полсекунды", "светодиод мигает раз в секунду",
+        ],
+        "slots": {"LED_PIN": ("led", "светодиод", "диод", "лампоч")},
+        "code": '''\
+from machine import Pin
+import time
+
+LED_PIN = 2          # встроенный светодиод большинства плат ESP32
+BLINK_S = 0.5        # полупериод мигания, секунды
+
+led = Pin(LED_PIN, Pin.OUT)
+
+
+def main():
+    """Мигаем светодиодом бесконечно."""
+    while True:
+        led.value(not led.value())
+        time.sleep(BLINK_S)
+
+
+main()
+
+# Проверка: светодиод на LED_PIN мигает раз в секунду; скорость — BLINK_S.
+''',
+    },
+    {
+        "name": "button_led",
+        "title": "Кнопка включает светодиод",
+        "examples": [
+            "кнопка включает светодиод", "Кнопка на GPIO12 включает LED на GPIO2 на 3 секунды",
+            "при нажатии кнопки загорается светодиод", "button turns on led",
+            "светодиод горит после нажатия кнопки",
+        ],
+        "slots": {
+            "BUTTON_PIN": ("кноп", "button", "btn"),
+            "LED_PIN": ("led", "светодиод", "диод", "лампоч"),
+        },
+        "code": '''\
+from machine import Pin
+import time
+
+BUTTON_PIN = 12      # кнопка между пином и GND
+LED_PIN = 2
+HOLD_S = 3           # сколько секунд светить после нажатия
+
+button = Pin(BUTTON_PIN, Pin.IN, Pin.PULL_UP)
+led = Pin(LED_PIN, Pin.OUT)
+
+
+def main():
+    """Нажатие кнопки включает светодиод на HOLD_S секунд."""
+    while True:
+        if button.value() == 0:      # PULL_UP: нажата = 0
+            led.on()
+            time.sleep(HOLD_S)
+            led.off()
+        time.sleep_ms(20)            # простое подавление дребезга
+
+
+main()
+
+# Проверка: нажмите кнопку — светодиод горит HOLD_S секунд и гаснет.
+''',
+    },
+    {
+        "name": "pwm_fade",
+        "title": "Плавная яркость светодиода (ШИМ)",
+        "examples": [
+            "плавное включение и выключение светодиода", "ШИМ плавно меняет яркость светодиода",
+            "pwm fade led", "дыхание светодиода яркость", "плавное мигание LED через PWM",
+        ],
+        "slots": {"LED_PIN": ("led", "светодиод", "диод", "лампоч", "шим", "pwm")},
+        "code": '''\
+from machine import Pin, PWM
+import time
+
+LED_PIN = 2
+FREQ_HZ = 1000       # частота ШИМ
+STEP_MS = 10         # пауза между шагами яркости
+
+pwm = PWM(Pin(LED_PIN), freq=FREQ_HZ)
+
+
+def main():
+    """Плавно зажигаем и гасим светодиод (duty 0..1023)."""
+    while True:
+        for duty in range(0, 1024, 8):
+            pwm.duty(duty)
+            time.sleep_ms(STEP_MS)
+        for duty in range(1023, -1, -8):
+            pwm.duty(duty)
+            time.sleep_ms(STEP_MS)
+
+
+try:
+    main()
+finally:
+    pwm.deinit()
+
+# Проверка: яркость плавно растёт и падает; скорость — STEP_MS.
+''',
+    },
+    {
+        "name": "servo",
+        "title": "Сервопривод",
+        "examples": [
+            "поворот сервопривода", "сервопривод на GPIO13 поворачивается на 0 90 180 градусов",
+            "servo sweep", "управление сервомотором sg90", "серво крутится туда-сюда", "сервопривод крутится",
+        ],
+        "slots": {"SERVO_PIN": ("серв", "servo", "sg90", "мотор")},
+        "code": '''\
+from machine import Pin, PWM
+import time
+
+SERVO_PIN = 13
+MIN_DUTY = 26        # ~0.5 мс — 0°
+MAX_DUTY = 128       # ~2.5 мс — 180°
+
+servo = PWM(Pin(SERVO_PIN), freq=50)
+
+
+def set_angle(angle):
+    """Поворот сервопривода на угол 0..180°."""
+    angle = max(0, min(180, angle))
+    servo.duty(MIN_DUTY + (MAX_DUTY - MIN_DUTY) * angle // 180)
+
+
+def main():
+    while True:
+        for angle in (0, 90, 180, 90):
+            set_angle(angle)
+            time.sleep(1)
+
+
+main()
+
+# Проверка: серво по очереди встаёт в 0°, 90°, 180°. Питание серво — 5 В, общий GND с платой.
+''',
+    },
+    {
+        "name": "ultrasonic",
+        "title": "Ультразвуковой дальномер HC-SR04",
+        "examples": [
+            "ультразвуковой датчик расстояния HC-SR04", "измерить расстояние ультразвуком",
+            "дальномер hc-sr04 trig echo", "ultrasonic distance sensor",
+            "датчик расстояния выводит сантиметры",
+        ],
+        "slots": {"TRIG_PIN": ("trig", "триг"), "ECHO_PIN": ("echo", "эхо")},
+        "inputs": ("ECHO_PIN",),
+        "code": '''\
+from machine import Pin, time_pulse_us
+import time
+
+TRIG_PIN = 5
+ECHO_PIN = 18        # ECHO у HC-SR04 — 5 В: подключайте через делитель до 3.3 В
+
+trig = Pin(TRIG_PIN, Pin.OUT)
+echo = Pin(ECHO_PIN, Pin.IN)
+
+
+def distance_cm():
+    """Расстояние в сантиметрах или None, если эхо не пришло."""
+    trig.off()
+    time.sleep_us(2)
+    trig.on()
+    time.sleep_us(10)
+    trig.off()
+    duration = time_pulse_us(echo, 1, 30000)   # таймаут 30 мс ≈ 5 м
+    if duration < 0:
+        return None
+    return duration / 58.0
+
+
+def main():
+    while True:
+        d = distance_cm()
+        print("Нет эха" if d is None else "Расстояние: %.1f см" % d)
+        time.sleep(0.5)
+
+
+main()
+
+# Проверка: поднесите ладонь к датчику — расстояние в консоли уменьшается.
+''',
+    },
+    {
+        "name": "adc_pot",
+        "title": "Потенциометр / аналоговый вход (АЦП)",
+        "examples": [
+            "считать значение потенциометра", "АЦП читает напряжение с потенциометра",
+            "analog read potentiometer adc", "вывести показания аналогового датчика",
+        ],
+        "slots": {"POT_PIN": ("потенц", "adc", "ацп", "аналог", "pot")},
+        "inputs": ("POT_PIN",),
+        "code": '''\
+from machine import Pin, ADC
+import time
+
+POT_PIN = 34         # ADC1 (GPIO32–39) работает и при включённом Wi-Fi
+
+adc = ADC(Pin(POT_PIN))
+adc.atten(ADC.ATTN_11DB)      # диапазон 0..3.3 В
+adc.width(ADC.WIDTH_12BIT)    # значения 0..4095
+
+
+def main():
+    while True:
+        raw = adc.read()
+        print("АЦП:", raw, "напряжение: %.2f В" % (raw * 3.3 / 4095))
+        time.sleep(0.5)
+
+
+main()
+
+# Проверка: крутите ручку потенциометра — значения меняются от 0 до 4095.
+''',
+    },
+    {
+        "name": "dht",
+        "title": "Датчик температуры и влажности DHT",
+        "examples": [
+            "датчик температуры и влажности DHT11", "измерить температуру dht22",
+            "temperature humidity sensor dht", "показать влажность и температуру",
+        ],
+        "slots": {"DHT_PIN": ("dht", "датчик", "темп", "влажн")},
+        "code": '''\
+from machine import Pin
+import dht
+import time
+
+DHT_PIN = 4
+
+sensor = dht.DHT11(Pin(DHT_PIN))   # для DHT22 — dht.DHT22
+
+
+def main():
+    while True:
+        try:
+            sensor.measure()
+            print("Температура: %d °C, влажность: %d %%" % (sensor.temperature(), sensor.humidity()))
+        except OSError:
+            print("Датчик не ответил")
+        time.sleep(2)                # DHT11 опрашивают не чаще раза в 1–2 секунды
+
+
+main()
+
+# Проверка: в консоли раз в 2 секунды температура и влажность.
+''',
+    },
+]
+
+# -------------------------------
+# Индекс
+# -------------------------------
+_WORD = re.compile(r"\w+")
+_DIGITS = re.compile(r"\d+")
+# число, не приклеенное к буквам: «10 секунд», «3с», «0.5» — но не «DHT11», «SG90», «SR04»
+_PARAM_NUMBER = re.compile(r"(?<![^\W_])\d")
+_INPUT_ONLY_GPIO = frozenset(range(34, 40))
+# «GPIO12», «pin 4», «пин 13», «порт 5», «D4», «на 14 пине», «2-й ножке»
+_PIN_MENTION = re.compile(
+    r"(?:gpio|pin|пин\w*|порт\w*|нож\w*|\bd)\s*[-№#:]?\s*(\d{1,2})\b"
+    r"|\b(\d{1,2})(?:-?[а-я]{1,2})?\s+(?:пин\w*|нож\w*)",
+    re.IGNORECASE
+)
+
+
+def _grams(text: str, n: int = 3) -> Counter:
+    """Символьные n-граммы по словам; упоминания пинов и числа не влияют на сходство."""
+    text = _DIGITS.sub("#", _PIN_MENTION.sub(" ", text.lower().replace("ё", "е")))
+    words = _WORD.findall(text)
+    padded = " " + " ".join(words) + " "
+    return Counter(padded[i:i + n] for i in range(len(padded) - n + 1))
+
+
+class SnippetIndex:
+    def __init__(self, snippets: list = SNIPPETS, threshold: float = SNIPPET_THRESHOLD):
+        self.snippets = snippets
+        self.threshold = threshold
+        docs = [(s, _grams(e)) for s in snippets for e in s["examples"]]
+        df = Counter(g for _, grams in docs for g in grams)
+        n = len(docs)
+        self._idf = {g: math.log((1 + n) / (1 + c)) + 1 for g, c in df.items()}
+        self._unknown_idf = math.log(1 + n) + 1   # у неизвестных n-грамм максимальный вес
+        self._docs = [(s, self._vector(grams)) for s, grams in docs]
+        self.stats = {"hits": 0, "misses": 0}
+
+    def _vector(self, grams: Counter) -> dict:
+        vec = {g: tf * self._idf.get(g, self._unknown_idf) for g, tf in grams.items()}
+        norm = math.sqrt(sum(v * v for v in vec.values())) or 1.0
+        return {g: v / norm for g, v in vec.items()}
+
+    def best(self, text: str) -> tuple[dict | None, float, float]:
+        """Самый похожий пример, его сходство (косинус, 0..1) и сходство лучшего из остальных примеров."""
+        query = self._vector(_grams(text))
+        scores: dict = {}
+        for snippet, vec in self._docs:
+            s = sum(w * vec.get(g, 0.0) for g, w in query.items())
+            if s > scores.get(snippet["name"], (None, 0.0))[1]:
+                scores[snippet["name"]] = (snippet, s)
+        ranked = sorted(scores.values(), key=lambda item: item[1], reverse=True)
+        if not ranked:
+            return None, 0.0, 0.0
+        return ranked[0][0], ranked[0][1], ranked[1][1] if len(ranked) > 1 else 0.0
+
+    def match(self, text: str) -> str | None:
+        """Готовый ответ (код в ```python``` + пояснение) или None — спрашиваем модель."""
+        snippet, score, runner_up = self.best(text)
+        # два шаблона почти одинаково похожи — описание неоднозначно, пусть решает модель
+        confident = snippet is not None and score >= self.threshold and score - runner_up >= SNIPPET_MARGIN
+        # числа сверх пинов (время, количество) пример не учтёт — отдаём модели
+        confident = confident and not _PARAM_NUMBER.search(_PIN_MENTION.sub(" ", text))
+        pins = _assign_pins(text, snippet["slots"]) if confident else None
+        if pins is not None and any(pin in _INPUT_ONLY_GPIO and const not in snippet.get("inputs", ())
+                                    for const, pin in pins.items()):
+            pins = None   # вход-только пин на месте выхода (или кнопки с подтяжкой)
+        if pins is None:
+            self.stats["misses"] += 1
+            return None
+        self.stats["hits"] += 1
+        code = snippet["code"]
+        for const, pin in pins.items():
+            code = re.sub(rf"^{const} = \d+", f"{const} = {pin}", code, count=1, flags=re.MULTILINE)
+        used = ", ".join(f"{c} = {p}" for c, p in pins.items()) or "по умолчанию"
+        return (
+            f"```python\n{code}```\n\n"
+            f"📚 Проверенный пример «{snippet['title']}» из библиотеки (сходство {score:.0%}). "
+            f"Пины из описания: {used}. Если нужно что-то сверх примера — уточните описание."
+        )
+
+
+def _assign_pins(text: str, slots: dict) -> dict | None:
+    """
+    Номера пинов из описания -> константы примера. Номер относим к константе,
+    слово которой стоит перед ним ближе всего; остальные — по порядку.
+    None — пинов больше, чем в примере: описание сложнее шаблона.
+    """
+    mentions = list(_PIN_MENTION.finditer(text))
+    if len(mentions) > len(slots):
+        return None
+    lowered = text.lower()
+    pins, free, prev_end = {}, [], 0
+    for m in mentions:
+        window = lowered[max(prev_end, m.start() - 40):m.start()]
+        prev_end = m.end()
+        found = [(window.rfind(w), const) for const, words in slots.items() if const not in pins
+                 for w in words if w in window]
+        if found:
+            pins[max(found)[1]] = int(m.group(1) or m.group(2))
+        else:
+            free.append(int(m.group(1) or m.group(2)))
+    for const in slots:
+        if const not in pins and free:
+            pins[const] = free.pop(0)
+    return pins
+
+
+SNIPPET_INDEX = SnippetIndex()
@@ -0,0 +1,186 @@
+# -*- coding: utf-8 -*-
+"""
+Хранилище состояния диалогов (FSM) по user_id.
+
+Состояние — словарь {"mode": str, "step": int, "data": dict, "chat_id": int}.
+Хендлеры работают только через STATE.get / set / pop; после изменения
+словаря его нужно сохранить через set (хранилище может быть не в памяти).
+
+- MemoryStateStorage — в памяти процесса, TTL + LRU, теряется при рестарте;
+- SqliteStateStorage — таблица fsm_state, запись сразу в БД, чтение через
+  небольшой LRU-кэш; переживает рестарт и видно всем процессам бота.
+"""
+import json
+import time
+from collections import OrderedDict
+
+from config import FSM_STORAGE, FSM_TTL_S, FSM_CACHE_MAX, FSM_CACHE_TTL_S
+from db import fetchone, db_read, db_write
+
+
+class _LRU:
+    """Ограниченный словарь: key -> (expires_at, value), самые давние вытесняются первыми."""
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max(1, max_entries)
+        self._items: OrderedDict = OrderedDict()
+
+    def get(self, key, now: float):
+        item = self._items.get(key)
+        if item is None:
+            return None
+        expires_at, value = item
+        if expires_at <= now:
+            del self._items[key]
+            return None
+        self._items.move_to_end(key)
+        return value
+
+    def put(self, key, value, expires_at: float) -> None:
+        self._items[key] = (expires_at, value)
+        self._items.move_to_end(key)
+        while len(self._items) > self.max_entries:
+            self._items.popitem(last=False)
+
+    def pop(self, key) -> None:
+        self._items.pop(key, None)
+
+    def purge(self, now: float) -> int:
+        expired = [k for k, (expires_at, _) in self._items.items() if expires_at <= now]
+        for k in expired:
+            del self._items[k]
+        return len(expired)
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+
+class StateStorage:
+    async def get(self, user_id: int) -> dict | None:
+        raise NotImplementedError
+
+    async def set(self, user_id: int, state: dict) -> None:
+        raise NotImplementedError
+
+    async def pop(self, user_id: int) -> None:
+        raise NotImplementedError
+
+    async def purge_expired(self) -> int:
+        """Удаляет брошенные диалоги старше TTL; возвращает, сколько удалено."""
+        return 0
+
+    def set_shared(self, shared: bool) -> None:
+        """Хранилищем пользуются несколько процессов (--workers > 1)."""
+
+    def stats(self) -> dict:
+        return {}
+
+
+class MemoryStateStorage(StateStorage):
+    def __init__(self, ttl: int = FSM_TTL_S, max_entries: int = FSM_CACHE_MAX):
+        self.ttl = ttl
+        self._lru = _LRU(max_entries)
+
+    async def get(self, user_id: int) -> dict | None:
+        return self._lru.get(user_id, time.monotonic())
+
+    async def set(self, user_id: int, state: dict) -> None:
+        self._lru.put(user_id, state, time.monotonic() + self.ttl)
+
+    async def pop(self, user_id: int) -> None:
+        self._lru.pop(user_id)
+
+    async def purge_expired(self) -> int:
+        return self._lru.purge(time.monotonic())
+
+    def set_shared(self, shared: bool) -> None:
+        if shared:
+            print("FSM_STORAGE=memory при нескольких процессах: шаги диалога, попавшие в другой процесс, "
+                  "потеряются — используйте FSM_STORAGE=sqlite")
+
+    def stats(self) -> dict:
+        return {"backend": "memory", "cached": len(self._lru)}
+
+
+class SqliteStateStorage(StateStorage):
+    """
+    Источник правды — fsm_state; кэш хранит JSON-строку (get отдаёт свежую копию,
+    правки словаря без set не «протекают» в кэш). Запись — сразу в БД.
+    При нескольких процессах соседний шаг диалога может прийти в другой процесс,
+    поэтому set_shared(True) выключает кэш: каждое чтение — из БД (по ключу, доли мс).
+    """
+
+    def __init__(self, ttl: int = FSM_TTL_S, cache_max: int = FSM_CACHE_MAX, cache_ttl: int = FSM_CACHE_TTL_S):
+        self.ttl = ttl
+        self.cache_ttl = cache_ttl
+        self._cache = _LRU(cache_max)
+        self.hits = 0
+        self.misses = 0
+
+    def _remember(self, user_id: int, raw: str, updated_ts: int) -> None:
+        if self.cache_ttl <= 0:
+            return
+        # пустую строку тоже кэшируем: «нет диалога» — самый частый ответ
+        left = min(self.cache_ttl, updated_ts + self.ttl - time.time())
+        self._cache.put(user_id, raw or "", time.monotonic() + left)
+
+    async def get(self, user_id: int) -> dict | None:
+        cached = self._cache.get(user_id, time.monotonic())
+        if cached is not None:
+            self.hits += 1
+            raw = cached
+        else:
+            self.misses += 1
+            async with db_read() as db:
+                row = await fetchone(
+                    db, "SELECT state, updated_ts FROM fsm_state WHERE user_id = ? AND updated_ts > ?",
+                    (user_id, int(time.time()) - self.ttl)
+                )
+            if row:
+                raw = row["state"]
+                self._remember(user_id, raw, row["updated_ts"])
+            else:
+                raw = ""
+                self._remember(user_id, raw, int(time.time()))
+        return json.loads(raw) if raw else None
+
+    async def set(self, user_id: int, state: dict) -> None:
+        raw = json.dumps(state, ensure_ascii=False)
+        now_ts = int(time.time())
+        async with db_write() as db:
+            await db.execute(
+                "INSERT OR REPLACE INTO fsm_state(user_id, state, updated_ts) VALUES(?, ?, ?)",
+                (user_id, raw, now_ts)
+            )
+        self._remember(user_id, raw, now_ts)
+
+    async def pop(self, user_id: int) -> None:
+        async with db_write() as db:
+            await db.execute("DELETE FROM fsm_state WHERE user_id = ?", (user_id,))
+        self._remember(user_id, "", int(time.time()))
+
+    def set_shared(self, shared: bool) -> None:
+        if shared:
+            self.cache_ttl = 0
+            self._cache = _LRU(self._cache.max_entries)
+
+    async def purge_expired(self) -> int:
+        async with db_write() as db:
+            cur = await db.execute("DELETE FROM fsm_state WHERE updated_ts <= ?", (int(time.time()) - self.ttl,))
+            deleted = cur.rowcount
+        self._cache.purge(time.monotonic())
+        return deleted
+
+    def stats(self) -> dict:
+        return {"backend": "sqlite", "cached": len(self._cache), "hits": self.hits, "misses": self.misses}
+
+
+def build_storage(kind: str = FSM_STORAGE) -> StateStorage:
+    if kind == "memory":
+        return MemoryStateStorage()
+    if kind == "sqlite":
+        return SqliteStateStorage()
+    raise ValueError(f"Неизвестное FSM_STORAGE: {kind!r} (ожидается sqlite или memory)")
+
+
+STATE = build_storage()
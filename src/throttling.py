@@ -0,0 +1,151 @@
+# -*- coding: utf-8 -*-
+"""
+Ограничение частоты входящих апдейтов от одного пользователя.
+
+Внешний (outer) middleware aiogram: срабатывает до фильтров и хендлеров,
+поэтому отброшенный апдейт не открывает соединение с БД и не ставит запрос
+в очередь генерации. Корзины TokenBucket — на пользователя и тип апдейта:
+- сообщения — THROTTLE_MESSAGE_RATE / BURST;
+- нажатия кнопок — THROTTLE_CALLBACK_RATE / BURST;
+- запросы к модели — дополнительно строгая THROTTLE_GEN_RATE / BURST. Её
+  списывает handlers/gen._run_generation через gen_wait(), только когда запрос
+  действительно уходит в очередь генерации: ответы из библиотеки примеров
+  и кэша почти ничего не стоят и лимит не тратят.
+
+Повторное нажатие той же кнопки того же сообщения, пока первое ещё
+обрабатывается или в пределах THROTTLE_CALLBACK_DEDUP_S, склеивается с первым:
+на callback сразу отвечаем, хендлер не вызываем. В ключ входит edit_date
+сообщения: после правки (листание, смена меню) то же нажатие уже не повтор. Отброшенным нажатиям тоже
+отвечаем (answerCallbackQuery не идёт через очередь OUTBOX), иначе клиент
+крутит «часики»; об отброшенных сообщениях предупреждаем один раз, пока
+корзина пуста.
+
+Корзины в памяти процесса: при нескольких процессах (webhook) лимит
+действует в каждом отдельно.
+"""
+import time
+from typing import Any, Awaitable, Callable
+
+from aiogram import BaseMiddleware
+from aiogram.exceptions import TelegramAPIError
+from aiogram.types import CallbackQuery, Message, TelegramObject
+
+from config import (
+    ADMIN_IDS, THROTTLE_MESSAGE_RATE, THROTTLE_MESSAGE_BURST, THROTTLE_CALLBACK_RATE,
+    THROTTLE_CALLBACK_BURST, THROTTLE_GEN_RATE, THROTTLE_GEN_BURST,
+    THROTTLE_CALLBACK_DEDUP_S, THROTTLE_MAX_USERS,
+)
+from metrics import THROTTLED
+from ratelimit import TokenBucket
+
+
+class _UserBuckets:
+    __slots__ = ("message", "callback", "gen", "warned_until")
+
+    def __init__(self):
+        self.message = TokenBucket(THROTTLE_MESSAGE_RATE, THROTTLE_MESSAGE_BURST)
+        self.callback = TokenBucket(THROTTLE_CALLBACK_RATE, THROTTLE_CALLBACK_BURST)
+        self.gen = TokenBucket(THROTTLE_GEN_RATE, THROTTLE_GEN_BURST)
+        self.warned_until = 0.0   # до этого момента о лимите сообщений уже предупреждали
+
+    def is_idle(self) -> bool:
+        return self.message.is_full() and self.callback.is_full() and self.gen.is_full()
+
+
+class Throttling(BaseMiddleware):
+    def __init__(self, max_users: int = THROTTLE_MAX_USERS, dedup_s: float = THROTTLE_CALLBACK_DEDUP_S):
+        self.max_users = max_users
+        self.dedup_s = dedup_s
+        self._users: dict = {}      # user_id -> _UserBuckets
+        self._inflight: set = set()  # (user_id, message_id, edit_date, data) — нажатия в обработке
+        self._recent: dict = {}     # тот же ключ -> monotonic времени нажатия
+
+    async def __call__(self, handler: Callable[[TelegramObject, dict], Awaitable[Any]],
+                       event: TelegramObject, data: dict) -> Any:
+        user = getattr(event, "from_user", None)
+        if user is None or user.id in ADMIN_IDS:
+            return await handler(event, data)
+        if isinstance(event, CallbackQuery):
+            return await self._on_callback(handler, event, data)
+        if isinstance(event, Message):
+            return await self._on_message(handler, event, data)
+        return await handler(event, data)
+
+    def _buckets(self, user_id: int) -> _UserBuckets:
+        b = self._users.get(user_id)
+        if b is None:
+            if len(self._users) >= self.max_users:
+                self._prune()
+            b = self._users[user_id] = _UserBuckets()
+        return b
+
+    def _prune(self) -> None:
+        for user_id in [u for u, b in self._users.items() if b.is_idle()]:
+            del self._users[user_id]
+        now = time.monotonic()
+        for key in [k for k, t in self._recent.items() if now - t >= self.dedup_s]:
+            del self._recent[key]
+
+    # ---------- нажатия кнопок ----------
+    async def _on_callback(self, handler, cq: CallbackQuery, data: dict) -> Any:
+        message = cq.message
+        key = (cq.from_user.id, message.message_id if message else None,
+               getattr(message, "edit_date", None), cq.data)
+        now = time.monotonic()
+        if key in self._inflight or now - self._recent.get(key, -self.dedup_s) < self.dedup_s:
+            THROTTLED.inc(kind="callback", reason="duplicate")
+            await self._answer(cq)
+            return None
+        bucket = self._buckets(cq.from_user.id).callback
+        if not bucket.take():
+            THROTTLED.inc(kind="callback", reason="rate")
+            await self._answer(cq, f"Слишком часто, подождите {max(1, round(bucket.delay()))} с")
+            return None
+        if len(self._recent) >= self.max_users:
+            self._prune()
+        self._recent[key] = now
+        self._inflight.add(key)
+        try:
+            return await handler(cq, data)
+        finally:
+            self._inflight.discard(key)
+            self._recent[key] = time.monotonic()
+
+    @staticmethod
+    async def _answer(cq: CallbackQuery, text: str | None = None) -> None:
+        try:
+            await cq.answer(text)
+        except TelegramAPIError:
+            pass   # запрос устарел — клиенту уже всё равно
+
+    # ---------- сообщения ----------
+    async def _on_message(self, handler, msg: Message, data: dict) -> Any:
+        buckets = self._buckets(msg.from_user.id)
+        if not buckets.message.take():
+            THROTTLED.inc(kind="message", reason="rate")
+            await self._warn(msg, buckets, buckets.message)
+            return None
+        return await handler(msg, data)
+
+    def gen_wait(self, user_id: int) -> int:
+        """Перед запросом к модели: 0 — можно (токен списан), иначе сколько секунд подождать."""
+        if user_id in ADMIN_IDS:
+            return 0
+        bucket = self._buckets(user_id).gen
+        if bucket.take():
+            return 0
+        THROTTLED.inc(kind="gen", reason="rate")
+        return max(1, round(bucket.delay()))
+
+    @staticmethod
+    async def _warn(msg: Message, buckets: _UserBuckets, bucket: TokenBucket) -> None:
+        """Одно предупреждение, пока корзина не наполнится; остальное отбрасываем молча."""
+        now = time.monotonic()
+        if now < buckets.warned_until:
+            return
+        wait = bucket.delay()
+        buckets.warned_until = now + wait
+        await msg.answer(f"Слишком много сообщений, подождите {max(1, round(wait))} с.")
+
+
+THROTTLE = Throttling()
@@ -1,10 +1,20 @@
 # -*- coding: utf-8 -*-
+import asyncio
 import re
 from io import BytesIO
+from tempfile import SpooledTemporaryFile
 from datetime import datetime, timezone
 from zoneinfo import ZoneInfo
 
-from aiogram.types import BufferedInputFile
+from aiogram.types import BufferedInputFile, InputFile
+
+def to_ts(dt: datetime) -> int:
+    """aware datetime -> Unix-секунды (так время хранится в БД)"""
+    return int(dt.timestamp())
+
+def from_ts(ts: int) -> datetime:
+    """Unix-секунды -> aware UTC datetime"""
+    return datetime.fromtimestamp(ts, tz=timezone.utc)
 
 def fmt_dt_local(dt_utc: datetime, tz: ZoneInfo) -> str:
     return dt_utc.astimezone(tz).strftime("%Y-%m-%d %H:%M")
@@ -23,6 +33,38 @@ def make_py_document(filename: str, code_text: str) -> BufferedInputFile:
     bio.seek(0)
     return BufferedInputFile(bio.read(), filename=filename)
 
+class SpooledInputFile(InputFile):
+    """
+    Документ из SpooledTemporaryFile: небольшой лежит в памяти, большой — на диске.
+    Читается кусками в потоке; при повторной отправке (RetryAfter) — снова с начала.
+    """
+
+    def __init__(self, file: SpooledTemporaryFile, filename: str, chunk_size: int = 64 * 1024):
+        super().__init__(filename=filename, chunk_size=chunk_size)
+        self.file = file
+
+    async def read(self, bot):
+        self.file.seek(0)
+        while chunk := await asyncio.to_thread(self.file.read, self.chunk_size):
+            yield chunk
+
+    def close(self) -> None:
+        self.file.close()
+
 def parse_utc_hhmm(s: str) -> datetime:
     """'YYYY-MM-DD HH:MM' -> aware UTC datetime"""
     return datetime.strptime(s.strip(), "%Y-%m-%d %H:%M").replace(tzinfo=timezone.utc)
+
+
+def split_text(text: str, limit: int = 3500) -> list[str]:
+    """Режет длинный текст на части не длиннее limit, по возможности по переводам строк."""
+    chunks = []
+    while len(text) > limit:
+        cut = text.rfind("\n", 0, limit)
+        if cut <= 0:
+            cut = limit
+        chunks.append(text[:cut])
+        text = text[cut:].lstrip("\n")
+    if text:
+        chunks.append(text)
+    return chunks
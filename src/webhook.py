@@ -0,0 +1,100 @@
+# -*- coding: utf-8 -*-
+"""
+Приём апдейтов через webhook (aiohttp) вместо long polling.
+
+Хендлер HTTP только проверяет секрет и кладёт апдейт в ограниченную очередь —
+Telegram сразу получает 200. Апдейты разбирают WEBHOOK_WORKERS обработчиков
+через тот же Dispatcher и роутеры, что и при polling. Очередь переполнена —
+отвечаем 503, Telegram повторит доставку позже.
+
+Для локальной проверки достаточно POST записанного апдейта:
+    curl -H "X-Telegram-Bot-Api-Secret-Token: $WEBHOOK_SECRET" \\
+         -d @update.json http://127.0.0.1:8080/webhook
+"""
+import asyncio
+import hmac
+import json
+
+from aiogram import Bot, Dispatcher
+from aiogram.types import Update
+from aiohttp import web
+
+from config import WEBHOOK_PATH, WEBHOOK_SECRET, WEBHOOK_QUEUE_MAX, WEBHOOK_WORKERS
+
+SECRET_HEADER = "X-Telegram-Bot-Api-Secret-Token"
+
+
+class WebhookServer:
+    def __init__(self, dp: Dispatcher, bot: Bot, path: str = WEBHOOK_PATH, secret: str = WEBHOOK_SECRET,
+                 queue_max: int = WEBHOOK_QUEUE_MAX, workers: int = WEBHOOK_WORKERS):
+        self.dp = dp
+        self.bot = bot
+        self.path = path
+        self.secret = secret
+        self.queue_max = queue_max
+        self.workers_count = max(1, workers)
+        self._queue: asyncio.Queue | None = None
+        self._workers: list[asyncio.Task] = []
+        self._runner: web.AppRunner | None = None
+        self.stats = {"received": 0, "rejected": 0, "unauthorized": 0, "processed": 0, "failed": 0}
+
+    # ---------- HTTP ----------
+    async def _handle(self, request: web.Request) -> web.Response:
+        if self.secret and not hmac.compare_digest(request.headers.get(SECRET_HEADER, ""), self.secret):
+            self.stats["unauthorized"] += 1
+            return web.Response(status=401)
+        try:
+            update = Update.model_validate(await request.json(loads=json.loads), context={"bot": self.bot})
+        except Exception:
+            return web.Response(status=400)
+        try:
+            self._queue.put_nowait(update)
+        except asyncio.QueueFull:
+            self.stats["rejected"] += 1
+            return web.Response(status=503)
+        self.stats["received"] += 1
+        return web.Response()
+
+    def app(self) -> web.Application:
+        app = web.Application()
+        app.router.add_post(self.path, self._handle)
+        return app
+
+    # ---------- обработчики ----------
+    async def _worker(self) -> None:
+        while True:
+            update = await self._queue.get()
+            try:
+                await self.dp.feed_update(self.bot, update)
+                self.stats["processed"] += 1
+            except Exception as e:
+                self.stats["failed"] += 1
+                print(f"[webhook] update {update.update_id} failed: {e}")
+            finally:
+                self._queue.task_done()
+
+    def depth(self) -> int:
+        return self._queue.qsize() if self._queue else 0
+
+    # ---------- жизненный цикл ----------
+    async def start(self, host: str, port: int, reuse_port: bool = False) -> None:
+        self._queue = asyncio.Queue(maxsize=self.queue_max)
+        self._workers = [asyncio.create_task(self._worker()) for _ in range(self.workers_count)]
+        self._runner = web.AppRunner(self.app(), access_log=None)
+        await self._runner.setup()
+        # reuse_port: несколько процессов слушают один порт, ядро делит соединения между ними
+        await web.TCPSite(self._runner, host, port, reuse_port=reuse_port or None).start()
+
+    async def stop(self, drain_timeout: float = 10) -> None:
+        if self._runner is not None:
+            await self._runner.cleanup()   # новых апдейтов больше не принимаем
+            self._runner = None
+        if self._queue is not None:
+            try:
+                await asyncio.wait_for(self._queue.join(), drain_timeout)
+            except asyncio.TimeoutError:
+                print(f"[webhook] {self._queue.qsize()} updates dropped on shutdown")
+        for t in self._workers:
+            t.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
@@ -0,0 +1,56 @@
+# -*- coding: utf-8 -*-
+"""
+Общая настройка тестов.
+
+Модули бота лежат плоско в src/ и читают конфиг из окружения при импорте.
+Асинхронные тесты выполняются в своём цикле событий (asyncio.run) без
+сторонних плагинов; фикстура database даёт тесту отдельный файл БД со схемой
+и открытым пулом (db.POOL), который закрывается после теста.
+"""
+import asyncio
+import inspect
+import os
+import sys
+
+import pytest
+
+os.environ.setdefault("BOT_TOKEN", "123456:test")
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src"))
+
+import db  # noqa: E402
+
+
+class _Database:
+    def __init__(self, path: str):
+        self.path = path
+
+    async def __aenter__(self):
+        await db.ensure_db()
+        return await db.init_pool(self.path)
+
+    async def __aexit__(self, *exc):
+        await db.close_pool()
+
+
+@pytest.fixture
+def database(tmp_path, monkeypatch):
+    path = str(tmp_path / "test.db")
+    monkeypatch.setattr(db, "DB_PATH", path)
+    return _Database(path)
+
+
+@pytest.hookimpl(tryfirst=True)
+def pytest_pyfunc_call(pyfuncitem):
+    if not inspect.iscoroutinefunction(pyfuncitem.obj):
+        return None
+    kwargs = {name: pyfuncitem.funcargs[name] for name in pyfuncitem._fixtureinfo.argnames}
+
+    async def run():
+        if "database" in kwargs:
+            async with kwargs["database"]:
+                await pyfuncitem.obj(**kwargs)
+        else:
+            await pyfuncitem.obj(**kwargs)
+
+    asyncio.run(run())
+    return True
@@ -0,0 +1,33 @@
+# -*- coding: utf-8 -*-
+import json
+import os
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def _bench(tmp_path, *args):
+    out = tmp_path / "bench.json"
+    proc = subprocess.run(
+        [sys.executable, os.path.join(ROOT, "bench", "bench_handlers.py"),
+         "--classes", "3", "--students", "10", "--tasks", "30",
+         "--out", str(out), *args],
+        cwd=ROOT, capture_output=True, text=True, timeout=120,
+        # без --db бенч создаёт временный каталог — пусть он будет внутри tmp_path
+        env={**os.environ, "TMPDIR": str(tmp_path)},
+    )
+    assert proc.returncode == 0, proc.stdout + proc.stderr
+    return json.loads(out.read_text())
+
+
+def test_bench_smoke(tmp_path):
+    """Короткий прогон всех сценариев через настоящий Dispatcher — без ошибок в хендлерах."""
+    res = _bench(tmp_path, "--users", "3", "--rounds", "3")
+    assert res["errors"] == {}
+    assert res["api_calls"].get("EditMessageText", 0) > 0
+    # лимиты на пользователя по умолчанию сняты: каждый проход gen заканчивается документом
+    assert res["api_calls"].get("SendDocument") == 9
+    assert "AnswerCallbackQuery" not in res["api_calls"]
+    # ни основной процесс, ни процессы проверки кода не оставили временных каталогов
+    assert not list(tmp_path.glob("bench-*"))
@@ -0,0 +1,77 @@
+# -*- coding: utf-8 -*-
+from datetime import datetime, timezone
+
+from aiogram.types import Chat, Message
+
+import handlers.classes as classes
+from class_cache import ClassCache
+from db import db_write
+from keyboards import paged_kb
+
+
+async def _add_class(name: str, owner: int = 1):
+    async with db_write() as db:
+        await db.execute("INSERT INTO classes(name, owner_chat_id, timezone) VALUES (?, ?, 'UTC')", (name, owner))
+
+
+def _texts(kb):
+    return [b.text for row in kb.inline_keyboard for b in row]
+
+
+def test_paged_kb_navigation():
+    rows = [(f"c{i}", f"pick:{i}") for i in range(5)]
+    first = paged_kb(rows, 0, lambda n: f"page:{n}", tail=[("Назад", "back")], page_size=2)
+    assert _texts(first) == ["c0", "c1", "Назад", "1/3", "▶"]
+    last = paged_kb(rows, 99, lambda n: f"page:{n}", page_size=2)
+    assert _texts(last) == ["c4", "◀", "3/3"]
+    assert last.inline_keyboard[-1][0].callback_data == "page:1"
+
+
+async def test_rows_are_cached_until_invalidated(database):
+    cache = ClassCache(check_interval=3600)
+    await _add_class("B")
+    await _add_class("a", owner=2)
+    assert [c["name"] for c in await cache.all()] == ["a", "B"]
+    await _add_class("C")
+    assert len(await cache.all()) == 2   # в пределах интервала проверки — из памяти
+    cache.invalidate()
+    assert len(await cache.all()) == 3
+    assert [c["name"] for c in await cache.owned_by(1)] == ["B", "C"]
+    assert cache.loads == 2
+
+
+async def test_other_process_changes_seen_via_version(database):
+    cache = ClassCache(check_interval=0)
+    await _add_class("А")
+    await cache.all()
+    await cache.all()
+    assert cache.loads == 1   # версия не менялась — без перечитывания
+    await _add_class("Б")     # триггер увеличил cache_versions.classes
+    assert len(await cache.all()) == 2
+    assert cache.loads == 2
+
+
+async def test_picker_keyboard_is_reused(database):
+    cache = ClassCache(check_interval=3600)
+    assert await cache.picker_kb("pick:") is None
+    await _add_class("А")
+    cache.invalidate()
+    kb = await cache.picker_kb("pick:")
+    assert kb is await cache.picker_kb("pick:")
+    assert kb.inline_keyboard[0][0].callback_data.startswith("pick:")
+    cache.invalidate()
+    assert kb is not await cache.picker_kb("pick:")
+
+
+async def test_add_class_command_invalidates(database, monkeypatch):
+    async def answer(self, text, **kwargs):
+        pass
+
+    monkeypatch.setattr(Message, "answer", answer)
+    monkeypatch.setattr(classes, "CLASSES", ClassCache(check_interval=3600))
+    await _add_class("A", owner=7)
+    assert len(await classes.CLASSES.owned_by(7)) == 1
+    msg = Message(message_id=1, date=datetime.now(timezone.utc), chat=Chat(id=7, type="private"),
+                  text="/add_class B")
+    await classes.legacy_add_class(msg)
+    assert [c["name"] for c in await classes.CLASSES.owned_by(7)] == ["A", "B"]
@@ -0,0 +1,90 @@
+# -*- coding: utf-8 -*-
+from codecheck import CheckResult, CodeChecker, check_code
+
+GOOD = """from machine import Pin
+import time
+LED_PIN = 2
+led = Pin(LED_PIN, Pin.OUT)
+while True:
+    led.value(not led.value())
+    time.sleep(1)
+"""
+
+
+def test_clean_code_passes():
+    assert check_code(GOOD) == ([], [])
+
+
+def test_syntax_error_and_empty_code():
+    errors, _ = check_code("def f(:\n  pass")
+    assert errors and "синтаксическая ошибка" in errors[0]
+    assert check_code("  \n") == (["в ответе нет кода"], [])
+
+
+def test_unknown_modules():
+    errors, _ = check_code("import os\nimport numpy as np\nfrom flask import Flask\nimport machine.pin")
+    assert errors == [
+        "строка 2: модуля «numpy» нет в MicroPython для ESP32",
+        "строка 3: модуля «flask» нет в MicroPython для ESP32",
+    ]
+
+
+def test_pin_rules():
+    code = """from machine import Pin, PWM
+FLASH = 6
+SENSOR = 34
+a = Pin(FLASH, Pin.IN)
+b = Pin(SENSOR, Pin.OUT)
+c = PWM(Pin(SENSOR))
+d = Pin(SENSOR, Pin.IN)
+e = Pin(24, mode=Pin.OUT)
+f = Pin(2, Pin.OUT)
+"""
+    errors, warnings = check_code(code)
+    assert sorted(errors) == [
+        "строка 4: GPIO6 занят флеш-памятью ESP32",
+        "строка 5: GPIO34 работает только на вход",
+        "строка 6: GPIO34 работает только на вход",
+        "строка 8: у ESP32 нет GPIO24",
+    ]
+    assert [w.split(":")[0] for w in warnings] == ["строка 8", "строка 9"]
+
+
+async def test_checker_inline_caches_results():
+    checker = CodeChecker(workers=0)
+    assert await checker.check(GOOD) == CheckResult([], [], "passed")
+    assert await checker.check(GOOD) == CheckResult([], [], "passed")
+    result = await checker.check("import numpy")
+    assert result.errors and result.status == "failed" and result.checked
+    summary = checker.summary()
+    assert summary["checked"] == 2 and summary["passed"] == 1 and summary["failed"] == 1
+    assert summary["pass_rate"] == 0.5
+
+
+async def test_checker_process_pool():
+    checker = CodeChecker(workers=1, timeout=30)
+    try:
+        assert await checker.check(GOOD) == CheckResult([], [], "passed")
+        assert (await checker.check("import numpy")).errors
+        checker.timeout = 0
+        result = await checker.check("import machine")
+        assert result == CheckResult([], [], "timeout") and not result.checked
+        assert checker.summary()["timeouts"] == 1
+    finally:
+        await checker.stop()
+
+
+async def test_broken_pool_is_shut_down_and_recreated():
+    checker = CodeChecker(workers=1, timeout=30)
+    try:
+        checker.start()
+        broken = checker._pool
+        for proc in list(broken._processes.values()):
+            proc.kill()
+        assert await checker.check(GOOD) == CheckResult([], [], "error")
+        assert checker._pool is None
+        assert broken._shutdown_thread
+        assert (await checker.check("import numpy")).status == "failed"
+        assert checker._pool is not None and checker._pool is not broken
+    finally:
+        await checker.stop()
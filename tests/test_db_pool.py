@@ -0,0 +1,64 @@
+# -*- coding: utf-8 -*-
+import asyncio
+import sqlite3
+
+import pytest
+
+import db
+from db import db_read, db_write, fetchone
+
+
+async def test_writer_commits_on_exit(database):
+    async with db_write() as conn:
+        await conn.execute("INSERT INTO classes(name, owner_chat_id, timezone) VALUES ('A', 1, 'UTC')")
+    async with db_read() as conn:
+        row = await fetchone(conn, "SELECT COUNT(*) FROM classes")
+    assert row[0] == 1
+
+
+async def test_writer_rolls_back_on_error(database):
+    with pytest.raises(RuntimeError):
+        async with db_write() as conn:
+            await conn.execute("INSERT INTO classes(name, owner_chat_id, timezone) VALUES ('A', 1, 'UTC')")
+            raise RuntimeError("boom")
+    async with db_read() as conn:
+        row = await fetchone(conn, "SELECT COUNT(*) FROM classes")
+    assert row[0] == 0
+
+
+async def test_readers_are_read_only(database):
+    with pytest.raises(sqlite3.OperationalError):
+        async with db_read() as conn:
+            await conn.execute("INSERT INTO classes(name, owner_chat_id, timezone) VALUES ('A', 1, 'UTC')")
+
+
+async def test_single_writer_at_a_time(database):
+    active, overlaps = [], []
+
+    async def writer(n):
+        async with db_write() as conn:
+            active.append(n)
+            overlaps.append(len(active))
+            await conn.execute("INSERT INTO classes(name, owner_chat_id, timezone) VALUES (?, 1, 'UTC')", (f"c{n}",))
+            await asyncio.sleep(0.01)
+            active.remove(n)
+
+    await asyncio.gather(*(writer(n) for n in range(5)))
+    assert max(overlaps) == 1
+
+
+async def test_readers_run_concurrently(database):
+    async def read():
+        async with db_read():
+            await asyncio.sleep(0.05)
+
+    await asyncio.gather(*(read() for _ in range(db.POOL.readers_count)))
+    stats = db.POOL.stats()
+    assert stats["reader"]["acquired"] == db.POOL.readers_count
+    assert stats["reader"]["wait_max_ms"] < 40   # никто не ждал освобождения соединения
+    assert stats["reader"]["idle"] == db.POOL.readers_count
+
+
+def test_pool_required():
+    with pytest.raises(RuntimeError):
+        db_read()
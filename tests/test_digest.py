@@ -0,0 +1,68 @@
+# -*- coding: utf-8 -*-
+import asyncio
+
+import digest
+from digest import ReminderDigest, digest_enabled, render_digest, set_digest
+
+
+def _item(class_name, title, due_ts, label="1h"):
+    return {"class_name": class_name, "title": title, "due_local": "2030-01-01 10:00", "tz": "UTC",
+            "due_ts": due_ts, "label": label, "text": f"⏰ {title}"}
+
+
+class _Sender:
+    def __init__(self, fail=False):
+        self.sent = []
+        self.fail = fail
+
+    async def __call__(self, chat_id, text):
+        if self.fail:
+            raise RuntimeError("blocked")
+        self.sent.append((chat_id, text))
+
+
+def test_render_groups_by_class_then_deadline():
+    text = render_digest([_item("b", "t3", 1), _item("A", "t2", 2), _item("A", "t1", 1)])
+    lines = text.splitlines()
+    assert lines[0] == "⏰ <b>Напоминания</b> (3)"
+    assert [l for l in lines if l.startswith("<b>") or l.startswith("•")] == [
+        "<b>A</b>", "• t1 — 2030-01-01 10:00 UTC (1h)", "• t2 — 2030-01-01 10:00 UTC (1h)",
+        "<b>b</b>", "• t3 — 2030-01-01 10:00 UTC (1h)",
+    ]
+
+
+async def test_window_merges_per_owner():
+    send = _Sender()
+    dg = ReminderDigest(send, window=0.05)
+    results = await asyncio.gather(
+        dg.add(1, _item("A", "t1", 1)), dg.add(1, _item("A", "t2", 2)), dg.add(2, _item("B", "solo", 1)),
+    )
+    assert results == [True, True, True]
+    by_chat = dict(send.sent)
+    assert "(2)" in by_chat[1]
+    assert by_chat[2] == "⏰ solo"   # одно напоминание — обычным текстом
+    assert dg.pending() == 0
+
+
+async def test_failed_send_reports_undelivered():
+    dg = ReminderDigest(_Sender(fail=True), window=0.01)
+    assert await asyncio.gather(dg.add(1, _item("A", "t1", 1)), dg.add(1, _item("A", "t2", 1))) == [False, False]
+
+
+async def test_flush_all_sends_immediately():
+    send = _Sender()
+    dg = ReminderDigest(send, window=3600)
+    waiter = asyncio.create_task(dg.add(1, _item("A", "t1", 1)))
+    await asyncio.sleep(0)
+    await dg.flush_all()
+    assert await waiter is True
+    assert send.sent == [(1, "⏰ t1")]
+
+
+async def test_owner_setting(database, monkeypatch):
+    monkeypatch.setattr(digest, "REMINDER_DIGEST_DEFAULT", False)
+    assert await digest_enabled(5) is False
+    await set_digest(5, True)
+    assert await digest_enabled(5) is True
+    await set_digest(5, False)
+    assert await digest_enabled(5) is False
@@ -0,0 +1,76 @@
+# -*- coding: utf-8 -*-
+import io
+
+import exporters
+from db import db_write
+from exporters import export_csv, export_filename
+from importers import parse_roster, parse_tasks
+
+CLASS = {"id": 1, "name": "7А", "timezone": "Europe/Moscow"}
+
+
+async def _seed():
+    async with db_write() as db:
+        await db.executemany("INSERT INTO classes(id, name, owner_chat_id, timezone) VALUES (?, ?, 1, 'UTC')",
+                             [(1, "7А"), (2, "8Б")])
+        await db.executemany(
+            "INSERT INTO tasks(class_id, title, description, due_ts, created_ts) VALUES (?, ?, ?, ?, 0)",
+            [(1, f"Задание; {i}", "LED\nна GPIO2" if i == 0 else None, 1_899_999_960 + i * 3600) for i in range(25)]
+            + [(2, "чужое", None, 1_900_000_000)]
+        )
+        await db.executemany("INSERT INTO users(UserID, name, username, post) VALUES (?, ?, ?, 'student')",
+                             [(10001, "Иван", "ivan"), (10002, "Мария", None)])
+        await db.executemany("INSERT INTO enrollments(student_id, class_id) VALUES (?, ?)",
+                             [(10001, 1), (10001, 2), (10002, 1)])
+
+
+async def _read(doc) -> bytes:
+    return b"".join([chunk async for chunk in doc.read(None)])
+
+
+async def test_tasks_export_roundtrips_through_import(database, monkeypatch):
+    monkeypatch.setattr(exporters, "EXPORT_BATCH", 10)
+    monkeypatch.setattr(exporters, "EXPORT_SPOOL_BYTES", 256)   # файл уходит на диск
+    await _seed()
+    doc, count = await export_csv("tasks", CLASS)
+    try:
+        assert count == 25
+        assert doc.file._rolled
+        data = await _read(doc)
+        assert data == await _read(doc)   # повторная отправка читает файл с начала
+    finally:
+        doc.close()
+    assert data.startswith("﻿".encode("utf-8"))
+    tasks, errors = parse_tasks("tasks.csv", data)
+    assert errors == []
+    assert [t[0] for t in tasks] == [f"Задание; {i}" for i in range(25)]
+    assert tasks[0][1] == "LED\nна GPIO2"
+    assert int(tasks[1][2].timestamp()) == 1_899_999_960 + 3600   # due_utc — с точностью до минуты
+
+
+async def test_students_export_roundtrips_through_roster_import(database):
+    await _seed()
+    doc, count = await export_csv("students", CLASS)
+    try:
+        data = await _read(doc)
+    finally:
+        doc.close()
+    assert count == 2
+    rows = list(parse_roster("students.csv", io.BytesIO(data)))
+    assert rows == [(1, ("Иван", "ivan", ["7А", "8Б"])), (2, ("Мария", None, ["7А"]))]
+
+
+async def test_enrollments_export(database):
+    await _seed()
+    doc, count = await export_csv("enrollments", CLASS)
+    try:
+        lines = (await _read(doc)).decode("utf-8-sig").splitlines()
+    finally:
+        doc.close()
+    assert count == 2
+    assert lines == ["student_id;student;class_id;class", "10001;Иван;1;7А", "10002;Мария;1;7А"]
+
+
+def test_filename_is_safe():
+    assert export_filename("tasks", "7А / физика").startswith("tasks_7А_физика_")
+    assert export_filename("tasks", "///").startswith("tasks_class_")
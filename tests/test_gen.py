@@ -0,0 +1,101 @@
+# -*- coding: utf-8 -*-
+import asyncio
+
+import handlers.gen as gen
+from codecheck import CheckResult
+from config import DEFAULT_MODEL
+from handlers.gen import _LiveMessage, _gen_kb, _send_result
+from keyboards import back_kb
+from llm import LLMRegistry
+from utils import split_text
+
+
+class _FakeMessage:
+    def __init__(self):
+        self.edits = []
+
+        self.sent = []
+
+    async def edit_text(self, text, **kwargs):
+        self.edits.append((text, kwargs))
+
+    async def answer(self, text, **kwargs):
+        self.sent.append(text)
+
+    async def answer_document(self, document, caption=None, **kwargs):
+        self.sent.append(caption)
+
+
+def test_split_text_prefers_newlines():
+    text = "a" * 6 + "\n" + "b" * 6 + "\n" + "c" * 3
+    assert split_text(text, 10) == ["a" * 6, "b" * 6 + "\n" + "c" * 3]
+    assert split_text("x" * 25, 10) == ["x" * 10, "x" * 10, "x" * 5]
+    assert split_text("", 10) == []
+
+
+async def test_live_message_throttles_and_escapes():
+    msg = _FakeMessage()
+    live = _LiveMessage(msg, interval=0.05)
+    live.update("a<b")
+    live.update("a<b>c")
+    await asyncio.sleep(0.01)
+    live.update("a<b>cd")
+    await asyncio.sleep(0.02)
+    assert [t for t, _ in msg.edits] == ["<pre>a&lt;b&gt;c</pre> ▌"]
+    await asyncio.sleep(0.05)
+    await live.close()
+    assert [t for t, _ in msg.edits][-1] == "<pre>a&lt;b&gt;cd</pre> ▌"
+    assert len(msg.edits) == 2
+
+
+class _CountingChecker:
+    def __init__(self, result):
+        self.result = result
+        self.calls = 0
+
+    async def check(self, code):
+        self.calls += 1
+        return self.result
+
+
+ANSWER = "```python\nimport machine\n```"
+
+
+async def test_send_result_uses_given_check(monkeypatch):
+    checker = _CountingChecker(CheckResult(["строка 1: ошибка"], [], "failed"))
+    monkeypatch.setattr(gen, "CHECKER", checker)
+    msg = _FakeMessage()
+    await _send_result(msg, ANSWER, check=CheckResult([], [], "passed"))
+    assert checker.calls == 0 and msg.sent[-1].startswith("Готово!")
+    await _send_result(msg, ANSWER)      # ответ из кэша — проверяем здесь
+    assert checker.calls == 1 and "строка 1: ошибка" in msg.sent[-1]
+
+
+async def test_unverified_code_is_flagged(monkeypatch):
+    monkeypatch.setattr(gen, "CHECKER", _CountingChecker(CheckResult([], [], "timeout")))
+    result, check = await gen._validate("мигалка", "m", ANSWER, lambda text: None)
+    assert result == ANSWER and check.status == "timeout"
+    msg = _FakeMessage()
+    await _send_result(msg, result, check=check)
+    assert msg.sent[-1].startswith("⚠️ Код не проверен")
+
+
+def test_model_keyboard_marks_default_model(monkeypatch):
+    monkeypatch.setattr(gen, "LLM", LLMRegistry(models={"fast": "tiny:1b", "main": DEFAULT_MODEL}, factory=None))
+    texts = [row[0].text for row in _gen_kb(None).inline_keyboard[:2]]
+    assert texts == ["fast (tiny:1b)", f"✅ main ({DEFAULT_MODEL})"]
+    texts = [row[0].text for row in _gen_kb("fast").inline_keyboard[:2]]
+    assert texts == ["✅ fast (tiny:1b)", f"main ({DEFAULT_MODEL})"]
+
+
+async def test_live_message_keeps_keyboard():
+    msg = _FakeMessage()
+    kb = back_kb()
+    live = _LiveMessage(msg, interval=0.01, reply_markup=kb)
+    live.update("a")
+    await asyncio.sleep(0.02)
+    live.update("ab")
+    await asyncio.sleep(0.02)
+    await live.close()
+    assert len(msg.edits) == 2
+    assert all(kwargs["reply_markup"] is kb for _, kwargs in msg.edits)
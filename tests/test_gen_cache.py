@@ -0,0 +1,57 @@
+# -*- coding: utf-8 -*-
+import asyncio
+
+from gen_cache import GenCache, cache_key, normalize_description
+
+
+def test_key_ignores_case_spaces_and_edge_punctuation():
+    assert normalize_description("  Мигалка   на ЁЖИКЕ! ") == "мигалка на ежике"
+    assert cache_key("Мигалка на GPIO2.", "m") == cache_key("мигалка  на gpio2", "m")
+    assert cache_key("мигалка", "a") != cache_key("мигалка", "b")
+
+
+async def test_hit_and_miss(database):
+    cache = GenCache()
+    assert await cache.get("blink", "m") is None
+    await cache.put("blink", "m", "code")
+    assert await cache.get("Blink!", "m") == "code"
+    assert await cache.get("blink", "other") is None
+    stats = await cache.stats()
+    assert stats["entries"] == 1 and stats["hits"] == 1 and stats["misses"] == 2
+
+
+async def test_ttl(database):
+    cache = GenCache(ttl=0)
+    await cache.put("blink", "m", "code")
+    assert await cache.get("blink", "m") is None
+
+
+async def test_lru_eviction_by_count(database):
+    cache = GenCache(max_entries=2)
+    await cache.put("a", "m", "1")
+    await asyncio.sleep(0.01)
+    await cache.put("b", "m", "2")
+    await asyncio.sleep(0.01)
+    assert await cache.get("a", "m") == "1"   # «a» теперь свежее «b»
+    await asyncio.sleep(0.01)
+    await cache.put("c", "m", "3")
+    assert await cache.get("b", "m") is None
+    assert await cache.get("a", "m") == "1"
+    assert await cache.get("c", "m") == "3"
+
+
+async def test_eviction_by_bytes(database):
+    cache = GenCache(max_bytes=10)
+    await cache.put("a", "m", "x" * 6)
+    await asyncio.sleep(0.01)
+    await cache.put("b", "m", "y" * 6)
+    stats = await cache.stats()
+    assert stats["entries"] == 1 and stats["bytes"] == 6
+    assert await cache.get("b", "m") == "y" * 6
+
+
+async def test_purge(database):
+    cache = GenCache()
+    await cache.put("a", "m", "1")
+    assert await cache.purge() == 1
+    assert (await cache.stats())["entries"] == 0
@@ -0,0 +1,116 @@
+# -*- coding: utf-8 -*-
+import asyncio
+
+import pytest
+
+from gen_queue import AlreadyQueued, GenScheduler, QueueFull
+
+
+class _Runner:
+    def __init__(self):
+        self.calls = []
+        self.active = 0
+        self.max_active = 0
+        self.gate = asyncio.Event()
+
+    async def __call__(self, desc, model_name, report):
+        self.calls.append(desc)
+        report(desc[:1])
+        self.active += 1
+        self.max_active = max(self.max_active, self.active)
+        await self.gate.wait()
+        self.active -= 1
+        if desc == "boom":
+            raise ValueError(desc)
+        return f"{desc}@{model_name}"
+
+
+async def test_concurrency_and_fifo():
+    runner = _Runner()
+    gen = GenScheduler(runner, concurrency=2, max_queue=10)
+    tasks = [asyncio.create_task(gen.submit(u, f"d{u}", "m")) for u in range(5)]
+    await asyncio.sleep(0.01)
+    assert runner.calls == ["d0", "d1"]
+    assert gen.depth() == 3
+    runner.gate.set()
+    assert await asyncio.gather(*tasks) == [f"d{u}@m" for u in range(5)]
+    assert runner.calls == [f"d{u}" for u in range(5)]
+    assert runner.max_active == 2
+    await gen.stop()
+
+
+async def test_same_description_is_coalesced():
+    runner = _Runner()
+    gen = GenScheduler(runner, concurrency=1)
+    a = asyncio.create_task(gen.submit(1, "Мигалка", "m"))
+    b = asyncio.create_task(gen.submit(2, "мигалка!", "m"))
+    await asyncio.sleep(0.01)
+    runner.gate.set()
+    assert await a == await b == "Мигалка@m"
+    assert runner.calls == ["Мигалка"]
+    assert gen.stats["coalesced"] == 1
+    await gen.stop()
+
+
+async def test_one_job_per_user():
+    runner = _Runner()
+    gen = GenScheduler(runner, concurrency=1)
+    first = asyncio.create_task(gen.submit(1, "a", "m"))
+    await asyncio.sleep(0)
+    with pytest.raises(AlreadyQueued):
+        await gen.submit(1, "b", "m")
+    runner.gate.set()
+    await first
+    assert await gen.submit(1, "b", "m") == "b@m"
+    await gen.stop()
+
+
+async def test_queue_limit():
+    runner = _Runner()
+    gen = GenScheduler(runner, concurrency=1, max_queue=1)
+    running = asyncio.create_task(gen.submit(1, "a", "m"))
+    await asyncio.sleep(0.01)   # «a» в работе, очередь пуста
+    queued = asyncio.create_task(gen.submit(2, "b", "m"))
+    await asyncio.sleep(0)
+    with pytest.raises(QueueFull):
+        await gen.submit(3, "c", "m")
+    assert gen.stats["rejected"] == 1
+    runner.gate.set()
+    await asyncio.gather(running, queued)
+    await gen.stop()
+
+
+async def test_positions_and_errors():
+    runner = _Runner()
+    gen = GenScheduler(runner, concurrency=1)
+    positions = []
+
+    async def on_position(pos):
+        positions.append(pos)
+
+    first = asyncio.create_task(gen.submit(1, "boom", "m"))
+    await asyncio.sleep(0.01)
+    second = asyncio.create_task(gen.submit(2, "ok", "m", on_position))
+    await asyncio.sleep(0.01)
+    runner.gate.set()
+    with pytest.raises(ValueError):
+        await first
+    assert await second == "ok@m"
+    await asyncio.sleep(0)
+    assert positions[0] == 1 and positions[-1] == 0
+    await gen.stop()
+
+
+async def test_progress_reaches_late_subscribers():
+    runner = _Runner()
+    gen = GenScheduler(runner, concurrency=1)
+    early, late = [], []
+    a = asyncio.create_task(gen.submit(1, "blink", "m", on_progress=early.append))
+    await asyncio.sleep(0.01)
+    b = asyncio.create_task(gen.submit(2, "blink", "m", on_progress=late.append))
+    await asyncio.sleep(0.01)
+    runner.gate.set()
+    await asyncio.gather(a, b)
+    assert early == ["b"]
+    assert late == ["b"]   # подписался после отчёта — получил накопленный текст сразу
+    await gen.stop()
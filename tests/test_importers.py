@@ -0,0 +1,127 @@
+# -*- coding: utf-8 -*-
+import io
+import json
+import sqlite3
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+import db as db_module
+import importers
+from db import allocate_user_ids, db_read, db_write, fetchall
+from importers import parse_roster, parse_tasks
+
+
+def test_csv_semicolon_and_russian_headers():
+    data = "Название;Дедлайн;Описание\nМигалка;2030-09-25 18:00;LED на GPIO2\n".encode("cp1251")
+    tasks, errors = parse_tasks("tasks.csv", data)
+    assert errors == []
+    assert tasks == [("Мигалка", "LED на GPIO2", datetime(2030, 9, 25, 18, 0, tzinfo=timezone.utc))]
+
+
+def test_json_list_under_tasks_key():
+    data = json.dumps({"tasks": [
+        {"title": "A", "due_utc": "2030-01-01T10:00:00+03:00"},
+        {"title": "B", "due": "2030-01-02 12:00", "description": "-"},
+    ]}).encode()
+    tasks, errors = parse_tasks("tasks.json", data)
+    assert errors == []
+    assert tasks[0] == ("A", "", datetime(2030, 1, 1, 7, 0, tzinfo=timezone.utc))
+    assert tasks[1] == ("B", "", datetime(2030, 1, 2, 12, 0, tzinfo=timezone.utc))
+
+
+def test_bad_rows_are_reported_not_fatal():
+    data = b"title,due_utc\n,2030-01-01 10:00\nX,tomorrow\nY,2030-01-01 10:00\n"
+    tasks, errors = parse_tasks("t.csv", data)
+    assert [t[0] for t in tasks] == ["Y"]
+    assert len(errors) == 2
+    assert errors[0].startswith("строка 1") and errors[1].startswith("строка 2")
+
+
+def test_row_limit(monkeypatch):
+    monkeypatch.setattr(importers, "IMPORT_MAX_ROWS", 2)
+    data = b"title,due_utc\n" + b"".join(b"t%d,2030-01-01 10:00\n" % i for i in range(5))
+    tasks, errors = parse_tasks("t.csv", data)
+    assert len(tasks) == 2
+    assert "лимит" in errors[-1]
+
+
+async def test_insert_tasks_with_reminders(database):
+    from handlers.imports import _insert_tasks
+    due = datetime.now(timezone.utc) + timedelta(days=3)
+    created, jobs_count = await _insert_tasks(1, [("A", "", due), ("B", "d", due + timedelta(hours=1))])
+    assert created == 2
+    async with db_read() as db:
+        tasks = await fetchall(db, "SELECT id, title FROM tasks ORDER BY id")
+        jobs = await fetchall(db, "SELECT task_id FROM jobs")
+    assert [t["title"] for t in tasks] == ["A", "B"]
+    assert jobs_count == len(jobs) > 0
+    assert {j["task_id"] for j in jobs} == {t["id"] for t in tasks}
+
+
+# -------------------------------
+# Ростер учеников
+# -------------------------------
+def _roster(data: bytes, filename: str = "roster.csv"):
+    return list(parse_roster(filename, io.BytesIO(data)))
+
+
+def test_roster_csv_rows_and_errors():
+    data = "ФИО;Логин;Классы\nИван Петров;@ivan;7А, 8Б\n;@nobody;7А\nМария;-;\n".encode("cp1251")
+    assert _roster(data) == [
+        (1, ("Иван Петров", "ivan", ["7А", "8Б"])),
+        (2, "строка 2: нет имени"),
+        (3, ("Мария", None, [])),
+    ]
+
+
+def test_roster_xlsx_without_openpyxl(monkeypatch):
+    monkeypatch.setattr(importers, "openpyxl", None)
+    with pytest.raises(ValueError):
+        _roster(b"PK", "roster.xlsx")
+
+
+def test_roster_xlsx():
+    openpyxl = pytest.importorskip("openpyxl")
+    wb = openpyxl.Workbook()
+    ws = wb.active
+    ws.append(["name", "username", "classes"])
+    ws.append(["Иван", "@ivan", "7А;8Б"])
+    ws.append([None, None, None])
+    ws.append(["Мария", None, "7А"])
+    buf = io.BytesIO()
+    wb.save(buf)
+    assert _roster(buf.getvalue(), "roster.xlsx") == [
+        (1, ("Иван", "ivan", ["7А", "8Б"])),
+        (2, ("Мария", None, ["7А"])),
+    ]
+
+
+async def test_insert_roster_allocates_ids_and_reuses_usernames(database):
+    from handlers.imports import _insert_roster
+    async with db_write() as db:
+        await db.execute("INSERT INTO users(UserID, name, post) VALUES (10005, 'teacher', 'teacher')")
+    created, enrolled = await _insert_roster([("Иван", "ivan", [1, 2]), ("Мария", None, [1])])
+    assert (created, enrolled) == (2, 3)
+    created, enrolled = await _insert_roster([("Иван П.", "IVAN", [2, 3]), ("Пётр", None, [])])
+    assert (created, enrolled) == (1, 1)
+    async with db_read() as db:
+        users = await fetchall(db, "SELECT UserID, name FROM users WHERE post = 'student' ORDER BY UserID")
+    assert [(u["UserID"], u["name"]) for u in users] == [(10006, "Иван"), (10007, "Мария"), (10008, "Пётр")]
+
+
+async def test_allocate_user_ids_holds_write_lock(database):
+    other = sqlite3.connect(db_module.DB_PATH, timeout=0.1)
+    try:
+        async with db_write() as db:
+            await db.execute("BEGIN IMMEDIATE")
+            assert await allocate_user_ids(db) == 10000
+            # другой процесс не прочитает тот же MAX до коммита
+            with pytest.raises(sqlite3.OperationalError, match="locked"):
+                other.execute("BEGIN IMMEDIATE")
+            await db.execute("INSERT INTO users(UserID, name, post) VALUES (10000, 'a', 'student')")
+        other.execute("BEGIN IMMEDIATE")
+        assert other.execute("SELECT MAX(UserID) FROM users").fetchone()[0] == 10000
+        other.rollback()
+    finally:
+        other.close()
@@ -0,0 +1,65 @@
+# -*- coding: utf-8 -*-
+import asyncio
+
+from db import db_read, db_write, fetchall
+from leader import LeaderLease
+
+
+async def test_only_one_holder(database):
+    a = LeaderLease(holder="a", ttl=60)
+    b = LeaderLease(holder="b", ttl=60)
+    assert await a.try_acquire()
+    assert not await b.try_acquire()
+    assert await a.try_acquire()   # продление своей аренды
+
+
+async def test_expired_lease_is_taken_over(database):
+    a = LeaderLease(holder="a", ttl=60)
+    b = LeaderLease(holder="b", ttl=60)
+    await a.try_acquire()
+    async with db_write() as db:
+        await db.execute("UPDATE leader_lease SET expires_ts = 0")
+    assert await b.try_acquire()
+    assert not await a.try_acquire()
+
+
+async def test_failover_and_release(database):
+    events = []
+
+    def lease(name):
+        async def elected():
+            events.append(("elected", name))
+
+        async def lost():
+            events.append(("lost", name))
+        return LeaderLease(holder=name, ttl=0.2, heartbeat=0.05, on_elected=elected, on_lost=lost)
+
+    a, b = lease("a"), lease("b")
+    a.start()
+    await asyncio.sleep(0.05)
+    b.start()
+    await asyncio.sleep(0.1)
+    assert a.is_leader and not b.is_leader
+    await a.stop()   # чистая остановка — аренда освобождается сразу
+    await asyncio.sleep(0.1)
+    assert b.is_leader
+    await b.stop()
+    assert events == [("elected", "a"), ("lost", "a"), ("elected", "b"), ("lost", "b")]
+    async with db_read() as db:
+        assert await fetchall(db, "SELECT * FROM leader_lease") == []
+
+
+async def test_failed_start_steps_down(database):
+    lost = []
+
+    async def elected():
+        raise RuntimeError("boom")
+
+    async def on_lost():
+        lost.append(True)
+
+    lease = LeaderLease(holder="a", ttl=10, heartbeat=1, on_elected=elected, on_lost=on_lost)
+    lease.start()
+    await asyncio.sleep(0.05)
+    assert not lease.is_leader and lost == [True]
+    await lease.stop()
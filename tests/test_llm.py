@@ -0,0 +1,38 @@
+# -*- coding: utf-8 -*-
+import pytest
+
+from config import DEFAULT_MODEL
+from llm import LLMRegistry
+
+
+def test_resolve_alias_name_and_default():
+    reg = LLMRegistry(models={"fast": "tiny:1b", "quality": "big:8b"}, factory=None)
+    assert reg.resolve("fast") == "tiny:1b"
+    assert reg.resolve("big:8b") == "big:8b"
+    assert reg.resolve("unknown") == DEFAULT_MODEL
+    assert reg.resolve(None) == DEFAULT_MODEL
+
+
+def test_clients_and_chains_are_reused():
+    built = []
+    reg = LLMRegistry(models={}, factory=lambda name: built.append(name) or object())
+    assert reg.llm("m") is reg.llm("m")
+    reg.llm("n")
+    assert built == ["m", "n"]
+    reg.set_factory(lambda name: built.append(name) or object())
+    reg.llm("m")
+    assert built == ["m", "n", "m"]
+
+
+def test_missing_backend():
+    reg = LLMRegistry(models={}, factory=None)
+    with pytest.raises(RuntimeError):
+        reg.llm("m")
+
+
+async def test_fake_backend_chain():
+    reg = LLMRegistry(models={})
+    reg.use_fake_backend(["```python\nprint(1)\n```"])
+    assert "print(1)" in await reg.chain("m").ainvoke({"task_description": "x"})
+    await reg.warm_up(["m"])
+    await reg.keep_alive()
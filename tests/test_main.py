@@ -0,0 +1,41 @@
+# -*- coding: utf-8 -*-
+import asyncio
+import os
+import signal
+import subprocess
+import sys
+
+from main import install_stop_signals
+
+SRC = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src")
+
+
+class _NoSignalsLoop:
+    """Цикл событий без add_signal_handler, как ProactorEventLoop на Windows."""
+
+    def __init__(self, loop):
+        self._loop = loop
+
+    def add_signal_handler(self, sig, callback):
+        raise NotImplementedError
+
+    def call_soon_threadsafe(self, callback):
+        return self._loop.call_soon_threadsafe(callback)
+
+
+async def test_signal_fallback_sets_stop(monkeypatch):
+    installed = {}
+    monkeypatch.setattr(signal, "signal", lambda sig, handler: installed.setdefault(sig, handler))
+    stop = asyncio.Event()
+    install_stop_signals(_NoSignalsLoop(asyncio.get_running_loop()), stop)
+    assert set(installed) == {signal.SIGINT, signal.SIGTERM}
+    installed[signal.SIGTERM](signal.SIGTERM, None)
+    await asyncio.wait_for(stop.wait(), 1)
+
+
+def test_workers_require_webhook_mode():
+    env = {**os.environ, "BOT_MODE": "polling"}
+    proc = subprocess.run([sys.executable, os.path.join(SRC, "main.py"), "--workers", "2"],
+                          cwd=SRC, env=env, capture_output=True, text=True, timeout=60)
+    assert proc.returncode == 2
+    assert "BOT_MODE=webhook" in proc.stderr
@@ -0,0 +1,46 @@
+# -*- coding: utf-8 -*-
+import metrics
+from db import db_write
+from metrics import Counter, Gauge, Histogram, Registry, sql_labels
+
+
+def test_render_prometheus_text():
+    reg = Registry()
+    c = reg.add(Counter("t_total", "doc", ("status",)))
+    h = reg.add(Histogram("t_seconds", "doc", ("op",), buckets=(0.1, 1)))
+    g = reg.add(Gauge("t_depth", "doc", func=lambda: 7))
+    c.inc(status="ok")
+    c.inc(2, status="ok")
+    c.inc(status='a"b')
+    h.observe(0.05, op="x")
+    h.observe(0.5, op="x")
+    h.observe(5, op="x")
+    text = reg.render()
+    assert "# TYPE t_total counter" in text
+    assert 't_total{status="ok"} 3' in text
+    assert 't_total{status="a\\"b"} 1' in text
+    assert 't_seconds_bucket{op="x",le="0.1"} 1' in text
+    assert 't_seconds_bucket{op="x",le="1"} 2' in text
+    assert 't_seconds_bucket{op="x",le="+Inf"} 3' in text
+    assert 't_seconds_count{op="x"} 3' in text
+    assert "t_depth 7" in text
+    assert g.render()[-1] == "t_depth 7"
+
+
+def test_broken_gauge_function_is_skipped():
+    g = Gauge("g", "doc", func=lambda: 1 / 0)
+    assert g.render() == ["# HELP g doc", "# TYPE g gauge"]
+
+
+def test_sql_labels():
+    assert sql_labels("SELECT id FROM tasks WHERE x") == ("select", "tasks")
+    assert sql_labels("INSERT OR IGNORE INTO jobs(a) VALUES (?)") == ("insert", "jobs")
+    assert sql_labels("UPDATE fsm_state SET x = 1") == ("update", "fsm_state")
+    assert sql_labels("PRAGMA user_version") == ("pragma", "")
+
+
+async def test_pool_queries_are_timed(database):
+    before = metrics.DB_QUERY_SECONDS._series.get(("insert", "classes"), [0])[-1]
+    async with db_write() as db:
+        await db.execute("INSERT INTO classes(name, owner_chat_id, timezone) VALUES ('A', 1, 'UTC')")
+    assert metrics.DB_QUERY_SECONDS._series[("insert", "classes")][-1] == before + 1
@@ -0,0 +1,84 @@
+# -*- coding: utf-8 -*-
+import sqlite3
+
+import pytest
+
+import db
+
+# БД в том виде, в каком её создавал ensure_db до миграций (без jobs.delivered_utc)
+_LEGACY = """
+CREATE TABLE classes (id INTEGER PRIMARY KEY AUTOINCREMENT, name TEXT NOT NULL UNIQUE,
+                      owner_chat_id INTEGER NOT NULL, timezone TEXT NOT NULL);
+CREATE TABLE tasks (id INTEGER PRIMARY KEY AUTOINCREMENT, class_id INTEGER NOT NULL, title TEXT NOT NULL,
+                    description TEXT, due_utc TEXT NOT NULL, created_utc TEXT NOT NULL);
+CREATE TABLE jobs (id INTEGER PRIMARY KEY AUTOINCREMENT, task_id INTEGER NOT NULL, run_at_utc TEXT NOT NULL,
+                   kind TEXT NOT NULL, UNIQUE (task_id, run_at_utc, kind));
+INSERT INTO classes(name, owner_chat_id, timezone) VALUES ('9A', 1, 'Europe/Moscow');
+INSERT INTO tasks(class_id, title, due_utc, created_utc)
+  VALUES (1, 'A', '2030-01-01T10:00:00+00:00', '2029-12-01T00:00:00+00:00'),
+         (1, 'B', '2030-01-02T10:00:00+00:00', '2029-12-01T00:00:00+00:00');
+DELETE FROM tasks WHERE title = 'B';
+INSERT INTO jobs(task_id, run_at_utc, kind) VALUES (1, '2030-01-01T09:00:00+00:00', '1h');
+"""
+
+
+@pytest.fixture
+def legacy_db(tmp_path, monkeypatch):
+    path = str(tmp_path / "legacy.db")
+    conn = sqlite3.connect(path)
+    conn.executescript(_LEGACY)
+    conn.close()
+    monkeypatch.setattr(db, "DB_PATH", path)
+    return path
+
+
+def _query(path, sql):
+    conn = sqlite3.connect(path)
+    try:
+        return conn.execute(sql).fetchall()
+    finally:
+        conn.close()
+
+
+async def test_fresh_database_gets_latest_version(tmp_path, monkeypatch):
+    path = str(tmp_path / "new.db")
+    monkeypatch.setattr(db, "DB_PATH", path)
+    await db.ensure_db()
+    assert _query(path, "PRAGMA user_version") == [(db.SCHEMA_VERSION,)]
+
+
+async def test_legacy_timestamps_are_converted(legacy_db):
+    await db.ensure_db()
+    assert _query(legacy_db, "SELECT id, title, due_ts, created_ts FROM tasks") == [(1, "A", 1893492000, 1890777600)]
+    assert _query(legacy_db, "SELECT task_id, run_at_ts, kind, delivered_ts FROM jobs") == [(1, 1893488400, "1h", None)]
+    # AUTOINCREMENT помнит удалённое задание #2
+    assert _query(legacy_db, "SELECT seq FROM sqlite_sequence WHERE name = 'tasks'") == [(2,)]
+    assert ("idx_jobs_pending",) in _query(legacy_db, "SELECT name FROM sqlite_master WHERE type = 'index'")
+
+
+async def test_rerun_is_noop(legacy_db):
+    await db.ensure_db()
+    await db.ensure_db()
+    assert _query(legacy_db, "PRAGMA user_version") == [(db.SCHEMA_VERSION,)]
+    assert len(_query(legacy_db, "SELECT * FROM tasks")) == 1
+
+
+async def test_failed_migration_rolls_back(legacy_db, monkeypatch):
+    async def broken(conn):
+        await conn.execute("CREATE TABLE half_done (x)")
+        raise RuntimeError("boom")
+
+    monkeypatch.setattr(db, "MIGRATIONS", db.MIGRATIONS[:1] + [(2, "сломанная", broken)])
+    with pytest.raises(RuntimeError):
+        await db.ensure_db()
+    assert _query(legacy_db, "PRAGMA user_version") == [(1,)]
+    assert _query(legacy_db, "SELECT name FROM sqlite_master WHERE name = 'half_done'") == []
+    assert _query(legacy_db, "SELECT due_utc FROM tasks") == [("2030-01-01T10:00:00+00:00",)]
+
+
+async def test_concurrent_starters_apply_each_migration_once(legacy_db, capsys):
+    import asyncio
+    await asyncio.gather(db.ensure_db(), db.ensure_db(), db.ensure_db())
+    assert _query(legacy_db, "PRAGMA user_version") == [(db.SCHEMA_VERSION,)]
+    out = capsys.readouterr().out
+    assert out.count("миграция 2 применена") == 1
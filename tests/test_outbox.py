@@ -0,0 +1,118 @@
+# -*- coding: utf-8 -*-
+import asyncio
+import time
+from types import SimpleNamespace
+
+import pytest
+from aiogram.exceptions import TelegramNetworkError, TelegramRetryAfter
+
+import outbox
+from outbox import Outbox, lane, PRIORITY_BULK
+from ratelimit import TokenBucket
+
+
+def test_bucket_burst_then_rate():
+    b = TokenBucket(rate=10, burst=2)
+    assert b.take() and b.take()
+    assert not b.take()
+    assert 0.05 < b.delay() <= 0.1
+
+
+def test_bucket_penalize():
+    b = TokenBucket(rate=10, burst=5)
+    b.penalize(3)
+    assert b.delay() == pytest.approx(3, abs=0.01)
+
+
+async def test_requests_without_chat_go_direct():
+    box = Outbox(workers=1)
+    box.start()
+    try:
+        async def make_request(bot, method):
+            return "ok"
+        assert await box(make_request, None, SimpleNamespace()) == "ok"
+        assert box.stats["sent"] == 0
+    finally:
+        await box.stop()
+
+
+async def test_chat_order_and_rate():
+    box = Outbox(workers=4)
+    box._buckets[1] = TokenBucket(rate=20, burst=1)
+    box.start()
+    sent = []
+
+    async def make_request(bot, method):
+        sent.append(method.n)
+        return method.n
+
+    try:
+        t0 = time.monotonic()
+        results = await asyncio.gather(*(box(make_request, None, SimpleNamespace(chat_id=1, n=n)) for n in range(4)))
+        elapsed = time.monotonic() - t0
+    finally:
+        await box.stop()
+    assert results == [0, 1, 2, 3]
+    assert sent == [0, 1, 2, 3]
+    assert elapsed >= 3 / 20 - 0.01
+    assert box.depth() == 0
+
+
+async def test_interactive_lane_goes_first():
+    box = Outbox(workers=1)
+    box.start()
+    gate = asyncio.Event()
+    order = []
+
+    async def make_request(bot, method):
+        if method.chat_id == 1:
+            await gate.wait()
+        order.append(method.chat_id)
+
+    try:
+        first = asyncio.create_task(box(make_request, None, SimpleNamespace(chat_id=1)))
+        await asyncio.sleep(0)
+        with lane(PRIORITY_BULK):
+            bulk = asyncio.create_task(box(make_request, None, SimpleNamespace(chat_id=2)))
+        interactive = asyncio.create_task(box(make_request, None, SimpleNamespace(chat_id=3)))
+        await asyncio.sleep(0.01)
+        gate.set()
+        await asyncio.gather(first, bulk, interactive)
+    finally:
+        await box.stop()
+    assert order == [1, 3, 2]
+
+
+async def test_retry_after_parks_chat():
+    box = Outbox(workers=2)
+    box.start()
+    calls = []
+
+    async def make_request(bot, method):
+        calls.append(time.monotonic())
+        if len(calls) == 1:
+            raise TelegramRetryAfter(method=method, message="flood", retry_after=0)
+        return "ok"
+
+    try:
+        assert await box(make_request, None, SimpleNamespace(chat_id=5)) == "ok"
+    finally:
+        await box.stop()
+    assert len(calls) == 2
+    assert box.stats == {"sent": 1, "retried": 1, "failed": 0}
+
+
+async def test_gives_up_after_max_retries(monkeypatch):
+    monkeypatch.setattr(outbox, "OUTBOX_MAX_RETRIES", 0)
+    box = Outbox(workers=1)
+    box.start()
+
+    async def make_request(bot, method):
+        raise TelegramNetworkError(method=method, message="down")
+
+    try:
+        with pytest.raises(TelegramNetworkError):
+            await box(make_request, None, SimpleNamespace(chat_id=5))
+    finally:
+        await box.stop()
+    assert box.stats["failed"] == 1
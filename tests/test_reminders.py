@@ -0,0 +1,158 @@
+# -*- coding: utf-8 -*-
+import asyncio
+import time
+
+from db import db_read, db_write, fetchall
+from reminders import ReminderEngine
+
+
+async def _add_job(task_id: int, run_at: int, kind: str = "1h"):
+    async with db_write() as db:
+        await db.execute("INSERT INTO jobs(task_id, run_at_ts, kind) VALUES (?, ?, ?)", (task_id, run_at, kind))
+
+
+async def _delivered():
+    async with db_read() as db:
+        rows = await fetchall(db, "SELECT task_id FROM jobs WHERE delivered_ts IS NOT NULL ORDER BY task_id")
+    return [r["task_id"] for r in rows]
+
+
+def _recorder(result=True):
+    calls = []
+
+    async def on_due(task_id, kind):
+        calls.append((task_id, kind))
+        return result
+    return calls, on_due
+
+
+async def _run(*engines, seconds=0.2):
+    for e in engines:
+        e.start()
+    await asyncio.sleep(seconds)
+    for e in engines:
+        await e.stop()
+
+
+async def test_due_reminder_fires_once_across_engines(database):
+    now = int(time.time())
+    await _add_job(1, now - 1)
+    await _add_job(2, now)
+    calls, on_due = _recorder()
+    await _run(ReminderEngine(on_due), ReminderEngine(on_due))
+    assert sorted(calls) == [(1, "1h"), (2, "1h")]
+    assert await _delivered() == [1, 2]
+
+
+async def test_failed_delivery_is_released(database):
+    await _add_job(1, int(time.time()))
+    calls, on_due = _recorder(result=False)
+    await _run(ReminderEngine(on_due))
+    assert calls == [(1, "1h")]
+    assert await _delivered() == []
+
+
+async def test_stale_and_far_rows_are_not_loaded(database):
+    now = int(time.time())
+    await _add_job(1, now - 3600)   # дальше grace — пропущено
+    await _add_job(2, now + 3600)   # за горизонтом
+    await _add_job(3, now + 30)
+    engine = ReminderEngine(_recorder()[1], lookahead=60, grace=60)
+    await engine._refill(now)
+    assert [item[2] for item in engine._heap] == [3]
+
+
+async def test_window_is_capped_by_batch(database):
+    now = int(time.time())
+    for i in range(5):
+        await _add_job(i, now + 10 + i)
+    engine = ReminderEngine(_recorder()[1], batch=2)
+    await engine._refill(now)
+    assert engine.pending() == 2
+    assert engine._loaded_until < now + engine.lookahead
+
+
+async def test_batch_of_same_time_rows_fires_each_once(database):
+    now = int(time.time())
+    for i in range(5):
+        await _add_job(i, now)
+    calls = []
+
+    async def on_due(task_id, kind):
+        calls.append(task_id)
+        await asyncio.sleep(0.05)    # строки остаются «в полёте», пока окно читается снова
+        return False                 # и после неудачи снова недоставлены
+    engine = ReminderEngine(on_due, batch=2)
+    fired, refills = [], []
+    fire, refill = engine._fire, engine._refill
+
+    async def count_fire(job_id, *args):
+        fired.append(job_id)
+        await fire(job_id, *args)
+
+    async def count_refill(*args):
+        refills.append(args)
+        await refill(*args)
+    engine._fire, engine._refill = count_fire, count_refill
+    await _run(engine)
+    assert sorted(calls) == [0, 1, 2, 3, 4]
+    assert len(fired) == 5 and len(refills) <= 4
+
+
+async def test_notify_picks_up_new_rows(database):
+    calls, on_due = _recorder()
+    engine = ReminderEngine(on_due)
+    engine.start()
+    await asyncio.sleep(0.05)
+    now = int(time.time())
+    await _add_job(7, now)
+    engine.notify(now)
+    await asyncio.sleep(0.1)
+    await engine.stop()
+    assert calls == [(7, "1h")]
+
+
+async def test_missed_reminders_collapse_per_task(database, monkeypatch):
+    import reminders
+    monkeypatch.setattr(reminders, "REMINDER_CATCHUP_BATCH", 1)
+    monkeypatch.setattr(reminders, "REMINDER_CATCHUP_PAUSE_S", 0)
+    monkeypatch.setattr(reminders, "REMINDER_CATCHUP_MAX_AGE_S", 3600)
+    now = int(time.time())
+    await _add_job(1, now - 600, "24h")
+    await _add_job(1, now - 300, "1h")
+    await _add_job(2, now - 100, "1h")
+    await _add_job(3, now - 7200, "1h")   # слишком старое — не досылаем
+    await _add_job(4, now + 600, "1h")    # ещё не наступило
+    calls, on_due = _recorder()
+    engine = ReminderEngine(on_due)
+    missed = await engine.claim_missed(now)
+    assert [(m[1], m[2], m[4]) for m in missed] == [(3, "1h", 1), (1, "1h", 2), (2, "1h", 1)]
+    engine.deliver_missed(missed)
+    await asyncio.sleep(0.05)
+    await engine.stop()
+    assert calls == [(1, "1h, пропущено во время перерыва: 2"), (2, "1h, пропущено во время перерыва")]
+    assert await _delivered() == [1, 1, 2, 3]
+
+
+async def test_failed_catch_up_is_retried_next_start(database):
+    now = int(time.time())
+    await _add_job(1, now - 60)
+    calls, on_due = _recorder(result=False)
+    engine = ReminderEngine(on_due)
+    engine.deliver_missed(await engine.claim_missed(now))
+    await asyncio.sleep(0.05)
+    await engine.stop()
+    assert len(calls) == 1
+    assert await _delivered() == []
+    assert len(await engine.claim_missed(now)) == 1
+
+
+async def test_rows_from_other_processes_are_polled(database):
+    calls, on_due = _recorder()
+    engine = ReminderEngine(on_due, poll=0.05)
+    engine.start()
+    await asyncio.sleep(0.05)
+    await _add_job(8, int(time.time()))   # вставил другой процесс: notify() сюда не дошёл
+    await asyncio.sleep(0.2)
+    await engine.stop()
+    assert calls == [(8, "1h")]
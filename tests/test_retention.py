@@ -0,0 +1,65 @@
+# -*- coding: utf-8 -*-
+import time
+
+import retention
+from db import db_read, db_write, fetchall, fetchone
+
+
+async def _seed(old: int, fresh: int):
+    now = int(time.time())
+    rows = [(f"old{i}", now - 30 * 86400) for i in range(old)]
+    rows += [(f"new{i}", now + 86400) for i in range(fresh)]
+    async with db_write() as db:
+        await db.executemany(
+            "INSERT INTO tasks(class_id, title, due_ts, created_ts) VALUES (1, ?, ?, 0)", rows
+        )
+        await db.execute("INSERT INTO jobs(task_id, run_at_ts, kind) SELECT id, due_ts, '1h' FROM tasks")
+        await db.execute("INSERT INTO jobs(task_id, run_at_ts, kind) VALUES (9999, 0, 'orphan')")
+
+
+async def _titles(table: str):
+    async with db_read() as db:
+        rows = await fetchall(db, f"SELECT title FROM {table} ORDER BY id")
+    return [r["title"] for r in rows]
+
+
+async def test_archives_old_tasks_in_batches(database, monkeypatch):
+    monkeypatch.setattr(retention, "RETENTION_BATCH", 2)
+    monkeypatch.setattr(retention, "RETENTION_MODE", "archive")
+    await _seed(old=5, fresh=2)
+    await retention.retention_job()
+    assert await _titles("tasks") == ["new0", "new1"]
+    assert await _titles("tasks_archive") == [f"old{i}" for i in range(5)]
+    async with db_read() as db:
+        jobs = await fetchone(db, "SELECT COUNT(*) AS n FROM jobs")
+    assert jobs["n"] == 2   # остались только напоминания живых заданий
+
+
+async def test_delete_mode(database, monkeypatch):
+    monkeypatch.setattr(retention, "RETENTION_MODE", "delete")
+    await _seed(old=3, fresh=1)
+    await retention.retention_job()
+    assert await _titles("tasks") == ["new0"]
+    assert await _titles("tasks_archive") == []
+
+
+async def test_database_uses_incremental_vacuum(database):
+    async with db_read() as db:
+        row = await fetchone(db, "PRAGMA auto_vacuum")
+    assert row[0] == 2
+
+
+async def test_vacuum_returns_all_free_pages(database, monkeypatch):
+    monkeypatch.setattr(retention, "RETENTION_MODE", "delete")
+    monkeypatch.setattr(retention, "RETENTION_VACUUM_PAGES", 7)   # несколько порций
+    async with db_write() as db:
+        await db.executemany(
+            "INSERT INTO tasks(class_id, title, description, due_ts, created_ts) VALUES (1, 't', ?, 0, 0)",
+            [("x" * 2000,) for _ in range(200)]
+        )
+    async with db_read() as db:
+        pages_before = (await fetchone(db, "PRAGMA page_count"))[0]
+    await retention.retention_job()
+    async with db_read() as db:
+        assert (await fetchone(db, "PRAGMA freelist_count"))[0] == 0
+        assert (await fetchone(db, "PRAGMA page_count"))[0] <= pages_before - 90   # ~200 × 2 КБ
@@ -0,0 +1,46 @@
+# -*- coding: utf-8 -*-
+from db import db_write
+from search import fts_query, search_classes, search_students
+
+
+def test_query_quotes_every_word():
+    assert fts_query("Ив  ПЕТ") == '"ив"* "пет"*'
+    assert fts_query('a OR "b" -c NEAR') == '"a"* "or"* "b"* "c"* "near"*'
+    assert fts_query(" ,.; ") is None
+
+
+async def _seed():
+    async with db_write() as db:
+        await db.executemany("INSERT INTO users(UserID, name, username, post) VALUES (?, ?, ?, ?)", [
+            (1, "Иван Петров", "vanya", "student"),
+            (2, "Иванна Сидорова", None, "student"),
+            (3, "Пётр Иванов", "petr", "student"),
+            (4, "Иван Учитель", None, "teacher"),
+        ])
+        await db.executemany("INSERT INTO classes(id, name, owner_chat_id, timezone) VALUES (?, ?, ?, 'UTC')", [
+            (1, "7А физика", 1), (2, "8Б Физика", 1), (3, "9В физика", 2),
+        ])
+
+
+async def test_students_by_name_prefix_and_username(database):
+    await _seed()
+    assert {r["UserID"] for r in await search_students("ив")} == {1, 2, 3}
+    assert [r["UserID"] for r in await search_students("ИВ ПЕТ")] == [1]
+    assert [r["UserID"] for r in await search_students("van")] == [1]
+    assert await search_students("учитель") == []
+
+
+async def test_index_follows_updates_and_deletes(database):
+    await _seed()
+    async with db_write() as db:
+        await db.execute("UPDATE users SET name = 'Иван Кузнецов' WHERE UserID = 1")
+        await db.execute("DELETE FROM users WHERE UserID = 3")
+    assert await search_students("петр") == []
+    assert [r["UserID"] for r in await search_students("кузн")] == [1]
+
+
+async def test_classes_scoped_to_owner(database):
+    await _seed()
+    assert {r["id"] for r in await search_classes("физ")} == {1, 2, 3}
+    assert {r["id"] for r in await search_classes("физ", owner_chat_id=1)} == {1, 2}
+    assert [r["id"] for r in await search_classes("8б")] == [2]
@@ -0,0 +1,51 @@
+# -*- coding: utf-8 -*-
+import re
+
+import pytest
+
+from codecheck import check_code
+from snippets import SNIPPET_INDEX
+
+
+def _code(answer: str) -> str:
+    return re.search(r"```python\n(.*?)```", answer, re.DOTALL).group(1)
+
+
+@pytest.mark.parametrize("text", [
+    "Кнопка на GPIO12 включает LED на GPIO2 на 10 секунд",
+    "светодиод на GPIO2 мигает раз в 3 секунды",
+    "мигалка LED каждые 0.2 с",
+])
+def test_numbers_besides_pins_go_to_model(text):
+    # пример подставил бы свои HOLD_S / BLINK_S вместо чисел пользователя
+    assert SNIPPET_INDEX.match(text) is None
+
+
+@pytest.mark.parametrize("text", [
+    "светодиод на GPIO34 мигает",
+    "кнопка на GPIO36 включает светодиод",   # у 34–39 нет подтяжки для PULL_UP
+])
+def test_input_only_pin_not_used_as_output(text):
+    assert SNIPPET_INDEX.match(text) is None
+
+
+def test_input_only_pin_allowed_for_inputs():
+    answer = SNIPPET_INDEX.match("дальномер HC-SR04 trig на 5 пине echo на GPIO35")
+    assert answer is not None
+    code = _code(answer)
+    assert "TRIG_PIN = 5\n" in code and "ECHO_PIN = 35" in code
+    assert check_code(code)[0] == []
+
+
+def test_module_names_are_not_parameters():
+    answer = SNIPPET_INDEX.match("датчик температуры DHT11 на GPIO4")
+    assert answer is not None
+    assert "DHT_PIN = 4\n" in _code(answer)
+
+
+def test_pins_substituted_by_nearest_word():
+    answer = SNIPPET_INDEX.match("кнопка на GPIO14 включает светодиод на пине 5")
+    assert answer is not None
+    code = _code(answer)
+    assert "BUTTON_PIN = 14" in code and "LED_PIN = 5\n" in code
+    assert check_code(code)[0] == []
@@ -0,0 +1,78 @@
+# -*- coding: utf-8 -*-
+import time
+
+import pytest
+
+from db import db_write
+from state import MemoryStateStorage, SqliteStateStorage, build_storage
+
+DIALOG = {"mode": "gen", "step": 0, "data": {"model": "быстрая"}, "chat_id": 5}
+
+
+async def test_memory_ttl_and_lru():
+    storage = MemoryStateStorage(ttl=60, max_entries=2)
+    await storage.set(1, {"mode": "a"})
+    await storage.set(2, {"mode": "b"})
+    assert (await storage.get(1))["mode"] == "a"   # 1 теперь свежее 2
+    await storage.set(3, {"mode": "c"})
+    assert await storage.get(2) is None
+    assert await storage.get(1) is not None
+    expired = MemoryStateStorage(ttl=0)
+    await expired.set(1, DIALOG)
+    await expired.set(2, DIALOG)
+    assert await expired.get(1) is None
+    assert await expired.purge_expired() == 1
+    assert await expired.get(2) is None
+
+
+async def test_sqlite_roundtrip_and_isolation(database):
+    storage = SqliteStateStorage(ttl=60, cache_ttl=60)
+    assert await storage.get(1) is None
+    await storage.set(1, DIALOG)
+    state = await storage.get(1)
+    assert state == DIALOG
+    state["step"] = 99   # правка без set не попадает в хранилище
+    assert (await storage.get(1))["step"] == 0
+    # новое хранилище (рестарт / другой процесс) читает из БД
+    assert await SqliteStateStorage(ttl=60).get(1) == DIALOG
+    await storage.pop(1)
+    assert await storage.get(1) is None
+    assert await SqliteStateStorage(ttl=60).get(1) is None
+
+
+async def test_sqlite_cache_serves_repeated_reads(database):
+    storage = SqliteStateStorage(ttl=60, cache_ttl=60)
+    await storage.set(1, DIALOG)
+    for _ in range(3):
+        await storage.get(1)
+    await storage.get(2)
+    await storage.get(2)
+    assert storage.stats()["hits"] == 4 and storage.stats()["misses"] == 1
+
+
+async def test_sqlite_ttl_and_purge(database):
+    storage = SqliteStateStorage(ttl=60, cache_ttl=0)
+    await storage.set(1, DIALOG)
+    await storage.set(2, DIALOG)
+    async with db_write() as db:
+        await db.execute("UPDATE fsm_state SET updated_ts = ? WHERE user_id = 1", (int(time.time()) - 120,))
+    assert await storage.get(1) is None
+    assert await storage.purge_expired() == 1
+    assert await storage.get(2) == DIALOG
+
+
+def test_unknown_backend():
+    with pytest.raises(ValueError):
+        build_storage("redis")
+
+
+async def test_shared_storage_sees_other_process_writes(database):
+    first = SqliteStateStorage(ttl=60, cache_ttl=60)
+    second = SqliteStateStorage(ttl=60, cache_ttl=60)
+    assert await second.get(1) is None      # закэшировано «диалога нет»
+    await first.set(1, DIALOG)
+    assert await second.get(1) is None      # без shared — устаревший кэш
+    second.set_shared(True)
+    assert await second.get(1) == DIALOG
+    await first.set(1, {**DIALOG, "step": 1})
+    assert (await second.get(1))["step"] == 1
@@ -0,0 +1,66 @@
+# -*- coding: utf-8 -*-
+from db import db_read, db_write
+from handlers.tasks import _fetch_page
+
+NOW = 1_900_000_000
+
+
+async def _seed():
+    async with db_write() as db:
+        for n in range(1, 4):
+            await db.execute("INSERT INTO classes(id, name, owner_chat_id, timezone) VALUES (?, ?, 1, 'UTC')",
+                             (n, f"c{n}"))
+        rows = []
+        for i in range(12):
+            # задания двух классов вперемешку, с повторяющимися дедлайнами; класс 3 — чужой
+            due = NOW + (i // 2 - 3) * 3600
+            rows.append((1 + i % 2, f"t{i}", due))
+        rows.append((3, "foreign", NOW))
+        await db.executemany(
+            "INSERT INTO tasks(class_id, title, due_ts, created_ts) VALUES (?, ?, ?, 0)", rows
+        )
+
+
+async def _walk(period, class_ids, limit=4):
+    pages, cursor = [], None
+    async with db_read() as db:
+        while True:
+            rows, has_more = await _fetch_page(db, class_ids, period, "n", cursor, NOW, limit)
+            pages.append([r["title"] for r in rows])
+            if not has_more:
+                return pages
+            cursor = (rows[-1]["due_ts"], rows[-1]["id"])
+
+
+async def test_forward_pages_cover_everything_once(database):
+    await _seed()
+    pages = await _walk("all", [1, 2])
+    flat = [t for p in pages for t in p]
+    assert flat == [f"t{i}" for i in range(12)]
+    assert [len(p) for p in pages] == [4, 4, 4]
+
+
+async def test_periods(database):
+    await _seed()
+    upcoming = [t for p in await _walk("up", [1, 2]) for t in p]
+    overdue = [t for p in await _walk("od", [1, 2]) for t in p]
+    assert upcoming == [f"t{i}" for i in range(6, 12)]
+    assert overdue == [f"t{i}" for i in (5, 4, 3, 2, 1, 0)]   # свежие просроченные сначала
+
+
+async def test_back_page_mirrors_forward(database):
+    await _seed()
+    async with db_read() as db:
+        first, _ = await _fetch_page(db, [1, 2], "all", "n", None, NOW, 4)
+        second, _ = await _fetch_page(db, [1, 2], "all", "n", (first[-1]["due_ts"], first[-1]["id"]),
+                                      NOW, 4)
+        back, has_more = await _fetch_page(db, [1, 2], "all", "p", (second[0]["due_ts"], second[0]["id"]),
+                                           NOW, 4)
+    assert [r["id"] for r in back] == [r["id"] for r in first]
+    assert has_more is False
+
+
+async def test_single_class_filter(database):
+    await _seed()
+    titles = [t for p in await _walk("all", [2], limit=10) for t in p]
+    assert titles == [f"t{i}" for i in range(1, 12, 2)]
@@ -0,0 +1,153 @@
+# -*- coding: utf-8 -*-
+import asyncio
+from datetime import datetime, timezone
+
+import pytest
+from aiogram.types import CallbackQuery, Chat, Message, User
+
+import throttling
+from state import STATE
+from throttling import Throttling
+
+USER = User(id=42, is_bot=False, first_name="u")
+
+
+def _message(text: str, message_id: int = 1, edit_date: int | None = None) -> Message:
+    return Message(message_id=message_id, date=datetime.now(timezone.utc), edit_date=edit_date,
+                   chat=Chat(id=42, type="private"), from_user=USER, text=text)
+
+
+def _callback(data: str, message_id: int = 1, edit_date: int | None = None) -> CallbackQuery:
+    return CallbackQuery(id="1", from_user=USER, chat_instance="c", data=data,
+                         message=_message("menu", message_id, edit_date))
+
+
+@pytest.fixture
+def replies(monkeypatch):
+    """Ответы пользователю вместо запросов к Bot API."""
+    out = []
+
+    async def answer_cq(self, text=None, **kwargs):
+        out.append(("cq", text))
+
+    async def answer_msg(self, text, **kwargs):
+        out.append(("msg", text))
+
+    monkeypatch.setattr(CallbackQuery, "answer", answer_cq)
+    monkeypatch.setattr(Message, "answer", answer_msg)
+    return out
+
+
+@pytest.fixture
+def limits(monkeypatch):
+    def set_limits(**values):
+        for name, value in values.items():
+            monkeypatch.setattr(throttling, f"THROTTLE_{name.upper()}", value)
+    return set_limits
+
+
+def _handler(calls, gate=None):
+    async def handler(event, data):
+        calls.append(getattr(event, "data", None) or event.text)
+        if gate is not None:
+            await gate.wait()
+    return handler
+
+
+async def test_duplicate_click_merged_while_in_flight(replies):
+    t = Throttling(dedup_s=0)
+    calls, gate = [], asyncio.Event()
+    first = asyncio.create_task(t(_handler(calls, gate), _callback("tl:up"), {}))
+    await asyncio.sleep(0)
+    await t(_handler(calls), _callback("tl:up"), {})
+    await t(_handler(calls), _callback("tl:up", message_id=2), {})   # та же кнопка другого сообщения
+    gate.set()
+    await first
+    await t(_handler(calls), _callback("tl:up"), {})                 # первое закончилось, окна нет
+    assert calls == ["tl:up"] * 3
+    assert replies == [("cq", None)]
+
+
+async def test_duplicate_click_within_window(replies):
+    t = Throttling(dedup_s=60)
+    calls = []
+    await t(_handler(calls), _callback("tl:up"), {})
+    await t(_handler(calls), _callback("tl:up"), {})
+    await t(_handler(calls), _callback("tl:od"), {})
+    assert calls == ["tl:up", "tl:od"]
+
+
+async def test_callback_rate(replies, limits):
+    limits(callback_rate=0.001, callback_burst=2)
+    t = Throttling(dedup_s=0)
+    calls = []
+    for data in ("a", "b", "c"):
+        await t(_handler(calls), _callback(data), {})
+    assert calls == ["a", "b"]
+    assert replies[0][0] == "cq" and replies[0][1].startswith("Слишком часто")
+
+
+async def test_message_rate_warns_once(replies, limits):
+    limits(message_rate=0.001, message_burst=1)
+    t = Throttling()
+    calls = []
+    for text in ("/start", "/start", "/start"):
+        await t(_handler(calls), _message(text), {})
+    assert calls == ["/start"]
+    assert len(replies) == 1 and replies[0][1].startswith("Слишком много сообщений")
+
+
+async def test_admins_are_exempt(replies, limits, monkeypatch):
+    limits(message_rate=0.001, message_burst=1)
+    monkeypatch.setattr(throttling, "ADMIN_IDS", {42})
+    t = Throttling()
+    calls = []
+    for _ in range(3):
+        await t(_handler(calls), _message("/start"), {})
+    assert len(calls) == 3 and replies == []
+
+
+async def test_tap_after_edit_is_not_duplicate(replies):
+    t = Throttling(dedup_s=60)
+    calls = []
+    cq = _callback("tl:next")
+    await t(_handler(calls), cq, {})
+    await t(_handler(calls), cq, {})
+    # страница перелистнута — у сообщения новая edit_date
+    await t(_handler(calls), _callback("tl:next", edit_date=1_900_000_000), {})
+    assert calls == ["tl:next"] * 2
+
+
+def test_gen_wait(limits, monkeypatch):
+    limits(gen_rate=0.001, gen_burst=1)
+    t = Throttling()
+    assert t.gen_wait(42) == 0
+    assert t.gen_wait(42) == 1000
+    monkeypatch.setattr(throttling, "ADMIN_IDS", {42})
+    assert t.gen_wait(42) == 0
+
+
+async def test_gen_limit_charged_only_for_model_calls(database, replies, limits, monkeypatch):
+    import handlers.gen as gen
+    limits(gen_rate=0.001, gen_burst=1)
+    monkeypatch.setattr(gen, "THROTTLE", Throttling())
+    monkeypatch.setattr(gen, "ENABLE_GEN", True)
+    sent = []
+
+    async def send_result(msg, result, live=None, check=None):
+        sent.append(result)
+
+    async def snippet(desc):
+        return ("snippet", None) if desc.startswith("мигалка") else None
+
+    async def submit(user_id, desc, model_name, on_position, report):
+        return "model", None
+
+    monkeypatch.setattr(gen, "_send_result", send_result)
+    monkeypatch.setattr(gen, "_snippet_answer", snippet)
+    monkeypatch.setattr(gen.GEN_QUEUE, "submit", submit)
+    for desc in ("мигалка", "мигалка 2", "мигалка 3", "датчик", "датчик 2"):
+        await gen._run_generation(_message(desc), desc)
+    assert sent == ["snippet"] * 3 + ["model"]
+    assert replies[-1] == ("msg", "Генерация не так часто: попробуйте через 1000 с.")
+    assert (await STATE.get(42))["mode"] == "gen"    # описание можно отправить ещё раз
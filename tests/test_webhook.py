@@ -0,0 +1,56 @@
+# -*- coding: utf-8 -*-
+import asyncio
+
+import aiohttp
+
+from webhook import SECRET_HEADER, WebhookServer
+
+
+class _Dispatcher:
+    def __init__(self):
+        self.seen = []
+        self.gate = asyncio.Event()
+        self.gate.set()
+
+    async def feed_update(self, bot, update):
+        await self.gate.wait()
+        self.seen.append(update.update_id)
+
+
+async def _server(dp, **kwargs):
+    server = WebhookServer(dp, bot=None, path="/hook", secret="s3cret", **kwargs)
+    await server.start("127.0.0.1", 0)
+    host, port = server._runner.addresses[0][:2]
+    return server, f"http://{host}:{port}/hook"
+
+
+async def _post(session, url, data, secret="s3cret"):
+    async with session.post(url, data=data, headers={SECRET_HEADER: secret}) as resp:
+        return resp.status
+
+
+async def test_updates_are_fed_to_dispatcher():
+    dp = _Dispatcher()
+    server, url = await _server(dp)
+    async with aiohttp.ClientSession() as session:
+        assert await _post(session, url, '{"update_id": 1}') == 200
+        assert await _post(session, url, '{"update_id": 2}', secret="wrong") == 401
+        assert await _post(session, url, "not json") == 400
+    await server.stop()
+    assert dp.seen == [1]
+    assert server.stats["unauthorized"] == 1 and server.stats["processed"] == 1
+
+
+async def test_full_queue_answers_503_and_drains_on_stop():
+    dp = _Dispatcher()
+    dp.gate.clear()
+    server, url = await _server(dp, queue_max=1, workers=1)
+    async with aiohttp.ClientSession() as session:
+        assert await _post(session, url, '{"update_id": 1}') == 200   # взят обработчиком и ждёт
+        await asyncio.sleep(0.01)
+        assert await _post(session, url, '{"update_id": 2}') == 200   # в очереди
+        assert await _post(session, url, '{"update_id": 3}') == 503
+    asyncio.get_running_loop().call_later(0.05, dp.gate.set)
+    await server.stop(drain_timeout=2)
+    assert dp.seen == [1, 2]
+    assert server.stats["rejected"] == 1